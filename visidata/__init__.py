@@ -13,6 +13,7 @@ from .loaders.tsv import *
 from .data import *
 from .clipboard import *
 from .utils import *
+from .pagedrows import *
 from .slide import *
 from .search import *
 
@@ -26,6 +27,7 @@ from .asyncthread import *
 from .pivot import *
 from .tidydata import *
 from .cmdlog import *
+from .parallel import *
 from .freeze import *
 from .regex import *
 from .canvas import *
@@ -55,6 +55,10 @@ class date(datetime.datetime):
     def __float__(self):
         return self.timestamp()
 
+    def __reduce__(self):
+        'pickle as the plain datetime, which __new__ accepts'
+        return date, (datetime.datetime(self.year, self.month, self.day, self.hour, self.minute, self.second, self.microsecond, self.tzinfo),)
+
     def __radd__(self, n):
         return self.__add__(n)
 
@@ -4,6 +4,7 @@ import threading
 from .vdtui import *
 
 option('min_memory_mb', 0, 'minimum memory to continue loading and async processing')
+option('worker_processes', 0, 'number of processes to use for parallel loading, and for evaluating expressions and regex substitutions into frozen or set columns (0 or 1 to use a single thread)')
 theme('color_working', 'green', 'color of system running smoothly')
 
 BaseSheet.addCommand('^C', 'cancel-sheet', 'cancelThread(*sheet.currentThreads or fail("no active threads on this sheet"))')
@@ -14,9 +15,14 @@ SheetsSheet.addCommand('gz^C', 'cancel-rows', 'for vs in selectedRows: cancelThr
 
 
 def cancelThread(*threads, exception=EscapeException):
-    'Raise exception on another thread.'
+    'Drop queued threads, and ask running threads to stop at their next Progress.  Raise exception on threads which were already asked, or which are not using any Progress to check.'
     for t in threads:
-        ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(t.ident), ctypes.py_object(exception))
+        if vd().unqueueThread(t):
+            continue
+        with vd().threadLock:  # not while the thread is finishing
+            if t.ident is not None and not t.finishing and (t.cancelled or not t.progresses):
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(t.ident), ctypes.py_object(exception))
+        t.cancelled = True
 
 
 SheetsSheet.columns += [
@@ -29,6 +35,12 @@ class ThreadsSheet(Sheet):
     columns = [
         ColumnAttr('name'),
         Column('process_time', type=float, getter=lambda col,row: elapsed_s(row)),
+        Column('wait_s', type=float, getter=lambda col,row: queuedTime(row)),
+        Column('queued', type=int, getter=lambda col,row: vd().queueDepth(row.sheet) if getattr(row, 'sheet', None) else None),
+        Column('made', type=int, getter=lambda col,row: progressAttr(row, 'made')),
+        Column('unit', getter=lambda col,row: progressAttr(row, 'unit')),
+        Column('per_s', type=float, getter=lambda col,row: progressAttr(row, 'rate')),
+        Column('eta_s', type=float, getter=lambda col,row: progressAttr(row, 'eta')),
         ColumnAttr('profile'),
         ColumnAttr('status'),
         ColumnAttr('exception'),
@@ -36,11 +48,26 @@ class ThreadsSheet(Sheet):
     def reload(self):
         self.rows = vd().threads
 
+    def frameSignature(self):
+        return None  # shows progress of all threads
+
 ThreadsSheet.addCommand('^C', 'cancel-thread', 'cancelThread(cursorRow)')
 
 def elapsed_s(t):
     return (t.endTime or time.process_time())-t.startTime
 
+def progressAttr(t, attr):
+    'Attribute of the first running Progress of thread `t`, else its last finished one, or None if it has not used one.'
+    progresses = getattr(t, 'progresses', None)
+    prog = progresses[0] if progresses else getattr(t, 'lastProgress', None)
+    return getattr(prog, attr) if prog else None
+
+def queuedTime(t):
+    'Seconds thread `t` waited (or has been waiting) to start.'
+    if t.ident is None and t.endTime is None:
+        return time.time()-t.queuedTime
+    return t.waitTime
+
 def checkMemoryUsage(vs):
     min_mem = options.min_memory_mb
     threads = vd.unfinishedThreads
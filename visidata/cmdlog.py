@@ -17,7 +17,7 @@ globalCommand('^U', 'pause-replay', 'CommandLog.togglePause()')
 globalCommand('^I', 'advance-replay', '(CommandLog.currentReplay or fail("no replay to advance")).advance()')
 globalCommand('^K', 'stop-replay', '(CommandLog.currentReplay or fail("no replay to cancel")).cancel()')
 
-globalCommand('Q', 'forget-sheet', 'vd.cmdlog.removeSheet(vd.sheets.pop(0))')
+globalCommand('Q', 'forget-sheet', 'vd.quit(sheet); vd.cmdlog.removeSheet(sheet)')
 
 globalCommand(None, 'status', 'status(input("status: "))')
 globalCommand('^V', 'check-version', 'status(__version_info__); checkVersion(input("require version: ", value=__version_info__))')
@@ -66,6 +66,11 @@ def isLoggableCommand(keystrokes, longname):
         return False
     return True
 
+def invalidateRenderHook(sheet, cmd, args, keystrokes):
+    'Discard formatted cells before any command which may change them; movement commands leave them to be redrawn as is.'
+    if isLoggableCommand(keystrokes or '', cmd.longname):
+        vd().invalidateRender()
+
 def open_vd(p):
     return CommandLog(p.name, source=p)
 
@@ -317,6 +322,7 @@ vd().cmdlog = CommandLog('cmdlog')
 vd().cmdlog.rows = []
 
 vd().addHook('preexec', vd().cmdlog.beforeExecHook)
+vd().addHook('preexec', invalidateRenderHook)
 vd().addHook('postexec', vd().cmdlog.afterExecSheet)
 vd().addHook('preedit', vd().cmdlog.getLastArgs)
 vd().addHook('postedit', vd().cmdlog.setLastArgs)
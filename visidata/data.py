@@ -7,6 +7,10 @@ option('confirm_overwrite', True, 'whether to prompt for overwrite confirmation
 replayableOption('safe_error', '#ERR', 'error string to use while saving')
 replayableOption('header', 1, 'parse first N rows of certain formats as column names')
 replayableOption('delimiter', '\t', 'delimiter to use for tsv filetype')
+replayableOption('tsv_lazy', False, 'index lines of uncompressed tsv files and split fields only when rows are accessed')
+replayableOption('dedupe_values', False, 'share identical values within each column when loading tsv/csv, to reduce memory')
+replayableOption('columnar_rows', False, 'store the values of each column together when loading tsv/csv, making row objects only as rows are accessed')
+option('lazy_rows', 10000, 'number of most recently accessed rows to keep, for lazily parsed tsv or columnar rows')
 replayableOption('filetype', '', 'specify file type')
 replayableOption('save_filetype', 'tsv', 'specify default file type to save as')
 replayableOption('tsv_safe_newline', '\u001e', 'replacement for tab character when saving to tsv')
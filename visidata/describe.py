@@ -62,17 +62,20 @@ class DescribeSheet(ColumnsSheet):
             d['nulls'] = list()
             d['distinct'] = set()
 
-            for sr in Progress(srccol.sheet.rows, 'calculating'):
-                try:
-                    v = srccol.getValue(sr)
-                    if isNull(v):
-                        d['nulls'].append(sr)
-                    else:
-                        v = srccol.type(v)
-                        vals.append(v)
-                    d['distinct'].add(v)
-                except Exception as e:
-                    d['errors'].append(sr)
+            for batch in genBatches(srccol.sheet.rows, 'calculating'):
+                for sr, v in zip(batch, srccol.getValuesBatch(batch)):
+                    if isinstance(v, TypedExceptionWrapper) and v.type == srccol.getValue:  # getValue raised
+                        d['errors'].append(sr)
+                        continue
+                    try:
+                        if isNull(v):
+                            d['nulls'].append(sr)
+                        else:
+                            v = srccol.type(v)
+                            vals.append(v)
+                        d['distinct'].add(v)
+                    except Exception as e:
+                        d['errors'].append(sr)
 
             d['mode'] = self.calcStatistic(d, mode, vals)
             if isNumeric(srccol):
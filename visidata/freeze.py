@@ -7,7 +7,9 @@ Sheet.addCommand("z'", 'cache-col', 'cursorCol.resetCache()')
 Sheet.addCommand("gz'", 'cache-cols', 'for c in visibleCols: c.resetCache()')
 
 def resetCache(self):
-    self._cachedValues = collections.OrderedDict()
+    if self._cachedValues:
+        self._cachedValues.clear()
+    self._cachedValues = ColumnCache(self)
     status("reset cache for " + self.name)
 
 Column.resetCache = resetCache
@@ -18,6 +20,13 @@ def StaticColumn(rows, col):
 
     @asyncthread
     def calcRows_async(frozencol, rows, col):
+        if canEvalInProcesses():
+            vals = calcInProcesses(col, rows)
+            if vals is not None:
+                for r, v in zip(rows, vals):
+                    frozencol.setValue(r, v)
+                return
+
         for r in Progress(rows, 'calculating'):
             try:
                 frozencol.setValue(r, col.getTypedValue(r))
@@ -1,4 +1,7 @@
 import math
+import array
+import bisect
+import collections
 
 from visidata import *
 
@@ -8,8 +11,9 @@ globalCommand('zF', 'freq-rows', 'vd.push(SheetFreqTable(sheet, Column("Total",
 
 theme('disp_histogram', '*', 'histogram element character')
 option('disp_histolen', 50, 'width of histogram column')
-#option('histogram_bins', 0, 'number of bins for histogram of numeric columns')
-#option('histogram_even_interval', False, 'if histogram bins should have even distribution of rows')
+option('numeric_binning', False, 'bin numeric columns into ranges')
+option('histogram_bins', 0, 'number of bins for histogram of numeric columns (0 for the square root of the number of rows)')
+option('histogram_even_interval', False, 'if histogram bins should have even distribution of rows')
 
 ColumnsSheet.addCommand(ENTER, 'freq-row', 'vd.push(SheetFreqTable(source[0], cursorRow))')
 
@@ -17,6 +21,66 @@ def valueNames(vals):
     return '-'.join(str(v) for v in vals)
 
 
+class FormattedKey(str):
+    'The display of a value which cannot be hashed, to bin it by.'
+
+
+def formatKey(col, v):
+    return wrapply(col.format, v)
+
+
+def formatKeys(col, vals):
+    'Return list of formatKey(col, v) for each of `vals`, formatting all at once when they are plain values.'
+    types = set(map(type, vals))
+    if isPlainTypes(types) and not any(issubclass(t, (list, tuple, dict, bytes)) for t in types):
+        formatter = getType(col.type).formatter
+        fmtstr = col.fmtstr
+        try:
+            return [formatter(fmtstr, v) for v in vals]
+        except Exception:
+            pass  # format errors individually
+    return [formatKey(col, v) for v in vals]
+
+
+class FreqBins:
+    'The source rows of all bins of a SheetFreqTable, as an array of the bin number of each row.  The rows are only grouped into lists when the rows of some bin are first needed.'
+    def __init__(self, rows, binnums, nbins):
+        self.rows = rows
+        self.binnums = binnums
+        self.nbins = nbins
+        self.binrows = None  # [binnum] -> list of rows in that bin
+
+    def getRows(self, binnum):
+        if self.binrows is None:
+            self.groupRows()
+        return self.binrows[binnum]
+
+    def groupRows(self):
+        binrows = [[] for i in range(self.nbins)]
+        appends = [rows.append for rows in binrows]
+        for r, b in zip(self.rows, self.binnums):
+            appends[b](r)
+        self.binrows = binrows
+        self.rows = self.binnums = None
+
+
+class FreqBin(collections.abc.Sequence):
+    'The source rows in one bin of a SheetFreqTable; counted without grouping them.'
+    def __init__(self, bins, binnum, count):
+        self.bins = bins
+        self.binnum = binnum
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.bins.getRows(self.binnum)[i]
+
+    def __iter__(self):
+        return iter(self.bins.getRows(self.binnum))
+
+
 # rowdef: (keys, source_rows)
 class SheetFreqTable(Sheet):
     'Generate frequency-table sheet on currently selected column.'
@@ -67,105 +131,189 @@ class SheetFreqTable(Sheet):
         return super().unselectRow(row)
 
     def numericBinning(self):
-        nbins = options.histogram_bins or int(len(self.source.rows) ** (1./2))
-
+        'Bin rows into ranges of the value of the single key column: of even width, or with options.histogram_even_interval, of about the same number of rows.'
         origCol = self.origCols[0]
         self.columns[0].type = str
 
-        # separate rows with errors at the column from those without errors
-        errorbin = []
-        allbin = []
-        for row in Progress(self.source.rows, 'binning'):
-            try:
-                v = origCol.getTypedValue(row)
-                allbin.append((v, row))
-            except Exception as e:
-                errorbin.append((e, row))
-
-        # find bin pivots from non-error values
-        binPivots = []
-        sortedValues = sorted(allbin, key=lambda x: x[0])
-
-        if options.histogram_even_interval:
-            binsize = len(sortedValues)/nbins
-            pivotIdx = 0
-            for i in range(math.ceil(len(sortedValues)/binsize)):
-                firstVal = sortedValues[int(pivotIdx)][0]
-                binPivots.append(firstVal)
-                pivotIdx += binsize
-
+        rows = list(self.source.rows)  # as binned, in case the source is sorted later
+        vals = array.array('d')  # value of each row as float; NaN for nulls and errors
+        errors = []  # positions of rows with errors
+        isNull = isNullFunc()
+        nullValue = options.null_value
+        for batch in genBatches(rows, 'binning'):
+            typedvals = origCol.getTypedValuesBatch(batch)
+            if isPlainTypes(set(map(type, typedvals))) and (nullValue is None or nullValue not in typedvals):
+                try:
+                    vals.extend(list(map(float, typedvals)))
+                    continue
+                except Exception:
+                    pass  # convert values individually
+            for v in typedvals:
+                try:
+                    if isinstance(v, TypedExceptionWrapper):
+                        raise v.exception
+                    vals.append(math.nan if isNull(v) else float(v))
+                except Exception:
+                    errors.append(len(vals))
+                    vals.append(math.nan)
+
+        if math.inf in vals or -math.inf in vals:  # infinities fit in no range, so are binned with errors
+            for i, v in enumerate(vals):
+                if math.isinf(v):
+                    errors.append(i)
+                    vals[i] = math.nan
+
+        finite = vals if vals == vals else array.array('d', filter(math.isfinite, vals))  # only NaN != NaN
+        nbins = options.histogram_bins or int(math.sqrt(len(finite))) or 1
+
+        names = []  # [bin number] -> name of the range
+        if not finite:
+            binnums = array.array('l', [0]*len(vals))
+        elif options.histogram_even_interval:
+            ordered = sorted(finite)
+            edges = sorted(set(ordered[len(ordered)*i//nbins] for i in range(nbins)))  # lowest value of each bin
+            wholes = origCol.type in (int, len)
+            for lo, hi in zip(edges, edges[1:]):
+                names.append(self.rangeName(lo, hi-1 if wholes else hi))
+            names.append('>=%s' % self.formatEdge(edges[-1]))
+            nullbin = len(names)
+            bisect_right = bisect.bisect_right
+            binnums = array.array('l', (bisect_right(edges, v)-1 if v == v else nullbin for v in vals))
         else:
-            minval, maxval = sortedValues[0][0], sortedValues[-1][0]
-            binWidth = (maxval - minval)/nbins
-            binPivots = list((minval + binWidth*i) for i in range(0, nbins))
-
-        binPivots.append(None)
-
-        # put rows into bins (as self.rows) based on values
-        binMinIdx = 0
-        binMin = 0
-
-        for binMax in binPivots[1:-1]:
-            binrows = []
-            for i, (v, row) in enumerate(sortedValues[binMinIdx:]):
-                if binMax != binPivots[-2] and v > binMax:
-                    break
-                binrows.append(row)
-
-            binMaxDispVal = origCol.format(binMax)
-            binMinDispVal = origCol.format(binMin)
-            if binMinIdx == 0:
-                binName = '<=%s' % binMaxDispVal
-            elif binMax == binPivots[-2]:
-                binName = '>=%s' % binMinDispVal
+            lo, hi = min(finite), max(finite)
+            wholes = origCol.type in (int, len)  # bins of whole numbers, named by their first and last values
+            if wholes:
+                width = max(1, math.ceil((hi-lo+1)/nbins))
             else:
-                binName = '%s-%s' % (binMinDispVal, binMaxDispVal)
-
-            self.addRow((binName, binrows))
-            binMinIdx += i
-            binMin = binMax
-
-        if errorbin:
-            self.rows.insert(0, ('errors', errorbin))
-
-        ntallied = sum(len(x[1]) for x in self.rows)
-        assert ntallied == len(self.source.rows), (ntallied, len(self.source.rows))
+                width = (hi-lo)/nbins or 1  # a single bin if all values are the same
+            nbins = min(nbins, int((hi-lo)//width)+1)  # no bins starting after hi
+            for i in range(nbins):
+                names.append(self.rangeName(lo+i*width, min(hi, lo+(i+1)*width-1 if wholes else lo+(i+1)*width)))
+            nullbin, lastbin = nbins, nbins-1
+            binnums = array.array('l', (min(int((v-lo)//width), lastbin) if v == v else nullbin for v in vals))
+
+        nullbin = len(names)
+        names.append(None)
+        if errors:
+            names.append('errors')
+            for i in errors:
+                binnums[i] = nullbin+1
+
+        counts = collections.Counter(binnums)
+        self.bins = FreqBins(rows, binnums, len(names))
+        for b in reversed(range(nullbin, len(names))):  # errors and nulls first, if any
+            if counts[b]:
+                self.addRow(([names[b]], FreqBin(self.bins, b, counts[b])))
+        for b in range(nullbin):  # then all ranges in order
+            self.addRow(([names[b]], FreqBin(self.bins, b, counts[b])))
+
+        self.largest = max([self.largest] + list(counts.values()))
+
+    def rangeName(self, first, last):
+        if first == last:
+            return self.formatEdge(first)
+        return '%s-%s' % (self.formatEdge(first), self.formatEdge(last))
+
+    def formatEdge(self, v):
+        'Format the bin edge `v` as a value of the key column.'
+        origCol = self.origCols[0]
+        if origCol.type is date:
+            v = date(v)
+        elif origCol.type in (int, len):
+            v = int(v)
+        return origCol.format(v)
+
+    def binKeys(self, rows):
+        'Return (distinct typed keys in order of first appearance, array of the number of the key of each of `rows`).'
+        # values of different types which compare equal (1, 1.0, True) are distinct keys in anytype columns
+        anycols = [c.type is anytype for c in self.origCols]
+        nulls = isNullFunc()
+        def isNull(v):
+            try:
+                return nulls(v)
+            except TypeError:  # unhashable, so not a null value
+                return False
+        keynums = {}  # [typed key] -> number
+        firstvals = {}  # [(column number, FormattedKey)] -> first unhashable value with that display
+        nums = array.array('l')
+        for batch in genBatches(rows, 'binning'):
+            typedcols = [c.getTypedValuesBatch(batch) for c in self.origCols]
+            typedcols = [list(zip(map(type, vals), vals)) if isany else vals for isany, vals in zip(anycols, typedcols)]
+            keys = typedcols[0] if len(typedcols) == 1 else list(zip(*typedcols))
+            try:
+                newkeys = dict.fromkeys(keys)
+            except TypeError:  # unhashable values are binned by their display; nulls and errors as they are
+                for i, (c, isany, vals) in enumerate(zip(self.origCols, anycols, typedcols)):
+                    for j, v in enumerate(vals):
+                        val = v[1] if isany else v
+                        if not isNull(val):
+                            vals[j] = FormattedKey(formatKey(c, val))
+                            firstvals.setdefault((i, vals[j]), v)
+                keys = typedcols[0] if len(typedcols) == 1 else list(zip(*typedcols))
+                newkeys = dict.fromkeys(keys)
+
+            for k in newkeys:
+                if k not in keynums:
+                    keynums[k] = len(keynums)
+            nums.extend(map(keynums.__getitem__, keys))
+
+        keys = [(k,) for k in keynums] if len(self.origCols) == 1 else list(keynums)
+        if firstvals:
+            keys = [tuple(firstvals[(i, v)] if type(v) is FormattedKey else v for i, v in enumerate(k)) for k in keys]
+        if any(anycols):
+            keys = [tuple(v[1] if isany and type(v) is tuple else v for isany, v in zip(anycols, k)) for k in keys]
+        return keys, nums
 
     def discreteBinning(self):
-        rowidx = {}
-        for r in Progress(self.source.rows, 'binning'):
-            keys = list(forward(c.getTypedValue(r)) for c in self.origCols)
-
-            # wrapply will pass-through a key-able TypedWrapper
-            formatted_keys = tuple(wrapply(c.format, c.getTypedValue(r)) for c in self.origCols)
-            histrow = rowidx.get(formatted_keys)
-            if histrow is None:
-                histrow = (keys, [])
-                rowidx[formatted_keys] = histrow
-                self.addRow(histrow)
-            histrow[1].append(r)
-            self.largest = max(self.largest, len(histrow[1]))
-
-        self.rows.sort(key=lambda r: len(r[1]), reverse=True)  # sort by num reverse
-
+        rows = list(self.source.rows)  # as binned, in case the source is sorted later
+        keys, keynums = self.binKeys(rows)
+
+        # merge keys which are displayed the same, formatting each key only once
+        formatted = list(zip(*[formatKeys(c, [k[i] for k in keys]) for i, c in enumerate(self.origCols)]))
+        binnums = {}  # [formatted keys] -> bin number
+        binkeys = []  # [bin number] -> typed keys of the first key in that bin
+        keybins = []  # [key number] -> bin number
+        for typedvals, formatted_keys in zip(keys, formatted):
+            b = binnums.get(formatted_keys)
+            if b is None:
+                b = binnums[formatted_keys] = len(binkeys)
+                binkeys.append([forward(tv) for tv in typedvals])
+            keybins.append(b)
+
+        if len(binkeys) < len(keys):
+            keynums = array.array('l', map(keybins.__getitem__, keynums))
+
+        counts = collections.Counter(keynums)
+        self.bins = FreqBins(rows, keynums, len(binkeys))
+        for b in sorted(range(len(binkeys)), key=lambda b: -counts[b]):  # by count descending, then by first appearance
+            self.addRow((binkeys[b], FreqBin(self.bins, b, counts[b])))
+
+        self.largest = max([self.largest] + list(counts.values()))
 
     @asyncthread
     def reload(self):
         'Generate histrow for each row and then reverse-sort by length.'
         self.rows = []
+        self.bins = None  # FreqBins of the rows, if binned here
+
+        if options.numeric_binning and len(self.origCols) == 1 and isNumeric(self.origCols[0]):
+            self.numericBinning()
+        else:
+            self.discreteBinning()
 
-#        if len(self.origCols) == 1 and self.origCols[0].type in (int, float, currency):
-#            self.numericBinning()
-#        else:
-        self.discreteBinning()
+        # group the rows of all bins now, if they will be needed to compute aggregates
+        if self.bins and any(not c.hidden for c in self.columns[len(self.origCols)+3:]):
+            self.bins.groupRows()
 
         # automatically add cache to all columns now that everything is binned
         for c in self.nonKeyVisibleCols:
-            c._cachedValues = collections.OrderedDict()
+            if c._cachedValues:
+                c._cachedValues.clear()
+            c._cachedValues = ColumnCache(c)
 
 SheetFreqTable.addCommand('t', 'stoggle-row', 'toggle([cursorRow]); cursorDown(1)')
 SheetFreqTable.addCommand('s', 'select-row', 'select([cursorRow]); cursorDown(1)')
 SheetFreqTable.addCommand('u', 'unselect-row', 'unselect([cursorRow]); cursorDown(1)')
 
-SheetFreqTable.addCommand(ENTER, 'dup-row', 'vs = copy(source); vs.name += "_"+valueNames(cursorRow[0]); vs.rows=copy(cursorRow[1]); vd.push(vs)')
+SheetFreqTable.addCommand(ENTER, 'dup-row', 'vs = copy(source); vs.name += "_"+valueNames(cursorRow[0]); vs.rows=list(cursorRow[1]); vd.push(vs)')
 #        Command('v', 'options.histogram_even_interval = not options.histogram_even_interval; reload()', 'toggle histogram_even_interval option')
@@ -1,12 +1,21 @@
 import collections
 import itertools
 import functools
+import heapq
+import operator
+import pickle
+import tempfile
 from copy import copy
 
-from visidata import asyncthread, Progress, status, fail, error
+from visidata import asyncthread, genBatches, isPlainTypes, TypedWrapper, Progress, status, fail, error, option, options
+from visidata import date, currency
 from visidata import ColumnItem, ColumnExpr, SubrowColumn, Sheet, Column
 from visidata import SheetsSheet
 
+option('join_method', 'auto', 'how to match keys for inner/outer/full/diff joins: "hash" in memory, "merge" by sorting keys (in temporary files if needed), or "auto" to merge when the sheets to hash have more than join_max_rows')
+option('join_max_rows', 5000000, 'most join keys to hash or sort in memory')
+option('extend_freeze', False, 'copy the values of the columns from other sheets when extending, instead of reading them from those sheets')
+
 SheetsSheet.addCommand('&', 'join-sheets', 'vd.replace(createJoinedSheet(selectedRows or fail("no sheets selected to join"), jointype=chooseOne(jointypes)))')
 
 def createJoinedSheet(sheets, jointype=''):
@@ -25,29 +34,232 @@ def createJoinedSheet(sheets, jointype=''):
 
 jointypes = {k:k for k in ["inner", "outer", "full", "diff", "append", "extend"]}
 
-def joinkey(sheet, row):
-    return tuple(c.getDisplayValue(row) for c in sheet.keyCols)
-
-
-def groupRowsByKey(sheets, rowsBySheetKey, rowsByKey):
-    with Progress(gerund='grouping', total=sum(len(vs.rows) for vs in sheets)*2) as prog:
-        for vs in sheets:
-            # tally rows by keys for each sheet
-            rowsBySheetKey[vs] = collections.defaultdict(list)
-            for r in vs.rows:
-                prog.addProgress(1)
-                key = joinkey(vs, r)
-                rowsBySheetKey[vs][key].append(r)
-
-        for vs in sheets:
-            for r in vs.rows:
-                prog.addProgress(1)
-                key = joinkey(vs, r)
-                if key not in rowsByKey: # gather for this key has not been done yet
-                    # multiplicative for non-unique keys
-                    rowsByKey[key] = []
-                    for crow in itertools.product(*[rowsBySheetKey[vs2].get(key, [None]) for vs2 in sheets]):
-                        rowsByKey[key].append([key] + list(crow))
+def joinKeyTypes(sheets):
+    'Return the type to hash each key position by, or None to hash its display values.  Typed values are used only when all sheets have the same type for that key column.'
+    hashable = (int, float, str, date, currency)  # types which convert their own values back unchanged
+    ret = []
+    for cols in itertools.zip_longest(*(vs.keyCols for vs in sheets)):
+        types = set(c.type if c else None for c in cols)
+        t = types.pop() if len(types) == 1 else None
+        ret.append(t if t in hashable else None)
+    return ret
+
+
+def keyValuesBatch(col, keytype, rows):
+    'Return list of hashable key values of `col` for each of `rows`.'
+    if not keytype:
+        return col.getDisplayValuesBatch(rows)
+
+    vals = col.getTypedValuesBatch(rows)
+    if not isPlainTypes(set(map(type, vals))):
+        for i, v in enumerate(vals):
+            if isinstance(v, TypedWrapper):  # errors and nulls join by their display
+                vals[i] = col.getDisplayValue(rows[i])
+    if keytype in (float, currency):
+        for i, v in enumerate(vals):
+            if v != v:  # NaN is not equal to itself, so it joins by its display too
+                vals[i] = col.getDisplayValue(rows[i])
+    return vals
+
+
+def joinkey(sheet, row, keytypes):
+    return tuple(keyValuesBatch(c, t, [row])[0] for c, t in zip(sheet.keyCols, keytypes))
+
+
+def genKeys(vs, keytypes, gerund):
+    'Generate (row, key) for each row of `vs`, computing the key columns a batch at a time.'
+    for rows in genBatches(vs.rows, gerund):
+        keyvals = [keyValuesBatch(c, t, rows) for c, t in zip(vs.keyCols, keytypes)]
+        yield from zip(rows, zip(*keyvals) if keyvals else itertools.repeat(()))
+
+
+def genRowNums(vs, keytypes, gerund):
+    'Generate (row number, key) for each row of `vs`.'
+    for i, (row, key) in enumerate(genKeys(vs, keytypes, gerund)):
+        yield i, key
+
+
+class RowsByKey:
+    'Rows (or row numbers) of one sheet hashed by join key.  Most keys have a single row, so only the extra rows of repeated keys are kept in lists.'
+    def __init__(self, rowkeys):
+        self.first = {}  # key -> first row with that key
+        self.more = {}  # key -> list of subsequent rows with that key
+        for row, key in rowkeys:
+            if key in self.first:
+                self.more.setdefault(key, []).append(row)
+            else:
+                self.first[key] = row
+
+    def __contains__(self, key):
+        return key in self.first
+
+    def keys(self):
+        'Keys in order of first appearance.'
+        return self.first.keys()
+
+    def get(self, key):
+        'Return list of rows with the given `key`; empty if none.'
+        if key not in self.first:
+            return []
+        return [self.first[key]] + self.more.get(key, [])
+
+
+def combineRowNums(key, matches):
+    'Generate (key, (rownum0, rownum1, ...)) for every combination of matching row numbers; None for sheets without any.'
+    for nums in itertools.product(*(rownums or [None] for rownums in matches)):
+        yield key, nums
+
+
+def joinedRows(sheets, joined):
+    'Generate [key, row0, row1, ...] for each (key, row numbers) of `joined`.'
+    allrows = [vs.rows for vs in sheets]
+    for key, nums in joined:
+        yield [key] + [rows[i] if i is not None else None for rows, i in zip(allrows, nums)]
+
+
+def probeSheetNum(sheets, jointype):
+    'Index of the sheet to stream against the others in a hash join.'
+    if jointype == 'inner':  # the largest sheet
+        return max(range(len(sheets)), key=lambda i: len(sheets[i].rows))
+    return 0  # all rows of the first sheet are kept, in order
+
+
+def joinRows(sheets, jointype):
+    '''Generate joined rows of `sheets` for `jointype`, with a hash join or a merge join according to options.join_method.
+    A hash join gives rows in the order of the first sheet, then (for full and diff joins) the keys found only on the others, in order of first appearance.
+    A merge join gives rows in key order, as they are merged, so that the rows joined need not all be kept to be reordered.'''
+    method = options.join_method
+    if method == 'auto':
+        probenum = probeSheetNum(sheets, jointype)
+        nhashed = sum(len(vs.rows) for i, vs in enumerate(sheets) if i != probenum)
+        method = 'merge' if nhashed > options.join_max_rows else 'hash'
+
+    if method == 'hash':
+        return hashJoinRows(sheets, jointype)
+    elif method == 'merge':
+        return mergeJoinRows(sheets, jointype)
+    fail('unknown join_method "%s"' % method)
+
+
+def hashJoinRowNums(sheets, jointype, keytypes, probenum):
+    'Generate (key, row numbers) of the joined rows for `jointype`.  All sheets but `probenum` are hashed by key; that one is streamed against them.'
+    indexes = [None if i == probenum else RowsByKey(genRowNums(vs, keytypes, 'hashing')) for i, vs in enumerate(sheets)]
+    probeKeys = set()  # for full and diff, the keys already joined
+
+    for rownum, key in genRowNums(sheets[probenum], keytypes, 'joining'):
+        matches = [idx.get(key) if idx else [rownum] for idx in indexes]
+        if jointype == 'inner':  # only rows with matching key on all sheets
+            if not all(matches):
+                continue
+        elif jointype in ('full', 'diff'):
+            probeKeys.add(key)
+            if jointype == 'diff' and all(matches):  # only rows without matching key on all sheets
+                continue
+        yield from combineRowNums(key, matches)
+
+    if jointype in ('full', 'diff'):
+        # keys not on the first sheet, in order of appearance on the others
+        for idx in indexes[1:]:
+            for key in idx.keys():
+                if key not in probeKeys:
+                    probeKeys.add(key)
+                    yield from combineRowNums(key, [[]] + [idx2.get(key) for idx2 in indexes[1:]])
+
+
+def hashJoinRows(sheets, jointype):
+    'Generate joined rows of `sheets` for `jointype`, hashing all sheets but the one streamed.'
+    probenum = probeSheetNum(sheets, jointype)
+    joined = hashJoinRowNums(sheets, jointype, joinKeyTypes(sheets), probenum)
+    if probenum != 0:  # streamed in the order of another sheet; put back in the order of the first
+        joined = sorted(joined, key=operator.itemgetter(1))
+    return joinedRows(sheets, joined)
+
+
+def sortableKeyFuncs(keytypes):
+    'Return (func to make a key orderable, func to get the key back).  Typed keys may have display values (str) in place of errors and nulls, which are ordered after them.'
+    if all(t in (None, str) for t in keytypes):  # all str already
+        return tuple, tuple
+    return (lambda key: tuple((type(v) is str, v) for v in key),
+            lambda skey: tuple(v for _, v in skey))
+
+
+def spillRun(run):
+    'Write the sorted `run` to a temporary file, and return a generator that reads it back.'
+    fp = tempfile.TemporaryFile()
+    for i in range(0, len(run), 10000):
+        pickle.dump(run[i:i+10000], fp, pickle.HIGHEST_PROTOCOL)
+    fp.seek(0)
+
+    def _readRun():
+        with fp:
+            while True:
+                try:
+                    batch = pickle.load(fp)
+                except EOFError:
+                    return
+                yield from batch
+    return _readRun()
+
+
+def sortedKeys(vs, keytypes, sortableKey, maxrows):
+    'Generate (sortable key, row number) for each row of `vs` in key order.  Runs of `maxrows` are sorted in memory, and merged from temporary files if there are more than one.'
+    runs = []
+    run = []
+    for i, key in genRowNums(vs, keytypes, 'sorting'):
+        run.append((sortableKey(key), i))
+        if len(run) >= maxrows:
+            run.sort()  # quick if already ordered
+            runs.append(spillRun(run))
+            run = []
+
+    run.sort()
+    if not runs:
+        return iter(run)
+    runs.append(iter(run))  # the last run stays in memory
+    return heapq.merge(*runs)
+
+
+def mergeJoinRowNums(sheets, jointype, keytypes):
+    'Generate (key, row numbers) of the joined rows for `jointype`, in key order, by merging the keys of each sheet in sorted order.'
+    sortableKey, unsortableKey = sortableKeyFuncs(keytypes)
+    maxrows = max(1, options.join_max_rows//len(sheets))
+    groups = [itertools.groupby(sortedKeys(vs, keytypes, sortableKey, maxrows), key=operator.itemgetter(0)) for vs in sheets]
+
+    def nextGroup(g):
+        'Return (sortable key, row numbers) for the next key of a sheet, or None when it has no more.'
+        for skey, idxs in g:
+            return skey, [i for _, i in idxs]
+
+    heads = [nextGroup(g) for g in groups]
+    with Progress(gerund='merging', total=sum(len(vs.rows) for vs in sheets)) as prog:
+        while any(heads):
+            if jointype == 'inner' and not all(heads):
+                break
+            if jointype == 'outer' and not heads[0]:
+                break
+
+            skey = min(h[0] for h in heads if h)
+            matches = []
+            for i, h in enumerate(heads):
+                if h and h[0] == skey:
+                    matches.append(h[1])
+                    prog.addProgress(len(h[1]))
+                    heads[i] = nextGroup(groups[i])
+                else:
+                    matches.append([])
+
+            if jointype == 'inner' and not all(matches):  # only rows with matching key on all sheets
+                continue
+            if jointype == 'outer' and not matches[0]:  # all rows from first sheet
+                continue
+            if jointype == 'diff' and all(matches):  # only rows without matching key on all sheets
+                continue
+            yield from combineRowNums(unsortableKey(skey), matches)
+
+
+def mergeJoinRows(sheets, jointype):
+    'Generate joined rows of `sheets` for `jointype`, in key order, matching keys by merging the sorted keys of each sheet.  Only the row numbers of one key are held at a time.'
+    return joinedRows(sheets, mergeJoinRowNums(sheets, jointype, joinKeyTypes(sheets)))
 
 
 #### slicing and dicing
@@ -74,45 +286,56 @@ class SheetJoin(Sheet):
                 newname = c.name if ctr[c.name] == 1 else '%s_%s' % (vs.name, c.name)
                 self.addColumn(SubrowColumn(newname, c, sheetnum+1))
 
-        rowsBySheetKey = {}
-        rowsByKey = {}
+        self.rows = []
+        for combinedRow in joinRows(sheets, self.jointype):
+            self.addRow(combinedRow)
 
-        groupRowsByKey(sheets, rowsBySheetKey, rowsByKey)
 
-        self.rows = []
+## for ExtendedSheet_reload below
+class ExtendedColumn(Column):
+    'A column of another sheet, on the rows of the first sheet of an extend join.  Reads through the matching source rows found by the join, or through a frozen list of values.'
+    frozen = None  # list of values, by position in sheet.joinBaseRows
 
-        with Progress(gerund='joining', total=len(rowsByKey)) as prog:
-            for k, combinedRows in rowsByKey.items():
-                prog.addProgress(1)
+    def srcValues(self, srcrows):
+        'Return list of values of the source column for each of `srcrows`; None where there is no row.'
+        vals = iter(self.sourceCol.getValuesBatch([r for r in srcrows if r is not None]))
+        return [next(vals) if r is not None else None for r in srcrows]
 
-                if self.jointype == 'full':  # keep all rows from all sheets
-                    for combinedRow in combinedRows:
-                        self.addRow(combinedRow)
+    def freeze(self):
+        'Keep the values of this column for all rows, instead of reading them from the source sheet.'
+        self.frozen = self.srcValues(self.sheet.joinSrcRows[self.sheetnum])
 
-                elif self.jointype == 'inner':  # only rows with matching key on all sheets
-                    for combinedRow in combinedRows:
-                        if all(combinedRow):
-                            self.addRow(combinedRow)
+    def calcValue(self, row):
+        i = self.sheet.joinRowNums.get(id(row))
+        if i is None:  # added after the join
+            key = joinkey(self.sheet.joinSources[0], row, self.sheet.joinKeyTypes)
+            srcsheet = self.sheet.joinSources[self.sheetnum]
+            srcrows = self.sheet.rowsBySheetKey[srcsheet].get(key)
+            if srcrows:
+                return self.sourceCol.calcValue(srcrows[0])
+            return None
 
-                elif self.jointype == 'outer':  # all rows from first sheet
-                    for combinedRow in combinedRows:
-                        if combinedRow[1]:
-                            self.addRow(combinedRow)
+        if self.frozen is not None:
+            return self.frozen[i]
 
-                elif self.jointype == 'diff':  # only rows without matching key on all sheets
-                    for combinedRow in combinedRows:
-                        if not all(combinedRow):
-                            self.addRow(combinedRow)
+        srcrow = self.sheet.joinSrcRows[self.sheetnum][i]
+        if srcrow is not None:
+            return self.sourceCol.calcValue(srcrow)
 
+    def getValuesBatch(self, rows):
+        if self._cachedValues is not None:
+            return super().getValuesBatch(rows)
 
-## for ExtendedSheet_reload below
-class ExtendedColumn(Column):
-    def calcValue(self, row):
-        key = joinkey(self.sheet.joinSources[0], row)
-        srcsheet = self.sheet.joinSources[self.sheetnum]
-        srcrow = self.sheet.rowsBySheetKey[srcsheet][key]
-        if srcrow[0]:
-            return self.sourceCol.calcValue(srcrow[0])
+        nums = self.sheet.joinRowNums
+        idxs = [nums.get(id(r)) for r in rows]
+        if None in idxs:
+            return super().getValuesBatch(rows)
+
+        if self.frozen is not None:
+            return [self.frozen[i] for i in idxs]
+
+        srcrows = self.sheet.joinSrcRows[self.sheetnum]
+        return self.srcValues([srcrows[i] for i in idxs])
 
 
 @asyncthread
@@ -137,19 +360,30 @@ def ExtendedSheet_reload(self, sheets):
             newcol = ExtendedColumn(newname, sheetnum=sheetnum+1, sourceCol=c)
             self.addColumn(newcol)
 
-    self.rowsBySheetKey = {}  # [srcSheet][key] -> list(rowobjs from sheets[0])
-    rowsByKey = {}  # [key] -> [key, rows0, rows1, ...]
+    self.joinKeyTypes = joinKeyTypes(sheets)
+    self.rowsBySheetKey = {vs: RowsByKey(genKeys(vs, self.joinKeyTypes, 'hashing')) for vs in sheets[1:]}  # [srcSheet] -> rows by key
 
-    groupRowsByKey(sheets, self.rowsBySheetKey, rowsByKey)
+    self.joinBaseRows = []  # rows of the first sheet; kept so that their ids in joinRowNums stay unique
+    self.joinRowNums = {}  # [id(row)] -> position in joinBaseRows
+    self.joinSrcRows = [None] + [[] for vs in sheets[1:]]  # [sheetnum][position] -> first matching row on that sheet, or None
 
     self.rows = []
-
-    with Progress(gerund='joining', total=len(rowsByKey)) as prog:
-        for k, combinedRows in rowsByKey.items():
-            prog.addProgress(1)
-            for combinedRow in combinedRows:
-                if combinedRow[1]:
-                    self.addRow(combinedRow[1])
+    for row, key in genKeys(sheets[0], self.joinKeyTypes, 'joining'):
+        self.joinRowNums[id(row)] = len(self.joinBaseRows)
+        self.joinBaseRows.append(row)
+
+        # each row once per combination of matching rows, as with an outer join
+        n = 1
+        for srcrows, idx in zip(self.joinSrcRows[1:], self.rowsBySheetKey.values()):
+            matches = idx.get(key)
+            srcrows.append(matches[0] if matches else None)
+            n *= len(matches) or 1
+        for i in range(n):
+            self.addRow(row)
+
+    if options.extend_freeze:
+        for c in Progress([c for c in self.columns if isinstance(c, ExtendedColumn)], 'freezing'):
+            c.freeze()
 
 
 ## for SheetConcat
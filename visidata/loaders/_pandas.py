@@ -1,23 +1,68 @@
 from visidata import *
 
 
-class DataFrameAdapter:
-    def __init__(self, df):
+class PandasRow:
+    'The row at position `pos` of DataFrame `df`.  Fields are read by column name, as `row[colname]`.'
+    __slots__ = ('df', 'pos', '__weakref__')
+
+    def __init__(self, df, pos):
         self.df = df
+        self.pos = pos
+
+    def __getitem__(self, colname):
+        return self.df[colname].iat[self.pos]
+
+    def __setitem__(self, colname, v):
+        self.df.iat[self.pos, self.df.columns.get_loc(colname)] = v
+
+    def __deepcopy__(self, memo):
+        return PandasRow(self.df, self.pos)  # another row at the same position, not another DataFrame
+
+    def __repr__(self):
+        return 'PandasRow(%d)' % self.pos
+
+
+class PandasColumn(Column):
+    'Column `expr` of DataFrame `df`, read from its underlying array by row position.'
+    def __init__(self, name, df, expr, **kwargs):
+        super().__init__(name, df=df, expr=expr, **kwargs)
+        self.dtypeType = self.type  # as deduced from the dtype, for which vectorised operations are equivalent
+        self._array = None
+
+    @property
+    def array(self):
+        'The values of the column as a numpy array; taken again after any value is set.'
+        if self._array is None:
+            self._array = self.df[self.expr].to_numpy()
+        return self._array
+
+    def isVectorizable(self):
+        return self.type is self.dtypeType
+
+    def isSortable(self):
+        'True if the values can be sorted by numpy: numbers, booleans and datetimes, but not arbitrary objects.'
+        return self.isVectorizable() and self.array.dtype.kind in 'biufmM'
 
-    def __len__(self):
-        return len(self.df)
+    def calcValue(self, row):
+        return self.array[row.pos]
 
-    def __getitem__(self, k):
-        if isinstance(k, slice):
-            return DataFrameAdapter(self.df[k])
-        return self.df.iloc[k]
+    def setValue(self, row, value):
+        self.df.iat[row.pos, self.df.columns.get_loc(self.expr)] = value
+        self._array = None
 
-    def __getattr__(self, k):
-        return getattr(self.df, k)
+    def getValues(self, rows):
+        'Values at the given row positions, taken straight from the array for int and float columns when there is no null_value to leave out.'
+        if self.isVectorizable() and self.type in (int, float) and isinstance(rows, list) and options.null_value is None:
+            return self.array[rowPositions(rows)].tolist()
+        return super().getValues(rows)
 
 
-# source=DataFrame
+def rowPositions(rows):
+    import numpy
+    return numpy.fromiter((r.pos for r in rows), dtype=numpy.intp, count=len(rows))
+
+
+# rowdef: PandasRow
 class PandasSheet(Sheet):
     def reload(self):
         import pandas
@@ -36,8 +81,128 @@ class PandasSheet(Sheet):
             readfunc = getattr(pandas, 'read_'+filetype) or error('no pandas.read_'+filetype)
             self.df = readfunc(self.source.resolve(), **options('pandas_'+filetype+'_'))
 
-        self.columns = [ColumnItem(col, type=dtypeToType(self.df, col)) for col in self.df.columns]
-        self.rows = DataFrameAdapter(self.df)
+        self.columns = [PandasColumn(col, self.df, col, type=dtypeToType(self.df, col)) for col in self.df.columns]
+        self.rows = [PandasRow(self.df, i) for i in range(len(self.df))]
+
+    def isVectorizable(self, col):
+        return isinstance(col, PandasColumn) and col.df is self.df and col.isVectorizable()
+
+    @asyncthread
+    def orderBy(self, *cols, reverse=False):
+        'Sort with DataFrame.sort_values if all `cols` are DataFrame columns; otherwise sort by typed values.'
+        if not cols or not all(self.isVectorizable(c) and c.isSortable() for c in cols):
+            return super().orderBy(*cols, reverse=reverse)
+
+        import pandas
+        with Progress(total=len(self.rows), gerund='sorting') as prog:
+            rows = self.rows
+            positions = rowPositions(rows)
+            keys = pandas.DataFrame({i: c.array[positions] for i, c in enumerate(cols)})
+            order = keys.sort_values(list(keys.columns), ascending=not reverse, kind='mergesort').index
+            # must not reassign self.rows: replace contents instead
+            self.rows[:] = [rows[i] for i in order]
+            prog.addProgress(len(rows))
+
+
+class PandasBin(list):
+    'Source rows in one bin of a PandasFreqTable, with the aggregates computed by groupby.'
+    def __init__(self, rows, aggvals):
+        super().__init__(rows)
+        self.aggvals = aggvals  # [colname] -> aggregate
+
+
+class PandasFreqTable(SheetFreqTable):
+    '''Frequency table of a PandasSheet, binned with DataFrame.groupby when possible.
+    Aggregates of DataFrame columns are then computed by groupby too, for the aggregators which give the same results.'''
+    groupbyAggregators = dict(min='min', max='max', sum='sum', avg='mean', mean='mean', count='count')
+
+    def __init__(self, sheet, *columns):
+        super().__init__(sheet, *columns)
+        nkeys = len(self.origCols)
+        aggpairs = [(c, aggr) for c in self.source.visibleCols for aggr in getattr(c, 'aggregators', [])]
+        self.aggCandidates = []  # [(freqcol, origcol, groupby aggregation)]
+        for col, (c, aggr) in zip(self.columns[nkeys+3:], aggpairs):
+            func = self.groupbyAggregators.get(aggr.__name__)
+            if func and isinstance(c, PandasColumn):
+                col.getter = lambda col,row,getter=col.getter: row[1].aggvals[col.name] if col.name in getattr(row[1], 'aggvals', ()) else getter(col, row)
+                self.aggCandidates.append((col, c, func))
+
+    def groupbyAggregates(self, positions, binnums, nbins):
+        '''Return list of dict of aggregates of each bin, for the columns where groupby agrees exactly with the aggregators:
+        int columns, and min/max/count of float columns without NaN (a value to the aggregators, but skipped by pandas); only while options.null_value is unset.'''
+        import numpy
+        import pandas
+        ret = [{} for b in range(nbins)]
+        if options.null_value is not None:
+            return ret
+        src = self.source
+        for col, c, func in self.aggCandidates:
+            if not src.isVectorizable(c) or c.type not in (int, float):
+                continue
+            if c.type is float and func in ('sum', 'mean'):
+                continue  # pandas adds floats in another order than sum(), which can differ in the last digit
+            vals = c.array[positions]
+            if c.type is float and numpy.isnan(vals).any():
+                continue
+            if c.type is int and func == 'sum' and len(vals) and int(numpy.abs(vals).max())*len(vals) >= 2**63:
+                continue  # might overflow int64
+            results = pandas.Series(vals).groupby(binnums).agg(func)
+            for b, v in zip(results.index.tolist(), results.tolist()):
+                ret[b][col.name] = v
+        return ret
+
+    def canVectorize(self):
+        src = self.source
+        return isinstance(src, PandasSheet) and all(src.isVectorizable(c) for c in self.origCols)
+
+    def discreteBinning(self):
+        if not self.canVectorize():
+            return super().discreteBinning()
+
+        import numpy
+        import pandas
+        rows = self.source.rows
+        positions = rowPositions(rows)
+        ncols = len(self.origCols)
+        keydf = pandas.DataFrame({i: c.array[positions] for i, c in enumerate(self.origCols)})
+        try:
+            groups = keydf.groupby(list(keydf.columns) if ncols > 1 else 0, sort=False, dropna=False).indices
+        except TypeError:  # unhashable values in an object column
+            return super().discreteBinning()
+
+        # merge groups of values which are displayed the same, as discreteBinning does
+        bins = {}  # [formatted_keys] -> (keys, [arrays of indexes into source rows])
+        for k, idxs in Progress(groups.items(), 'binning', total=len(groups)):
+            vals = k if ncols > 1 else (k,)
+            typedvals = [wrapply(c.type, v) for c, v in zip(self.origCols, vals)]
+            formatted_keys = tuple(wrapply(c.format, tv) for c, tv in zip(self.origCols, typedvals))
+            b = bins.get(formatted_keys)
+            if b is None:
+                bins[formatted_keys] = ([forward(tv) for tv in typedvals], [idxs])
+            else:
+                b[1].append(idxs)
+
+        binidxs = []
+        for keys, idxlist in bins.values():
+            idxs = idxlist[0] if len(idxlist) == 1 else numpy.sort(numpy.concatenate(idxlist))
+            binidxs.append((keys, idxs))
+
+        # by count descending, then by first appearance
+        binidxs.sort(key=lambda b: (-len(b[1]), b[1][0]))
+
+        binnums = numpy.empty(len(rows), dtype=numpy.intp)  # [index into source rows] -> bin number
+        for b, (keys, idxs) in enumerate(binidxs):
+            binnums[idxs] = b
+        aggvals = self.groupbyAggregates(positions, binnums, len(binidxs))
+
+        for (keys, idxs), aggs in zip(binidxs, aggvals):
+            self.addRow((keys, PandasBin((rows[i] for i in idxs.tolist()), aggs)))
+
+        self.largest = max([self.largest] + [len(r[1]) for r in self.rows])
+
+
+PandasSheet.addCommand('F', 'freq-col', 'vd.push(PandasFreqTable(sheet, cursorCol))')
+PandasSheet.addCommand('gF', 'freq-keys', 'vd.push(PandasFreqTable(sheet, *keyCols))')
 
 
 def view_pandas(df):
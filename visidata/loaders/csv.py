@@ -1,5 +1,6 @@
 
 from visidata import *
+import io
 import csv
 
 replayableOption('csv_dialect', 'excel', 'dialect passed to csv.reader')
@@ -39,8 +40,30 @@ class CsvSheet(Sheet):
 def csvoptions():
     return options('csv_')
 
+def setupColumns(vs, rdr):
+    'Create columns on `vs` from the header rows of csv reader `rdr`.'
+    # headers first, to setup columns before adding rows
+    headers = [wrappedNext(rdr) for i in range(int(options.header))]
+
+    if headers:
+        # columns ideally reflect the max number of fields over all rows
+        vs.columns = ArrayNamedColumns('\\n'.join(x) for x in zip(*headers))
+    else:
+        r = wrappedNext(rdr)
+        vs.addRow(r)
+        vs.columns = ArrayColumns(len(vs.rows[0]))
+
+    if not vs.columns:
+        vs.columns = [ColumnItem(0)]
+
+    vs.recalc()  # make columns usable
+
+
 def load_csv(vs):
     'Convert from CSV, first handling header row specially.'
+    if options.worker_processes > 1 and canParseInChunks(vs.source):
+        return load_csv_parallel(vs)
+
     with vs.source.open_text() as fp:
         for i in range(options.skip):
             wrappedNext(fp)  # discard initial lines
@@ -50,35 +73,22 @@ def load_csv(vs):
         else:
             rdr = csv.reader(fp, **csvoptions())
 
-        vs.rows = []
-
-        # headers first, to setup columns before adding rows
-        headers = [wrappedNext(rdr) for i in range(int(options.header))]
+        addRow = startRows(vs, ragged=True)
 
-        if headers:
-            # columns ideally reflect the max number of fields over all rows
-            vs.columns = ArrayNamedColumns('\\n'.join(x) for x in zip(*headers))
-        else:
-            r = wrappedNext(rdr)
-            vs.addRow(r)
-            vs.columns = ArrayColumns(len(vs.rows[0]))
+        setupColumns(vs, rdr)
 
-        if not vs.columns:
-            vs.columns = [ColumnItem(0)]
-
-        vs.recalc()  # make columns usable
-        with Progress(total=vs.source.filesize) as prog:
+        with Progress(total=vs.source.filesize, unit='bytes') as prog:
             try:
                 samplelen = 0
                 for i in range(options_num_first_rows):  # for progress below
                     row = wrappedNext(rdr)
-                    vs.addRow(row)
+                    addRow(row)
                     samplelen += sum(len(x) for x in row)
 
                 samplelen //= options_num_first_rows  # avg len of first n rows
 
                 while True:
-                    vs.addRow(wrappedNext(rdr))
+                    addRow(wrappedNext(rdr))
                     prog.addProgress(samplelen)
             except StopIteration:
                 pass  # as expected
@@ -87,6 +97,119 @@ def load_csv(vs):
     return vs
 
 
+def canParseInChunks(p):
+    'True if csv at Path `p` can be split into byte ranges at newlines and quote characters.'
+    if not isMappable(p):
+        return False
+    dialect = csv.reader([], **csvoptions()).dialect
+    if dialect.escapechar:  # escaped quotes would throw off the quote count
+        return False
+    enc = options.encoding
+    return splitsAtNewlines(enc) and len((dialect.quotechar or '"').encode(enc)) == 1
+
+
+chunk_end_marker = 'visidata-chunk-end-0f1e2d'  # a line appended to each chunk, to see where its last row ended
+
+
+def parseCsvChunk(args):
+    '''Parse the csv rows in bytes [start:end) of file `fn`.  Run in a worker process.
+    Return (rows, aligned), where `aligned` is False if the last row did not end at `end` (e.g. a stray quote threw off the chunk boundaries).'''
+    fn, start, end, encoding, encoding_errors, csvopts, safety_first = args
+    with open(fn, 'rb') as fp:
+        fp.seek(start)
+        text = fp.read(end-start).decode(encoding, encoding_errors)
+
+    if safety_first:
+        text = text.replace('\0', '')
+
+    if not text.endswith('\n'):
+        text += '\n'
+
+    rdr = csv.reader(io.StringIO(text + chunk_end_marker + '\n', newline=None), **csvopts)
+    rows = []
+    try:
+        while True:
+            rows.append(wrappedNext(rdr))
+    except StopIteration:
+        pass
+
+    if rows and rows[-1] == [chunk_end_marker]:
+        return rows[:-1], True
+    return rows, False
+
+
+def load_csv_parallel(vs):
+    'Split CSV into byte ranges at safe record boundaries, parse them on options.worker_processes processes, and add rows in order.'
+    import mmap
+    import multiprocessing
+
+    fn = vs.source.resolve()
+    encoding, encoding_errors = options.encoding, options.encoding_errors
+    csvopts = csvoptions()
+    dialect = csv.reader([], **csvopts).dialect
+    nworkers = options.worker_processes
+
+    with open(fn, 'rb') as fp:
+        for i in range(options.skip):
+            fp.readline()  # discard initial lines
+
+        lines = iter(lambda: fp.readline().decode(encoding, encoding_errors), '')
+        if options.safety_first:
+            lines = removeNulls(lines)
+
+        addRow = startRows(vs, ragged=True)
+        setupColumns(vs, csv.reader(lines, **csvopts))
+        start = fp.tell()
+
+        if start >= vs.source.filesize:
+            return vs
+
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with mm:
+        quote = dialect.quotechar.encode(encoding) if dialect.quotechar and dialect.quoting != csv.QUOTE_NONE else b''
+        bounds = chunkBoundaries(mm, start, nworkers, quote)
+
+    tasks = [(fn, lo, hi, encoding, encoding_errors, csvopts, options.safety_first) for lo, hi in zip(bounds, bounds[1:])]
+
+    with Progress(total=vs.source.filesize-start, unit='bytes') as prog:
+        with multiprocessing.Pool(nworkers) as pool:
+            for (fn, lo, hi, *_), (rows, aligned) in zip(tasks, pool.imap(parseCsvChunk, tasks)):
+                if not aligned:
+                    # the chunk started at a record boundary but its last record continued past its end
+                    status('quotes do not balance after byte %s; parsing the rest serially' % lo)
+                    break
+                for row in rows:
+                    addRow(row)
+                prog.addProgress(hi-lo)
+            else:
+                lo = None
+
+        if lo is not None:
+            parseCsvSerially(fn, lo, addRow, prog)
+
+    vs.recalc()
+    return vs
+
+
+def parseCsvSerially(fn, start, addRow, prog):
+    'Parse the rest of the csv file `fn` from byte offset `start` in this thread.'
+    encoding, encoding_errors = options.encoding, options.encoding_errors
+    with open(fn, 'rb') as fp:
+        fp.seek(start)
+        lines = iter(lambda: fp.readline().decode(encoding, encoding_errors), '')
+        if options.safety_first:
+            lines = removeNulls(lines)
+        rdr = csv.reader(lines, **csvoptions())
+        try:
+            while True:
+                row = wrappedNext(rdr)
+                addRow(row)
+                prog.addProgress(sum(len(x) for x in row))
+        except StopIteration:
+            pass
+
+
 @asyncthread
 def save_csv(p, sheet):
     'Save as single CSV file, handling column names as first line.'
@@ -95,5 +218,9 @@ def save_csv(p, sheet):
         colnames = [col.name for col in sheet.visibleCols]
         if ''.join(colnames):
             cw.writerow(colnames)
-        for r in Progress(sheet.rows, 'saving'):
-            cw.writerow([col.getDisplayValue(r) for col in sheet.visibleCols])
+        vcols = sheet.visibleCols
+        for batch in genBatches(sheet.rows, 'saving'):
+            if vcols:
+                cw.writerows(zip(*[col.getDisplayValuesBatch(batch) for col in vcols]))
+            else:
+                cw.writerows([] for r in batch)
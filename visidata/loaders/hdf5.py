@@ -1,5 +1,9 @@
 from visidata import *
 
+option('h5_max_chunks', 100, 'maximum number of chunks of an hdf5 dataset to keep in memory')
+
+h5_min_page_rows = 1024  # read at least this many rows at a time, in whole chunks
+
 class SheetH5Obj(Sheet):
     'Support sheets in HDF5 format.'
     def reload(self):
@@ -15,16 +19,30 @@ class SheetH5Obj(Sheet):
         elif isinstance(self.source, h5py.Dataset):
             if len(self.source.shape) == 1:
                 self.columns = [ColumnItem(colname, colname) for colname in self.source.dtype.names or [0]]
-                self.rows = self.source[:]  # copy
+                self.rows = self.datasetRows(self.source)
             elif len(self.source.shape) == 2:  # matrix
                 self.columns = ArrayColumns(self.source.shape[1])
-                self.rows = self.source[:]  # copy
+                self.rows = self.datasetRows(self.source)
             else:
                 status('too many dimensions in shape %s' % str(self.source.shape))
         else:
             status('unknown h5 object type %s' % type(self.source))
         self.recalc()
 
+    def datasetRows(self, ds):
+        'Rows of dataset `ds`, read as they are accessed in pages of whole chunks.'
+        if ds.chunks:
+            chunkrows = ds.chunks[0]
+            pagesize = chunkrows * max(1, -(-h5_min_page_rows // chunkrows))
+            maxpages = max(1, options.h5_max_chunks * chunkrows // pagesize)
+        else:  # contiguous; count pages as chunks
+            pagesize = h5_min_page_rows
+            maxpages = options.h5_max_chunks
+
+        return PagedRows(self, len(ds), pagesize,
+                    lambda n: list(ds[n*pagesize:(n+1)*pagesize]),
+                    maxpages=maxpages)
+
 SheetH5Obj.addCommand(ENTER, 'dive-row', 'vd.push(SheetH5Obj(joinSheetnames(name,cursorRow.name), source=cursorRow))')
 SheetH5Obj.addCommand('A', 'dive-metadata', 'vd.push(SheetDict(cursorRow.name + "_attrs", cursorRow.attrs))')
 
@@ -1,11 +1,15 @@
+import io
 import json
+import re
 
-from visidata import options, option, status, date, deduceType
+from visidata import options, option, replayableOption, status, exceptionCaught, date, deduceType
 from visidata import PythonSheet, ColumnItem, stacktrace, asyncthread, Progress
-from visidata import wrapply, TypedExceptionWrapper, TypedWrapper
+from visidata import wrapply, TypedExceptionWrapper, TypedWrapper, isMappable, chunkBoundaries
 
 
 option('json_indent', None, 'indent to use when saving json')
+replayableOption('jsonl_sample', 1000, 'number of jsonl lines to decode for columns before handing the rest to worker processes')
+replayableOption('json_path', '', 'dotted path of keys to the array of rows within a json document')
 
 
 def open_json(p):
@@ -15,6 +19,129 @@ def open_jsonl(p):
     return JSONSheet(p.name, source=p, jsonlines=True)
 
 
+class ExtraDataError(ValueError):
+    'More data after the json array of rows, as in jsonl whose first line is an array.'
+
+
+class JsonStream:
+    'Incrementally decode json values from a text file, reading only as much as needed.'
+    whitespace = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, fp, prog, chunksize=65536):
+        self.fp = fp
+        self.prog = prog
+        self.chunksize = chunksize
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.started = False
+        self.multiline = False  # True once a newline has been passed within the json, so it cannot be jsonl
+
+    def fill(self, n=0):
+        'Append at least n more characters to the buffer, discarding what has been consumed.  Return False at end of file.'
+        chunk = self.fp.read(max(n, self.chunksize))
+        if not chunk:
+            self.eof = True
+            return False
+        self.prog.addProgress(len(chunk))
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        'Skip whitespace and return the next character, or "" at end of file.'
+        while True:
+            m = self.whitespace.match(self.buf, self.pos)
+            if self.started and not self.multiline and '\n' in m.group():
+                self.multiline = True
+            self.pos = m.end()
+            if self.pos < len(self.buf):
+                self.started = True
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, ch):
+        c = self.peek()
+        if c != ch:
+            raise ValueError('expected %r but found %r' % (ch, c))
+        self.pos += 1
+
+    def value(self):
+        'Decode the next complete json value, reading more of the file as necessary.'
+        self.peek()
+        n = self.chunksize
+        while True:
+            try:
+                v, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a value ending right at the buffer end (e.g. a number) may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    if not self.multiline and '\n' in self.buf[self.pos:end]:
+                        self.multiline = True
+                    self.pos = end
+                    return v
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill(n)
+            n *= 2
+
+    def iterArray(self, path=()):
+        'Generate the elements of the array found by following the object keys in `path`.'
+        for key in path:
+            self.expect('{')
+            while True:
+                if self.peek() != '"':
+                    raise ValueError('json_path key %r not found' % key)
+                k = self.value()
+                self.expect(':')
+                if k == key:
+                    break
+                self.value()
+                if self.peek() == ',':
+                    self.pos += 1
+
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+        else:
+            while True:
+                yield self.value()
+                if self.peek() != ',':
+                    self.expect(']')
+                    break
+                self.pos += 1
+
+        if not path and self.peek():
+            raise ExtraDataError('extra data after json array')
+
+
+def decodeJsonLines(args):
+    'Decode the json lines in bytes [start:end) of file `fn`.  Run in a worker process.'
+    fn, start, end, encoding, encoding_errors = args
+    with open(fn, 'rb') as fp:
+        fp.seek(start)
+        text = fp.read(end-start).decode(encoding, encoding_errors)
+
+    rows = []
+    errors = []  # [(index, line, exception, stacktrace)]
+    firstvals = {}  # [key] -> first value seen, in order of first appearance
+    for i, L in enumerate(io.StringIO(text, newline=None)):
+        try:
+            row = json.loads(L)
+        except Exception as e:
+            errors.append((i, L, e, stacktrace()))
+            row = None
+        else:
+            if isinstance(row, dict) and not (row.keys() <= firstvals.keys()):
+                for k, v in row.items():
+                    firstvals.setdefault(k, v)
+        rows.append(row)
+
+    return rows, [(k, deduceType(v)) for k, v in firstvals.items()], errors
+
+
 class JSONSheet(PythonSheet):
     @asyncthread
     def reload(self):
@@ -27,44 +154,110 @@ class JSONSheet(PythonSheet):
             except ValueError as e:
                 status('trying jsonl')
                 self.jsonlines = True
+                self.colnames = {}
+                self.columns.clear()
 
         if self.jsonlines:
             self.reload_jsonl()
 
     def reload_json(self):
         self.rows = []
-        with self.source.open_text() as fp:
-            ret = json.load(fp)
+        path = [k for k in options.json_path.split('.') if k]
+        with self.source.open_text() as fp, Progress(gerund='reading', total=self.source.filesize, unit='bytes') as prog:
+            stream = JsonStream(fp, prog)
+            if not path and stream.peek() == '{':
+                chunks = [stream.buf[stream.pos:]]
+                for chunk in iter(lambda: fp.read(stream.chunksize), ''):
+                    prog.addProgress(len(chunk))
+                    chunks.append(chunk)
+                ret = json.loads(''.join(chunks))
+                self.rows = [ret]
+                self.columns = []
+                for k in self.rows[0]:
+                    self.addColumn(ColumnItem(k, type=deduceType(self.rows[0][k])))
+                return
 
-        if isinstance(ret, dict):
-            self.rows = [ret]
-            self.columns = []
-            for k in self.rows[0]:
-                self.addColumn(ColumnItem(k, type=deduceType(self.rows[0][k])))
-        else:
-            self.rows = []
-            for row in Progress(ret):
-                self.addRow(row)
+            try:
+                for row in stream.iterArray(path):
+                    self.addRow(row)
+            except ExtraDataError:
+                raise  # the file is jsonl; its rows are loaded again from the start
+            except ValueError as e:
+                if not stream.multiline:
+                    raise  # a bad first line, which may yet be jsonl
+                exceptionCaught(e)  # keep the rows loaded before the error
 
     def reload_jsonl(self):
+        if options.worker_processes > 1 and isMappable(self.source):
+            return self.reload_jsonl_parallel()
+
         with self.source.open_text() as fp:
             self.rows = []
             for L in fp:
-                try:
-                    self.addRow(json.loads(L))
-                except Exception as e:
-                    e.stacktrace = stacktrace()
-                    self.addRow(TypedExceptionWrapper(json.loads, L, exception=e))
+                self.addLine(L)
+
+    def reload_jsonl_parallel(self):
+        'Decode the first options.jsonl_sample lines here, then the rest in batches on options.worker_processes processes.'
+        import mmap
+        import multiprocessing
+
+        fn = self.source.resolve()
+        encoding, encoding_errors = options.encoding, options.encoding_errors
+        nworkers = options.worker_processes
+
+        self.rows = []
+        with open(fn, 'rb') as fp:
+            for i in range(options.jsonl_sample):
+                L = fp.readline()
+                if not L:
+                    break
+                self.addLine(L.decode(encoding, encoding_errors))
+
+            start = fp.tell()
+            if start >= self.source.filesize:
+                return
+
+            mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        with mm:
+            bounds = chunkBoundaries(mm, start, nworkers)
+
+        tasks = [(fn, lo, hi, encoding, encoding_errors) for lo, hi in zip(bounds, bounds[1:])]
+
+        with Progress(gerund='loading', total=self.source.filesize-start, unit='bytes') as prog:
+            with multiprocessing.Pool(nworkers) as pool:
+                for (fn, lo, hi, *_), (rows, keys, errors) in zip(tasks, pool.imap(decodeJsonLines, tasks)):
+                    for i, L, e, trace in errors:
+                        e.stacktrace = trace
+                        rows[i] = TypedExceptionWrapper(json.loads, L, exception=e)
+
+                    for k, t in keys:
+                        self.addKeyColumn(k, t)
+
+                    for row in rows:  # columns already merged from the worker's keys
+                        PythonSheet.addRow(self, row)
+                    prog.addProgress(hi-lo)
+
+    def addLine(self, L):
+        try:
+            self.addRow(json.loads(L))
+        except Exception as e:
+            e.stacktrace = stacktrace()
+            self.addRow(TypedExceptionWrapper(json.loads, L, exception=e))
+
+    def addKeyColumn(self, k, type):
+        if k not in self.colnames:
+            c = ColumnItem(k, type=type)
+            self.colnames[k] = c
+            self.addColumn(c)
 
     def addRow(self, row, index=None):
         super().addRow(row, index=index)
-        if isinstance(row, dict):
+        if isinstance(row, dict) and not (row.keys() <= self.colnames.keys()):
             for k in row:
                 if k not in self.colnames:
-                    c = ColumnItem(k, type=deduceType(row[k]))
-                    self.colnames[k] = c
-                    self.addColumn(c)
-            return row
+                    self.addKeyColumn(k, deduceType(row[k]))
+        return row
 
     def newRow(self):
         return {}
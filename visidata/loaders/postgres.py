@@ -1,4 +1,11 @@
 from visidata import *
+import contextlib
+import weakref
+
+option('postgres_fetch_rows', 10000, 'number of rows to fetch from postgres per round trip')
+option('postgres_pool_size', 4, 'maximum number of connections to each postgres database')
+option('postgres_estimate_rows', False, 'show row counts estimated from the postgres catalog instead of counting rows')
+option('postgres_timeout', 60, 'seconds to wait for one of the pooled connections to a postgres database to be free')
 
 def codeToType(type_code, colname):
     import psycopg2
@@ -14,34 +21,88 @@ def codeToType(type_code, colname):
 
 
 def openurl_postgres(url, filetype=None):
-    import psycopg2
-
     dbname = url.path[1:]
-    conn = psycopg2.connect(
-                user=url.username,
-                dbname=dbname,
-                host=url.hostname,
-                port=url.port,
-                password=url.password)
+    sql = SQL(user=url.username,
+              dbname=dbname,
+              host=url.hostname,
+              port=url.port,
+              password=url.password)
 
-    return PgTablesSheet(dbname+"_tables", sql=SQL(conn))
+    return PgTablesSheet(dbname+"_tables", sql=sql)
 
 
 class SQL:
-    def __init__(self, conn):
-        self.conn = conn
-
-    def cur(self, qstr):
+    'Connections to one database, shared by all of its sheets.'
+    def __init__(self, **connargs):
+        import psycopg2.pool
+        self.connargs = connargs
+        self.pool = psycopg2.pool.ThreadedConnectionPool(1, options.postgres_pool_size, **connargs)
+        self.available = threading.BoundedSemaphore(self.pool.maxconn)  # the pool fails instead of waiting when all are in use
+
+    def getconn(self):
+        'Return a pooled connection, waiting up to options.postgres_timeout seconds for one to be free.'
+        if not self.available.acquire(timeout=options.postgres_timeout):
+            fail('all %d connections to %s are in use' % (self.pool.maxconn, self.connargs['dbname']))
+        return self.pool.getconn()
+
+    def connect(self):
+        'Return a new connection of its own, outside the pool.'
+        import psycopg2
+        return psycopg2.connect(**self.connargs)
+
+    def putconn(self, conn):
+        self.pool.putconn(conn)  # also rolls back any open transaction
+        self.available.release()
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def newcursor(self, conn, **kwargs):
+        'Return a new server-side (named) cursor on `conn`.'
         randomname = ''.join(random.choice(string.ascii_uppercase) for _ in range(6))
-        cur = self.conn.cursor(randomname)
-        cur.execute(qstr)
-        return cur
+        return conn.cursor(randomname, **kwargs)
+
+    @contextlib.contextmanager
+    def cur(self, qstr, **kwargs):
+        'Server-side cursor for the results of `qstr`, on a pooled connection for the duration of the context.'
+        with self.connection() as conn:
+            with self.newcursor(conn, **kwargs) as cur:
+                cur.execute(qstr)
+                yield cur
+
+    def execute(self, qstr, args=None):
+        'Return all result rows of a (small) query.'
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(qstr, args)
+                return cur.fetchall()
+
+    def estimateRowCounts(self, tablename=None):
+        'Return dict of table name to number of rows estimated by the last VACUUM or ANALYZE, for tables (or just `tablename`) which have one.'
+        qstr = "SELECT c.relname, c.reltuples::bigint FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'm') AND c.reltuples >= 0"
+        if tablename:
+            return dict(self.execute(qstr + " AND c.relname = %s", (tablename,)))
+        return dict(self.execute(qstr))
 
     @asyncthread
     def query_async(self, qstr, callback=None):
         with self.cur(qstr) as cur:
             callback(cur)
-            cur.close()
+
+
+def fetchBatches(cur):
+    'Generate lists of rows from `cur`, options.postgres_fetch_rows at a time.'
+    n = options.postgres_fetch_rows
+    while True:
+        rows = cur.fetchmany(n)
+        if not rows:
+            break
+        yield rows
 
 
 def cursorToColumns(cur):
@@ -64,28 +125,40 @@ class PgTablesSheet(Sheet):
             self.nrowsPerTable = {}
 
             self.rows = []
-            # try to get first row to make cur.description available
-            r = cur.fetchone()
-            if r:
-                self.addRow(r)
+            batches = fetchBatches(cur)
+            # fetch first batch to make cur.description available
+            firstbatch = next(batches, [])
             self.columns = cursorToColumns(cur)
             self.setKeys(self.columns[0:1])  # table_name is the key
             self.addColumn(Column('nrows', type=int, getter=lambda col,row: col.sheet.getRowCount(row[0])))
 
-            for r in cur:
-                self.addRow(r)
+            for rows in itertools.chain([firstbatch], batches):
+                for r in rows:
+                    self.addRow(r)
 
-    def setRowCount(self, cur):
-        result = cur.fetchall()
-        tablename = result[0][0]
-        self.nrowsPerTable[tablename] = result[0][1]
+        if options.postgres_estimate_rows:
+            self.nrowsPerTable.update(self.sql.estimateRowCounts())
 
-    def getRowCount(self, tablename):
-        if tablename not in self.nrowsPerTable:
-            thread = self.sql.query_async("SELECT '%s', COUNT(*) FROM %s" % (tablename, tablename), callback=self.setRowCount)
-            self.nrowsPerTable[tablename] = thread
+        uncounted = [r[0] for r in self.rows if r[0] not in self.nrowsPerTable]
+        if uncounted:
+            thread = self.countRows(uncounted)
+            for tablename in uncounted:
+                self.nrowsPerTable[tablename] = thread
+
+    @asyncthread
+    def countRows(self, tablenames):
+        'Count rows of each of `tablenames`.  The count of a table which cannot be counted is the exception raised.'
+        for tablename in Progress(tablenames, 'counting'):
+            try:
+                self.nrowsPerTable[tablename] = self.sql.execute("SELECT COUNT(*) FROM " + tablename)[0][0]
+            except Exception as e:
+                self.nrowsPerTable[tablename] = e
 
-        return self.nrowsPerTable[tablename]
+    def getRowCount(self, tablename):
+        n = self.nrowsPerTable.get(tablename)
+        if isinstance(n, Exception):
+            raise n
+        return n
 
 PgTablesSheet.addCommand(ENTER, 'dive-row', 'vd.push(PgTable(name+"."+cursorRow[0], source=cursorRow[0], sql=sql))')
 
@@ -93,14 +166,57 @@ PgTablesSheet.addCommand(ENTER, 'dive-row', 'vd.push(PgTable(name+"."+cursorRow[
 class PgTable(Sheet):
     @asyncthread
     def reload(self):
+        self.closePageCursor()
+        if options.sql_page_rows:
+            return self.reload_paged()
+
         with self.sql.cur("SELECT * FROM " + self.source) as cur:
             self.rows = []
-            r = cur.fetchone()
-            if r:
-                self.addRow(r)
+            batches = fetchBatches(cur)
+            firstbatch = next(batches, [])
             self.columns = cursorToColumns(cur)
-            for r in cur:
-                self.addRow(r)
-
+            for rows in itertools.chain([firstbatch], batches):
+                for r in rows:
+                    self.addRow(r)
+
+    def reload_paged(self):
+        'Count rows (or estimate them, with options.postgres_estimate_rows), then fetch pages from a scrollable server-side cursor as they are accessed.'
+        size = options.sql_page_rows
+        nrows = None
+        if options.postgres_estimate_rows:
+            nrows = self.sql.estimateRowCounts(self.source).get(self.source)
+        estimated = nrows is not None
+        if not estimated:
+            nrows = self.sql.execute("SELECT COUNT(*) FROM " + self.source)[0][0]
+
+        firstpage = self.openPageCursor().fetchmany(size)
+        self.columns = cursorToColumns(self.pagecursor)
+        self.rows = PagedRows(self, nrows, size, self.fetchPage, estimated=estimated)
+        self.rows.setPage(0, firstpage)
+
+    def openPageCursor(self):
+        'Declare the scrollable cursor for pages, on a connection of its own rather than one of the pool, until the next reload or until this sheet is quit or gone.'
+        conn = self.sql.connect()
+        self.pageconnCloser = weakref.finalize(self, conn.close)
+        self.pagecursor = self.sql.newcursor(conn, scrollable=True, withhold=True)
+        self.pagecursor.execute("SELECT * FROM " + self.source)
+        conn.commit()  # the WITH HOLD cursor outlives the transaction, which would otherwise stay open and hold its snapshot
+        conn.autocommit = True  # and fetching from it does not begin another
+        return self.pagecursor
+
+    def closePageCursor(self):
+        if getattr(self, 'pageconnCloser', None):
+            self.pageconnCloser()  # closes the cursor with its connection
+            self.pageconnCloser = self.pagecursor = None
+
+    def close(self):
+        self.closePageCursor()
+
+    def fetchPage(self, n):
+        size = self.rows.pagesize
+        if not self.pagecursor:  # closed when quit; declared again if pushed again
+            self.openPageCursor()
+        self.pagecursor.scroll(n*size, mode='absolute')
+        return self.pagecursor.fetchmany(size)
 
 addGlobals(globals())
@@ -1,37 +1,169 @@
+import threading
+
 from visidata import *
 
 def open_sqlite(path):
     vs = SqliteSheet(path.name + '_tables', path, 'sqlite_master')
     vs.columns = vs.getColumns('sqlite_master')
-    vs.addCommand(ENTER, 'dive-row', 'vd.push(SqliteSheet(joinSheetnames(source.name, cursorRow[1]), sheet, cursorRow[1]))')
+    vs.addCommand(ENTER, 'dive-row', 'vd.push(SqliteSheet(joinSheetnames(source.name, columns[1].getValue(cursorRow)), sheet, columns[1].getValue(cursorRow)))')
     return vs
 open_db = open_sqlite
 
 
+def sqlName(name):
+    'Quote `name` as an SQL identifier.'
+    return '"%s"' % name.replace('"', '""')
+
+
 class SqliteSheet(Sheet):
-    'Provide functionality for importing SQLite databases.'
+    '''Provide functionality for importing SQLite databases.
+    Rows of tables with a rowid start with it (hidden), so that rows can be found again by SQL queries.'''
+    sqlOrder = ''  # ORDER BY clause of the current query
+
     def __init__(self, name, pathOrSheet, tableName):
         super().__init__(name, source=pathOrSheet, tableName=tableName)
+        self._queryRows = None
+        self._queryLen = 0
+        self._hasRowid = None
+        self._byRowid = None  # [rowid] -> row, of pristine unpaged rows
         if isinstance(pathOrSheet, Sheet):
             self.conn = pathOrSheet.conn
+            self.connLock = pathOrSheet.connLock
         elif isinstance(pathOrSheet, Path):
             import sqlite3
-            self.conn = sqlite3.connect(pathOrSheet.resolve())
+            # paged rows may be fetched from other threads; reads only, one at a time
+            self.conn = sqlite3.connect(pathOrSheet.resolve(), check_same_thread=False)
+            self.connLock = threading.RLock()
+
+    def execute(self, sql, params=()):
+        'Return all result rows of `sql`, holding the lock on the connection.'
+        with self.connLock:
+            return self.conn.execute(sql, params).fetchall()
 
-    # must not be @asyncthread due to sqlite lib being single-threaded
+    @asyncthread
     def reload(self):
         tblname = self.tableName
         self.columns = self.getColumns(tblname)
-        r = self.conn.execute('SELECT COUNT(*) FROM %s' % tblname).fetchall()
-        rowcount = r[0][0]
-        self.rows = []
-        for row in Progress(self.conn.execute("SELECT * FROM %s" % tblname), total=rowcount-1):
-            self.addRow(row)
+        rowcount = self.execute('SELECT COUNT(*) FROM %s' % tblname)[0][0]
+        if options.sql_page_rows:
+            keyOf = (lambda r: r[0]) if self.hasRowid() else None
+            self.rows = PagedRows(self, rowcount, options.sql_page_rows, self.fetchPage, keyOf=keyOf, lock=self.connLock)
+            self._pageStarts = {0: None} if keyOf else None  # [pagenum] -> last rowid before page
+        else:
+            self.rows = []
+            with self.connLock:
+                for row in Progress(self.conn.execute(self.query(self.columnsSql())), total=rowcount-1):
+                    self.addRow(row)
+        self._queryRows = self.rows
+        self._queryLen = len(self.rows)
+        self._byRowid = None
+
+    def query(self, what='*', where='', groupby='', orderby=None):
+        q = 'SELECT %s FROM %s' % (what, self.tableName)
+        if where:
+            q += ' WHERE ' + where
+        if groupby:
+            q += ' GROUP BY ' + groupby
+        orderby = self.sqlOrder if orderby is None else orderby
+        if orderby:
+            q += ' ORDER BY ' + orderby
+        return q
+
+    def hasRowid(self):
+        if self._hasRowid is None:
+            import sqlite3
+            try:
+                self.execute('SELECT rowid FROM %s LIMIT 1' % self.tableName)
+                self._hasRowid = True
+            except sqlite3.OperationalError:  # views and WITHOUT ROWID tables
+                self._hasRowid = False
+        return self._hasRowid
+
+    def columnsSql(self):
+        'What to SELECT for each row.'
+        return 'rowid, *' if self.hasRowid() else '*'
+
+    def fetchPage(self, n):
+        'Fetch rows of page `n`; following on by rowid from the previous page if it was fetched in table order, otherwise by OFFSET.'
+        size = self.rows.pagesize
+        if self.sqlOrder or self._pageStarts is None:
+            return self.execute(self.query(self.columnsSql()) + ' LIMIT %d OFFSET %d' % (size, n*size))
+
+        if n in self._pageStarts:
+            after = self._pageStarts[n]
+            rows = self.execute(self.query('rowid, *', where='' if after is None else 'rowid > %d' % after, orderby='rowid') + ' LIMIT %d' % size)
+        else:
+            rows = self.execute(self.query('rowid, *', orderby='rowid') + ' LIMIT %d OFFSET %d' % (size, n*size))
+
+        if rows:
+            self._pageStarts[n+1] = rows[-1][0]
+        return rows
+
+    def isPristine(self):
+        'True if rows are still exactly the result of the last query, so SQL can stand in for them.'
+        if isinstance(self.rows, PagedRows) and self.rows._list is not None:
+            return False
+        return self.rows is self._queryRows and len(self.rows) == self._queryLen
+
+    def isSqlColumn(self, col):
+        'True if `col` is a table column still being interpreted as its SQL type.'
+        return getattr(col, 'sql', None) and col in self.columns and col.type is col.sqltype
+
+    @asyncthread
+    def orderBy(self, *cols, reverse=False):
+        'Re-query with ORDER BY if all `cols` are table columns and rows are pristine; otherwise sort in memory.'
+        if not cols or not self.isPristine() or self._selectedRows or not all(self.isSqlColumn(c) for c in cols):
+            if cols:
+                self._queryRows = None  # no longer in the order of the query
+            return super().orderBy.__wrapped__(self, *cols, reverse=reverse)  # re-querying would lose the selection
+
+        self.sqlOrder = ', '.join(c.sql + (' DESC' if reverse else '') for c in cols)
+        if self.hasRowid():
+            self.sqlOrder += ', rowid'  # a stable sort, as in memory
+        if isinstance(self.rows, PagedRows):
+            self.rows.reset()
+        else:
+            with Progress(total=len(self.rows), gerund='sorting') as prog:
+                # must not reassign self.rows: replace contents instead
+                self.rows[:] = self.execute(self.query(self.columnsSql()))
+                prog.addProgress(len(self.rows))
+            self._byRowid = None
+
+        for c in self.columns:
+            if c._cachedValues:
+                c._cachedValues.clear()  # keyed by id of the previous rows
+
+    def rowsWhere(self, cond, params=()):
+        '''Return rows of this sheet for which SQL expression `cond` is true, found by rowid.
+        Rows of views and WITHOUT ROWID tables are found by value instead; being indistinguishable by `cond`, equal rows all match.'''
+        if not self.hasRowid():
+            matches = set(self.execute(self.query(where=cond, orderby=''), params))
+            return (r for r in Progress(self.rows, 'selecting') if r in matches)  # a generator, so paged rows are selected as they are fetched
+
+        if isinstance(self.rows, PagedRows) and self.rows._list is None:
+            return self.rows.rowsFor(self.execute(self.query('rowid, *', where=cond), params))
+
+        if self.isPristine():
+            if self._byRowid is None:
+                self._byRowid = {r[0]: r for r in self.rows}
+            return [self._byRowid[r[0]] for r in self.execute(self.query('rowid', where=cond), params)]
+
+        rowids = set(r[0] for r in self.execute(self.query('rowid', where=cond, orderby=''), params))
+        return [r for r in Progress(self.rows, 'selecting') if r[0] in rowids]
+
+    def selectWhere(self, cond, unselect=False):
+        'Select (or unselect) rows for which SQL expression `cond` is true, as evaluated by SQLite.'
+        rows = self.rowsWhere(cond)
+        if unselect:
+            self.unselect(rows, progress=False)
+        else:
+            self.select(rows, progress=False)
 
     def getColumns(self, tableName):
         cols = []
-        for i, r in enumerate(self.conn.execute('PRAGMA TABLE_INFO(%s)' % tableName)):
-            c = ColumnItem(r[1], i)
+        first = 1 if tableName == self.tableName and self.hasRowid() else 0  # past the rowid
+        for i, r in enumerate(self.execute('PRAGMA TABLE_INFO(%s)' % tableName)):
+            c = ColumnItem(r[1], first+i, sql=sqlName(r[1]))
             t = r[2].lower()
             if t == 'integer':
                 c.type = int
@@ -44,10 +176,122 @@ class SqliteSheet(Sheet):
             else:
                 status('unknown sqlite type "%s"' % t)
 
+            c.sqltype = c.type
             cols.append(c)
             if r[-1]:
                 self.setKeys([c])
 
         return cols
 
+
+class SqliteBin(collections.abc.Sequence):
+    'Rows of `sheet` whose values in `cols` are `keys`.  Counted by SQL; found by rowid with a WHERE on the keys only when accessed.'
+    def __init__(self, sheet, cols, keys, count):
+        self.sheet = sheet
+        self.cols = cols
+        self.keys = keys
+        self.count = count
+        self.aggvals = {}  # [colname] -> aggregate computed by SQL
+        self._rows = None
+
+    def __len__(self):
+        return self.count
+
+    def __copy__(self):
+        return list(self.rows)
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            cond = ' AND '.join('%s IS ?' % c.sql for c in self.cols)
+            self._rows = list(self.sheet.rowsWhere(cond, self.keys))
+        return self._rows
+
+    def __getitem__(self, i):
+        return self.rows[i]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class SqliteFreqTable(SheetFreqTable):
+    '''Frequency table of a SqliteSheet, counted and aggregated with GROUP BY when that gives the same bins and aggregates as counting in memory.
+    Otherwise, and for other aggregators, the rows are counted and aggregated as by SheetFreqTable.'''
+    sqlAggregators = dict(min='MIN', max='MAX', sum='COALESCE(SUM(%s), 0)', avg='AVG', mean='AVG')  # sum() of no values is 0
+    storageClasses = {int: "'integer'", float: "'integer', 'real'", str: "'text'"}  # SQLite values typed the same by each type
+
+    def __init__(self, sheet, *columns):
+        super().__init__(sheet, *columns)
+        nkeys = len(self.origCols)
+        aggpairs = [(c, aggr) for c in self.source.visibleCols for aggr in getattr(c, 'aggregators', [])]
+        self.aggCandidates = []  # [(freqcol, origcol, sql)] for aggregates SQLite might compute
+        for col, (c, aggr) in zip(self.columns[nkeys+3:], aggpairs):
+            func = self.sqlAggregators.get(aggr.__name__)
+            if func and c.type in (int, float):
+                col.getter = lambda col,row,getter=col.getter: row[1].aggvals[col.name] if col.name in getattr(row[1], 'aggvals', ()) else getter(col, row)
+                self.aggCandidates.append((col, c, func if '%s' in func else func + '(%s)'))
+
+    def canPushDown(self):
+        src = self.source
+        return (isinstance(src, SqliteSheet) and src.isPristine() and src.hasRowid() and not src.sqlOrder
+                    and all(src.isSqlColumn(c) and c.type in (int, str) and not c._fmtstr for c in self.origCols))
+
+    def typedAsStored(self, cols):
+        '''Return the set of `cols` whose values are all stored as SQLite types which are typed the same in memory (or NULL).
+        Integers must also be small enough to be formatted distinctly as floats.'''
+        src = self.source
+        checks = []
+        for c in cols:
+            check = 'typeof(%s) NOT IN (%s, \'null\')' % (c.sql, self.storageClasses[c.type])
+            if c.type is int:
+                check += ' OR ABS(%s) >= %d' % (c.sql, 2**53)
+            checks.append('MAX(%s)' % check)
+        r = src.execute(src.query(', '.join(checks), orderby=''))[0]
+        return set(c for c, bad in zip(cols, r) if not bad)
+
+    @asyncthread
+    def reload(self):
+        import sqlite3
+        if not self.canPushDown():
+            return super().reload.__wrapped__(self)
+
+        src = self.source
+        try:
+            aggCols = [c for col, c, sql in self.aggCandidates if src.isSqlColumn(c)]
+            ok = self.typedAsStored(list(self.origCols) + aggCols)
+            if not all(c in ok for c in self.origCols):
+                return super().reload.__wrapped__(self)
+
+            sqlAggs = []  # [(freqcol, sql)] of aggregates computed by SQL
+            if options.null_value is None:  # else values equal to it are left out of aggregates
+                sqlAggs = [(col, sql % c.sql) for col, c, sql in self.aggCandidates if c in ok]
+            keysql = ', '.join(c.sql for c in self.origCols)
+            what = ', '.join([keysql, 'COUNT(*)'] + [sql for col, sql in sqlAggs])
+            # ties in order of first appearance, as when counted in memory
+            binrows = src.execute(src.query(what, groupby=keysql, orderby='COUNT(*) DESC, MIN(rowid)'))
+        except sqlite3.Error:  # e.g. integer overflow in SUM
+            return super().reload.__wrapped__(self)
+
+        nkeys = len(self.origCols)
+        self.rows = []
+        self.bins = None
+        for r in Progress(binrows, 'binning'):
+            keys = list(r[:nkeys])
+            bin = SqliteBin(src, self.origCols, keys, r[nkeys])
+            for (col, sql), v in zip(sqlAggs, r[nkeys+1:]):
+                bin.aggvals[col.name] = v
+            self.addRow((keys, bin))
+
+        self.largest = max([100] + [len(r[1]) for r in self.rows])
+
+        for c in self.nonKeyVisibleCols:
+            if c._cachedValues:
+                c._cachedValues.clear()
+            c._cachedValues = ColumnCache(c)
+
+
 SqliteSheet.addCommand(ENTER, 'dive-row', 'error("sqlite dbs are readonly")')
+SqliteSheet.addCommand(None, 'select-sql', 'selectWhere(input("select where (sql): ", "sql"))')
+SqliteSheet.addCommand(None, 'unselect-sql', 'selectWhere(input("unselect where (sql): ", "sql"), unselect=True)')
+SqliteSheet.addCommand('F', 'freq-col', 'vd.push(SqliteFreqTable(sheet, cursorCol))')
+SqliteSheet.addCommand('gF', 'freq-keys', 'vd.push(SqliteFreqTable(sheet, *keyCols))')
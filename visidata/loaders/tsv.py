@@ -1,9 +1,14 @@
 import os
+import mmap
+import array
+import weakref
 import contextlib
 import itertools
 import collections
+import collections.abc
 
-from visidata import asyncthread, options, Progress, status, ColumnItem, Sheet, FileExistsError, getType, exceptionCaught
+from visidata import asyncthread, options, Progress, status, ColumnItem, Sheet, FileExistsError, getType, exceptionCaught, Path
+from visidata import genBatches, isPlainTypes, TypedExceptionWrapper
 from visidata.namedlist import namedlist
 
 
@@ -24,10 +29,364 @@ def getlines(fp, maxlines=None):
         i += 1
 
 
+class FieldInterner:
+    'Share one str object among identical field values of each column, to reduce the memory used by loaded rows.'
+    def __init__(self, maxDistinct=100000):
+        self.maxDistinct = maxDistinct
+        self.values = []  # [colidx] -> dict(value -> value); None once a column has too many distinct values
+
+    def __call__(self, row):
+        'Replace fields in list `row` with previously seen equal values, in place.  Returns row.'
+        tables = self.values
+        if len(tables) < len(row):
+            tables.extend({} for i in range(len(row)-len(tables)))
+
+        for i, v in enumerate(row):
+            d = tables[i]
+            if d is not None:
+                row[i] = d.setdefault(v, v)
+                if len(d) > self.maxDistinct:
+                    tables[i] = None  # mostly unique values; stop deduping this column
+
+        return row
+
+
+def getInterner(vs):
+    'Return FieldInterner if options.dedupe_values is set for sheet `vs`, else None.'
+    if options.get('dedupe_values', vs):
+        return FieldInterner()
+
+
+def startRows(vs, ragged=False):
+    '''Reset the rows of sheet `vs` for loading, as ColumnarRows if options.columnar_rows is set.  Return function to add each loaded row (a list of fields).
+    If `ragged`, rows may have different numbers of fields.'''
+    if options.get('columnar_rows', vs):
+        vs.rows = ColumnarRows(vs, ragged=ragged)
+        return vs.rows.appendFields
+
+    vs.rows = []
+    intern = getInterner(vs)
+    if intern:
+        return lambda row: vs.addRow(intern(row))
+    return vs.addRow
+
+
+def isMappable(p):
+    'True if Path `p` is an uncompressed local file, which can be memory-mapped or read in byte ranges.'
+    return type(p) is Path and not p.compression and p.fqpn != '-'
+
+
+def splitsAtNewlines(enc):
+    'True if text encoded with `enc` can be split into lines at b"\\n" bytes, as in ASCII-compatible encodings (but not UTF-16).'
+    try:
+        return '\n'.encode(enc) == b'\n'
+    except LookupError:
+        return False
+
+
 def open_tsv(p):
     return TsvSheet(p.name, source=p)
 
 
+class LazyRows(collections.abc.MutableSequence):
+    '''Rows made on access by loadRows(keys) from an array of integer keys.  Override loadRows.
+    A row stays the same object while anything refers to it, and the options.lazy_rows most recently accessed by index are also kept.
+    Rows which cannot be made again from their key (modified or added) are kept, and the rows can be deleted, inserted and sorted without making all of them.'''
+    def __init__(self, sheet, keys, firstNewKey):
+        self.sheet = sheet
+        self.keys = keys  # array of the key of each row, in order
+        self.loaded = {}  # [key] -> weakref to row, for rows made and maybe still referred to anywhere
+        self.purgeAt = 2**16  # size of self.loaded at which to drop the weakrefs to rows no longer referred to
+        self.recent = collections.OrderedDict()  # [key] -> most recently accessed rows, least recent first
+        self.kept = {}   # [key] -> row, for rows which loadRows would not make as they are now
+        self.newkeys = itertools.count(firstNewKey)
+        self.maxrecent = options.get('lazy_rows', sheet)
+        self.rowtypes = {}  # [sheet._rowtype] -> subclass which keeps its rows once modified
+
+    @property
+    def rowtype(self):
+        'Type of rows to be made by loadRows.'
+        basetype = self.sheet._rowtype
+        t = self.rowtypes.get(basetype)
+        if t is None:
+            lazyrows = self
+            class LazyRow(basetype):
+                __slots__ = ('_lazykey',) if hasattr(basetype, '__weakref__') else ('_lazykey', '__weakref__')
+                __init__ = list.__init__
+
+                def __setitem__(self, k, v):
+                    super().__setitem__(k, v)
+                    if lazyrows.loadedRow(self._lazykey) is self:
+                        lazyrows.kept[self._lazykey] = self  # no longer as loadRows would make it
+
+            t = self.rowtypes[basetype] = LazyRow
+        return t
+
+    def loadRows(self, keys):
+        'Return list of new rows of self.rowtype for `keys`.'
+        raise NotImplementedError
+
+    def loadedRow(self, k):
+        'Return the row with key `k` if it has been made and is still referred to, else None.'
+        ref = self.loaded.get(k)
+        return ref() if ref is not None else None
+
+    def _rows(self, keys):
+        'Return list of the rows with `keys`, making those which are not already.'
+        kept = self.kept
+        loaded = self.loaded
+        ret = []
+        missing = []  # indexes into keys of rows to be made
+        for i, k in enumerate(keys):
+            r = kept.get(k) if kept else None
+            if r is None:
+                ref = loaded.get(k)
+                if ref is not None:
+                    r = ref()
+                if r is None:
+                    missing.append(i)
+            ret.append(r)
+
+        if missing:
+            ref = weakref.ref
+            for i, r in zip(missing, self.loadRows([keys[i] for i in missing])):
+                k = keys[i]
+                r._lazykey = k
+                loaded[k] = ref(r)
+                ret[i] = r
+
+            if len(loaded) > self.purgeAt:  # drop weakrefs to rows no longer referred to; in place, as copies share them
+                for k in [k for k, ref in loaded.items() if ref() is None]:
+                    del loaded[k]
+                self.purgeAt = max(2*len(loaded), 2**16)
+        return ret
+
+    def _row(self, k):
+        'Return row with key `k`, keeping it as recently accessed.'
+        r, = self._rows([k])
+
+        recent = self.recent
+        recent[k] = r
+        recent.move_to_end(k)
+        if len(recent) > self.maxrecent:
+            recent.popitem(last=False)
+        return r
+
+    def keyOf(self, row):
+        'Return key for `row` to be placed in these rows; rows not made by loadRows get a new key and are kept.'
+        k = getattr(row, '_lazykey', None)
+        if k is not None and (self.kept.get(k) is row or self.loadedRow(k) is row):
+            return k
+
+        k = next(self.newkeys)
+        if hasattr(row, '_lazykey'):  # e.g. a copy of a loaded row
+            row._lazykey = k
+        self.kept[k] = row
+        return k
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self._rows(self.keys[i])
+        return self._row(self.keys[i])
+
+    def __iter__(self):
+        'Generate all rows, making them in batches.  Rows are not kept after they are no longer referred to.'
+        for i in range(0, len(self.keys), 1024):
+            yield from self._rows(self.keys[i:i+1024])
+
+    def __setitem__(self, i, v):
+        if isinstance(i, slice):
+            self.keys[i] = array.array(self.keys.typecode, [self.keyOf(r) for r in v])
+        else:
+            self.keys[i] = self.keyOf(v)
+
+    def __delitem__(self, i):
+        del self.keys[i]
+
+    def insert(self, i, v):
+        self.keys.insert(i, self.keyOf(v))
+
+    def sort(self, key=None, reverse=False):
+        if key is None:
+            key = lambda r: r
+        keys = []
+        sortkeys = []
+        for i in range(0, len(self.keys), 1024):
+            batch = self.keys[i:i+1024]
+            keys.extend(batch)
+            sortkeys.extend(map(key, self._rows(batch)))
+        order = sorted(range(len(keys)), key=sortkeys.__getitem__, reverse=reverse)
+        self.keys = array.array(self.keys.typecode, (keys[j] for j in order))
+
+    def clear(self):
+        self.keys = array.array(self.keys.typecode)
+
+    def __copy__(self):
+        'Return rows in the same order, independent of these but sharing the loaded rows.'
+        ret = self.__class__.__new__(self.__class__)
+        ret.__dict__.update(self.__dict__)
+        ret.keys = array.array(self.keys.typecode, self.keys)
+        return ret
+
+
+class LazyTsvRows(LazyRows):
+    'Rows of a memory-mapped tsv file, split into fields on access.  Each row is keyed by the byte offset of its line.'
+    def __init__(self, sheet, mm, offsets):
+        super().__init__(sheet, offsets, len(mm))  # keys past the end of the file for rows added later
+        self.mm = mm
+
+    def loadRows(self, keys):
+        rowtype = self.rowtype
+        return [self.sheet.parseRow(self.sheet.lineAt(self.mm, k), rowtype=rowtype) for k in keys]
+
+
+class ColumnValues:
+    '''Values (str or None) of one column of ColumnarRows.
+    Stored as codes into a list of the distinct values while there are few of them; after that, as an array of ints if they all are canonical ints, or else as utf8 in one bytearray.'''
+    def __init__(self, n=0, maxDistinct=2**16-1):
+        self.maxDistinct = maxDistinct
+        self.distinct = [None]  # [code] -> value, while stored as codes
+        self.codes = {None: 0}  # [value] -> code
+        self.items = array.array('B', bytes(n))  # code of each value; or int values; or end offset of each value in self.text
+        self.ints = False
+        self.text = None    # bytearray of the utf8 of all values, if stored as text
+        self.nulls = set()  # indexes of None values, if stored as ints or text
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        return self.take([i])[0]
+
+    def take(self, idxs):
+        'Return list of the values at indexes `idxs`.'
+        items = self.items
+        if self.distinct is not None:
+            distinct = self.distinct
+            return [distinct[items[i]] for i in idxs]
+
+        if self.ints:
+            ret = [str(items[i]) for i in idxs]
+        else:
+            text = self.text
+            ret = [text[items[i-1] if i else 0:items[i]].decode('utf-8', 'surrogatepass') for i in idxs]
+
+        if self.nulls:
+            ret = [None if i in self.nulls else v for i, v in zip(idxs, ret)]
+        return ret
+
+    def append(self, v):
+        items = self.items
+        if self.distinct is not None:
+            c = self.codes.get(v)
+            if c is None:
+                if type(v) is not str:
+                    raise TypeError('only str or None values can be stored in columns')
+                c = self.codes[v] = len(self.distinct)
+                self.distinct.append(v)
+                if c > self.maxDistinct:
+                    self.undictify()
+                    return self.append(v)
+                if c == 256:
+                    items = self.items = array.array('H', items)
+            items.append(c)
+        elif v is None:
+            self.nulls.add(len(items))
+            items.append(items[-1] if items and not self.ints else 0)
+        elif self.ints:
+            try:
+                i = int(v)
+                if str(i) != v:
+                    raise ValueError(v)
+                items.append(i)
+            except (ValueError, OverflowError):
+                self.totext([self[i] for i in range(len(items))])
+                self.append(v)
+        else:
+            self.text += v.encode('utf-8', 'surrogatepass')
+            items.append(len(self.text))
+
+    def undictify(self):
+        'Store the values themselves instead of codes.'
+        distinct, codes = self.distinct, self.items
+        self.distinct = self.codes = None
+        self.nulls = set(i for i, c in enumerate(codes) if c == 0)
+        try:
+            ints = [0] + [int(v) for v in distinct[1:]]
+            if all(str(i) == v for i, v in zip(ints[1:], distinct[1:])):
+                self.items = array.array('q', (ints[c] for c in codes))
+                self.ints = True
+                return
+        except (ValueError, OverflowError):
+            pass
+        self.totext([distinct[c] for c in codes])
+
+    def totext(self, values):
+        'Store `values` as text.'
+        self.ints = False
+        self.text = bytearray()
+        self.items = array.array('Q')
+        self.nulls = set()
+        for v in values:
+            self.append(v)
+
+
+class ColumnarRows(LazyRows):
+    '''Rows stored as one ColumnValues per field, with row objects made only as they are accessed.
+    Load with appendFields(); rows added any other way are kept as they are.'''
+    def __init__(self, sheet, ragged=False):
+        super().__init__(sheet, array.array('Q'), 2**62)  # keys from 2**62 for rows added later
+        self.columns = []  # [fieldnum] -> ColumnValues
+        self.lengths = array.array('L') if ragged else None  # number of fields in each row, if they vary
+
+    def appendFields(self, fields):
+        'Append a row with the values in `fields`.'
+        n = len(self.keys)
+        while len(self.columns) < len(fields):
+            self.columns.append(ColumnValues(n))
+        for c, v in zip(self.columns, fields):
+            c.append(v)
+        for c in self.columns[len(fields):]:
+            c.append(None)
+        if self.lengths is not None:
+            self.lengths.append(len(fields))
+        self.keys.append(n)
+
+    def loadRows(self, keys):
+        rowtype = self.rowtype
+        rows = map(rowtype, zip(*[c.take(keys) for c in self.columns])) if self.columns else (rowtype() for k in keys)
+        if self.lengths is None:
+            return list(rows)
+        lengths = self.lengths
+        return [rowtype(r[:lengths[k]]) if lengths[k] < len(r) else r for k, r in zip(keys, rows)]
+
+
+def indexLines(mm, start=0, delim=b'', blocksize=2**20):
+    'Return array of byte offsets of the nonempty lines in `mm` from byte `start`, and the most `delim`-separated fields on any of them.'
+    offsets = array.array('Q')
+    maxfields = 0
+    n = len(mm)
+    pos = start
+    with Progress(total=n-start, gerund='indexing', unit='bytes') as prog:
+        while pos < n:
+            end = mm.find(b'\n', min(pos+blocksize, n-1))
+            end = n if end < 0 else end+1
+            for L in mm[pos:end].split(b'\n'):
+                if L and L != b'\r':  # skip empty lines like getlines()
+                    offsets.append(pos)
+                    if delim:
+                        nfields = L.count(delim)+1
+                        if nfields > maxfields:
+                            maxfields = nfields
+                pos += len(L)+1
+            pos = end
+            prog.made = end-start
+    return offsets, maxfields
+
+
 # rowdef: namedlist
 class TsvSheet(Sheet):
     _rowtype = None
@@ -41,42 +400,83 @@ class TsvSheet(Sheet):
         header_lines = options.get('header', self)
         delim = options.get('delimiter', self)
 
+        if options.get('tsv_lazy', self) and isMappable(self.source) and splitsAtNewlines(options.get('encoding', self)):
+            return self.reload_lazy(header_lines, delim)
+
         with self.source.open_text() as fp:
             # get one line anyway to determine number of columns
             lines = list(getlines(fp, int(header_lines) or 1))
-            headers = [L.split(delim) for L in lines]
-
-            if header_lines <= 0:
-                self.columns = [ColumnItem('', i) for i in range(len(headers[0]))]
-            else:
-                self.columns = [
-                    ColumnItem('\\n'.join(x), i)
-                        for i, x in enumerate(zip(*headers[:header_lines]))
-                    ]
+            self.setupColumns([L.split(delim) for L in lines], header_lines)
 
             lines = lines[header_lines:]  # in case of header_lines == 0
-            self._rowtype = namedlist('tsvobj', [c.name for c in self.columns])
+            addRow = startRows(self)
 
-            self.recalc()
-            self.rows = []
-
-            with Progress(total=self.source.filesize) as prog:
+            with Progress(total=self.source.filesize, unit='bytes') as prog:
                 for L in itertools.chain(lines, getlines(fp)):
-                    row = L.split(delim)
-                    ncols = self._rowtype.length()  # current number of cols
-                    if len(row) > ncols:
-                        # add unnamed columns to the type not found in the header
-                        newcols = [ColumnItem('', len(row)+i, width=8) for i in range(len(row)-ncols)]
-                        self._rowtype = namedlist(self._rowtype.__name__, list(self._rowtype._fields) + ['_' for c in newcols])
-                        for c in newcols:
-                            self.addColumn(c)
-                    elif len(row) < ncols:
-                        # extend rows that are missing entries
-                        row.extend([None]*(ncols-len(row)))
-
-                    self.addRow(self._rowtype(row))
+                    addRow(self.parseRow(L, delim))
                     prog.addProgress(len(L))
 
+    def reload_lazy(self, header_lines, delim):
+        'Map the TSV file into memory and index its lines; fields are split only when a row is accessed.'
+        self.encoding = options.get('encoding', self)
+        self.encoding_errors = options.get('encoding_errors', self)
+        self.delim = delim
+
+        with open(self.source.resolve(), 'rb') as fp:
+            if self.source.filesize == 0:
+                self.setupColumns([[]], 0)
+                self.rows = []
+                return
+            mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        offsets, maxfields = indexLines(mm, delim=delim.encode(self.encoding))
+        nheaders = max(int(header_lines), 0)
+        headers = [self.lineAt(mm, start).split(delim) for start in offsets[:nheaders or 1]]
+        self.setupColumns(headers, header_lines)
+        self.addUnnamedColumns(maxfields)  # all now, rather than as rows are parsed during draw
+        self.rows = LazyTsvRows(self, mm, offsets[nheaders:])
+
+    def lineAt(self, mm, start):
+        'Return decoded line beginning at byte offset `start` of `mm`.'
+        end = mm.find(b'\n', start)
+        if end < 0:
+            end = len(mm)
+        return mm[start:end].decode(self.encoding, self.encoding_errors).rstrip('\r')
+
+    def setupColumns(self, headers, header_lines):
+        'Create columns from the split header lines (or from the first line if no header).'
+        if header_lines <= 0:
+            self.columns = [ColumnItem('', i) for i in range(len(headers[0]))]
+        else:
+            self.columns = [
+                ColumnItem('\\n'.join(x), i)
+                    for i, x in enumerate(zip(*headers[:header_lines]))
+                ]
+
+        self._rowtype = namedlist('tsvobj', [c.name for c in self.columns])
+        self.recalc()
+
+    def parseRow(self, L, delim=None, rowtype=None):
+        'Split line `L` into a new row of `rowtype` (default _rowtype), adding columns for any extra fields.'
+        row = L.split(delim or self.delim)
+        ncols = self._rowtype.length()  # current number of cols
+        if len(row) > ncols:
+            self.addUnnamedColumns(len(row))
+        elif len(row) < ncols:
+            # extend rows that are missing entries
+            row.extend([None]*(ncols-len(row)))
+
+        return (rowtype or self._rowtype)(row)
+
+    def addUnnamedColumns(self, nfields):
+        'Add unnamed columns to the type for fields not found in the header, up to `nfields`.'
+        ncols = self._rowtype.length()  # current number of cols
+        if nfields > ncols:
+            newcols = [ColumnItem('', nfields+i, width=8) for i in range(nfields-ncols)]
+            self._rowtype = namedlist(self._rowtype.__name__, list(self._rowtype._fields) + ['_' for c in newcols])
+            for c in newcols:
+                self.addColumn(c)
+
     def newRow(self):
         return self._rowtype()
 
@@ -113,27 +513,41 @@ def genAllValues(rows, cols, trdict={}, format=True):
             transformers[col].append(lambda v,trdict=trdict: v.translate(trdict))
 
     options_safe_error = options.safe_error
-    for r in Progress(rows):
-        dispvals = []
+    for batch in genBatches(rows):
+        colvals = []
         for col, transforms in transformers.items():
-            try:
-                dispval = col.getValue(r)
-            except Exception as e:
-                exceptionCaught(e)
-                dispval = options_safe_error or str(e)
+            vals = col.getValuesBatch(batch)
+            for i, v in enumerate(vals):
+                if isinstance(v, TypedExceptionWrapper) and v.type == col.getValue:  # getValue raised
+                    exceptionCaught(v.exception)
+                    vals[i] = options_safe_error or str(v.exception)
+            colvals.append(transformValues(vals, transforms))
 
-            try:
-                for t in transforms:
-                    if dispval is None:
-                        dispval = ''
-                        break
-                    dispval = t(dispval)
-            except Exception as e:
-                dispval = str(dispval)
+        yield from map(list, zip(*colvals))
 
-            dispvals.append(dispval)
 
-        yield dispvals
+def transformValues(vals, transforms):
+    'Apply each of `transforms` to `vals`; all at once if possible, otherwise value by value.'
+    if isPlainTypes(set(map(type, vals))):
+        try:
+            for t in transforms:
+                vals = list(map(t, vals))
+            return vals
+        except Exception:
+            pass  # transform errors individually
+
+    ret = []
+    for dispval in vals:
+        try:
+            for t in transforms:
+                if dispval is None:
+                    dispval = ''
+                    break
+                dispval = t(dispval)
+        except Exception as e:
+            dispval = str(dispval)
+        ret.append(dispval)
+    return ret
 
 
 @asyncthread
@@ -2,12 +2,14 @@ from visidata import globalCommand, Sheet, Column, options, vd, anytype, ENTER,
 from visidata import CellColorizer, RowColorizer
 from visidata import ColumnAttr, ColumnEnum, ColumnItem
 from visidata import getGlobals, TsvSheet, Path, bindkeys, commands, composeStatus, Option
+from visidata import cacheManager, status
 
 globalCommand('^P', 'statuses', 'vd.push(StatusSheet("statusHistory"))')
 globalCommand('gC', 'columns-all', 'vd.push(ColumnsSheet("all_columns", source=vd.sheets))')
 globalCommand('S', 'sheets', 'vd.push(vd.sheetsSheet)')
 globalCommand('gS', 'sheets-graveyard', 'vd.push(vd.graveyardSheet).reload()')
 
+globalCommand(None, 'cache-stats', 'vd.push(CacheStatsSheet("cache_stats"))')
 globalCommand('zO', 'options-sheet', 'vd.push(getOptionsSheet(sheet)).reload()')
 globalCommand('O', 'options-global', 'vd.push(vd.optionsSheet)')
 Sheet.addCommand('C', 'columns-sheet', 'vd.push(ColumnsSheet(name+"_columns", source=[sheet]))')
@@ -41,6 +43,24 @@ class StatusSheet(Sheet):
         self.rows = vd.statusHistory[::-1]
 
 
+# rowdef: ColumnCache
+class CacheStatsSheet(Sheet):
+    rowtype = 'column caches'
+    columns = [
+        Column('sheet', getter=lambda col,row: row.col().sheet.name if row.col() and row.col().sheet else None),
+        Column('column', getter=lambda col,row: row.col().name if row.col() else None),
+        Column('entries', type=int, getter=lambda col,row: len(row)),
+        ColumnAttr('hits', type=int),
+        ColumnAttr('misses', type=int),
+        ColumnAttr('evictions', type=int),
+        Column('hit_pct', type=float, getter=lambda col,row: 100*row.hits/(row.hits+row.misses) if row.hits+row.misses else None),
+    ]
+
+    def reload(self):
+        self.rows = list(cacheManager.caches)
+        status('%.1f MB cached of %s MB budget' % (cacheManager.nbytes/2**20, options.cache_mem_mb or 'unlimited'))
+
+
 class ColumnsSheet(Sheet):
     rowtype = 'columns'
     _rowtype = Column
@@ -103,6 +123,9 @@ class SheetsSheet(Sheet):
     def newRow(self):
         return Sheet('', columns=[ColumnItem('', 0)], rows=[])
 
+    def frameSignature(self):
+        return None  # shows progress of other sheets
+
     def reload(self):
         self.rows = self.source
 
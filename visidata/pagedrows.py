@@ -0,0 +1,171 @@
+import threading
+import collections
+import collections.abc
+
+from visidata import option, options, Progress
+
+option('sql_page_rows', 0, 'number of rows to fetch per page as needed from database tables (0 to fetch all rows when loading)')
+option('sql_max_pages', 100, 'maximum number of fetched pages of database rows to keep in memory')
+
+
+class PagedRows(collections.abc.MutableSequence):
+    '''Rows fetched a page at a time by fetchPage(pagenum), as they are accessed.  Only the most recently used pages are kept.
+    Each row has a key, keyOf(row) or else its position; a row fetched again while an earlier fetch of it is still on a page or selected is that same row object, so selections survive scrolling.
+    `lock` guards fetchPage, and should be shared by everything using the same connection.
+    If `nrows` is only `estimated`, iterating continues past it for as long as pages are full, and the count becomes exact once all rows have been fetched.'''
+    def __init__(self, sheet, nrows, pagesize, fetchPage, maxpages=None, keyOf=None, lock=None, estimated=False):
+        self.sheet = sheet
+        self.nrows = nrows
+        self.estimated = estimated
+        self.pagesize = pagesize
+        self.fetchPage = fetchPage
+        self.maxpages = maxpages or options.sql_max_pages
+        self.keyOf = keyOf
+        self.pages = collections.OrderedDict()  # [pagenum] -> (keys, rows), least recently used first
+        self.onPage = {}  # [key] -> row, for rows on fetched pages
+        self.pinned = {}  # [key] -> row, for selected rows whose page has been evicted
+        self.lock = lock or threading.RLock()
+        self._list = None  # all rows, after the first modification
+
+    def rowKeys(self, n, rows):
+        if self.keyOf:
+            return [self.keyOf(r) for r in rows]
+        return range(n*self.pagesize, n*self.pagesize+len(rows))
+
+    def knownRow(self, key, row):
+        'Return the row already known by `key`, or else `row`.'
+        r = self.onPage.get(key)
+        if r is None:
+            r = self.pinned.get(key)
+        return row if r is None else r
+
+    def page(self, n):
+        with self.lock:
+            pg = self.pages.get(n)
+            if pg is None:
+                return self.setPage(n, self.fetchPage(n))
+            self.pages.move_to_end(n)
+            return pg[1]
+
+    def setPage(self, n, rows):
+        'Keep `rows`, as fetched, as page `n`.  Return the rows of the page.'
+        with self.lock:
+            keys = self.rowKeys(n, rows)
+            rows = [self.knownRow(k, r) for k, r in zip(keys, rows)]
+            self.onPage.update(zip(keys, rows))
+            self.pages[n] = (keys, rows)
+            self.evict()
+            return rows
+
+    def evict(self):
+        'Drop least recently used pages beyond maxpages.  Their selected rows are pinned, so that fetching them again returns the same row objects.'
+        selected = self.sheet._selectedRows
+        while len(self.pages) > self.maxpages:
+            n, (keys, rows) = self.pages.popitem(last=False)
+            for k, r in zip(keys, rows):
+                self.onPage.pop(k, None)
+                if id(r) in selected:
+                    self.pinned[k] = r
+
+        if len(self.pinned) > 2*len(selected) + self.pagesize:  # drop pins of rows since unselected
+            for k, r in list(self.pinned.items()):
+                if id(r) not in selected:
+                    del self.pinned[k]
+
+    def rowsFor(self, rows):
+        'Return the known row objects for freshly fetched `rows`, which must have keyOf, pinning any not on a fetched page.'
+        with self.lock:
+            ret = []
+            for r in rows:
+                k = self.keyOf(r)
+                r = self.knownRow(k, r)
+                if k not in self.onPage:
+                    self.pinned[k] = r
+                ret.append(r)
+            return ret
+
+    def reset(self, nrows=None):
+        'Forget all fetched rows, so they will be fetched again (e.g. in a new order).  Pinned rows are kept if they have keys of their own.'
+        with self.lock:
+            self.pages.clear()
+            self.onPage.clear()
+            if not self.keyOf:
+                self.pinned.clear()
+            self._list = None
+            if nrows is not None:
+                self.nrows = nrows
+
+    def _row(self, i):
+        'Return row `i`; raise IndexError and stop counting beyond the end if there are fewer rows than counted.'
+        n, j = divmod(i, self.pagesize)
+        pg = self.page(n)
+        if j >= len(pg):
+            self.nrows = min(self.nrows, n*self.pagesize + len(pg))
+            raise IndexError(i)
+        return pg[j]
+
+    def materialize(self):
+        'Fetch all rows into a list, so that the rows can be modified.'
+        if self._list is None:
+            self._list = list(Progress(self, 'fetching', total=self.nrows))
+            self.pages.clear()
+            self.onPage.clear()
+            self.pinned.clear()
+        return self._list
+
+    def __len__(self):
+        if self._list is not None:
+            return len(self._list)
+        return self.nrows
+
+    def __getitem__(self, k):
+        if self._list is not None:
+            return self._list[k]
+        if isinstance(k, slice):
+            ret = []
+            for i in range(*k.indices(self.nrows)):
+                try:
+                    ret.append(self._row(i))
+                except IndexError:
+                    break
+            return ret
+        if k < 0:
+            k += self.nrows
+        if not 0 <= k < self.nrows:
+            raise IndexError(k)
+        return self._row(k)
+
+    def __iter__(self):
+        if self._list is not None:
+            yield from self._list
+            return
+        n = 0
+        while n*self.pagesize < self.nrows or self.estimated:
+            pg = self.page(n)
+            yield from pg
+            if len(pg) < self.pagesize:  # fewer rows than counted, or the end of those estimated
+                if self.estimated:
+                    self.nrows = n*self.pagesize + len(pg)
+                    self.estimated = False
+                else:
+                    self.nrows = min(self.nrows, n*self.pagesize + len(pg))
+                break
+            n += 1
+
+    def __setitem__(self, k, v):
+        self.materialize()[k] = v
+
+    def __delitem__(self, k):
+        del self.materialize()[k]
+
+    def insert(self, i, v):
+        self.materialize().insert(i, v)
+
+    def sort(self, **kwargs):
+        self.materialize().sort(**kwargs)
+
+    def clear(self):
+        self.materialize().clear()
+
+    def __copy__(self):
+        return list(self)
@@ -0,0 +1,189 @@
+'Evaluation of expressions and regex substitutions over many rows on options.worker_processes processes.'
+
+import re
+import pickle
+
+from visidata import *
+
+
+parallel_chunk_rows = 4096  # rows per task sent to a worker process
+parallel_chunk_bytes = 2**20  # minimum bytes per task when loading a file on worker processes
+
+
+def evalExprChunk(args):
+    'Evaluate expression on each row of a snapshot of column values, in a worker process.  Return values, or exceptions in their place.'
+    exprstr, colvals, n = args
+    code = compileExpr(exprstr)
+    vdglobals = getGlobals()
+    ret = []
+    for i in range(n):
+        try:
+            ret.append(eval(code, vdglobals, {k: vals[i] for k, vals in colvals.items()}))
+        except Exception as e:
+            e.stacktrace = stacktrace()
+            ret.append(e)
+    return ret
+
+
+def substChunk(args):
+    'Substitute regex in each of the display values, in a worker process.  Return values, or exceptions in their place.'
+    before, after, flags, vals = args
+    ret = []
+    for v in vals:
+        try:
+            ret.append(re.sub(before, after, v, flags=flags))
+        except Exception as e:
+            e.stacktrace = stacktrace()
+            ret.append(e)
+    return ret
+
+
+def canEvalInProcesses():
+    return options.worker_processes > 1
+
+
+def mapChunks(func, tasks, gerund, sizes):
+    '''Return list of func(task) for each of `tasks`, in order, computed on options.worker_processes processes; or None if some task or result cannot be pickled to be sent between processes (like h5py datasets, functions, or arbitrary objects in anytype columns).
+    Waits in short intervals, so that the thread can be cancelled.'''
+    import multiprocessing
+    import multiprocessing.pool
+
+    ret = []
+    with Progress(total=sum(sizes), gerund=gerund) as prog:
+        with multiprocessing.Pool(options.worker_processes) as pool:
+            results = pool.imap(func, tasks)
+            for n in sizes:
+                while True:
+                    try:
+                        ret.append(results.next(timeout=0.1))
+                        break
+                    except multiprocessing.TimeoutError:
+                        pass
+                    except (pickle.PicklingError, multiprocessing.pool.MaybeEncodingError, TypeError, AttributeError) as e:
+                        status('evaluating in this process: %s' % e)
+                        return None
+                prog.addProgress(n)
+    return ret
+
+
+def exprColumns(sheet, code):
+    'Return dict of name -> Column for the columns of `sheet` referenced by the compiled expression, or None if it needs `row` or `sheet`, which cannot be sent to another process.'
+    if set(code.co_names) & {'row', '__row__', 'sheet', '__sheet__'}:
+        return None
+    colsByName = sheet.colsByName
+    return {name: colsByName[name] for name in code.co_names if name in colsByName}
+
+
+def evalExprInProcesses(sheet, expr, rows):
+    '''Return list of the values of `expr` evaluated over `rows`, with exceptions in place of values.
+    The typed values of the columns it references are sent to the worker processes; rows with any wrapped values are evaluated here.'''
+    rows = list(rows)
+    code = compileExpr(expr)
+    cols = exprColumns(sheet, code)
+    if cols is None:
+        return None
+
+    tasks = []
+    localIdxs = []  # indexes of rows to evaluate in this process
+    for batch in genBatches(rows, 'snapshotting', parallel_chunk_rows):
+        colvals = {name: col.getTypedValuesBatch(batch) for name, col in cols.items()}
+        for vals in colvals.values():
+            for i, v in enumerate(vals):
+                if isinstance(v, TypedWrapper):
+                    localIdxs.append(len(tasks)*parallel_chunk_rows + i)
+                    vals[i] = None
+        tasks.append((expr, colvals, len(batch)))
+
+    chunks = mapChunks(evalExprChunk, tasks, 'evaluating', [t[2] for t in tasks])
+    if chunks is None:
+        return None
+
+    ret = [v for vals in chunks for v in vals]
+    for i in set(localIdxs):
+        try:
+            ret[i] = sheet.evalexpr(code, rows[i])
+        except Exception as e:
+            e.stacktrace = stacktrace()
+            ret[i] = e
+
+    return ret
+
+
+def substInProcesses(col, rows, before, after):
+    'Return list of the display values of `col` for `rows`, with `before` substituted by `after`; exceptions in place of values.  Return None if they cannot be computed on worker processes.'
+    rows = list(rows)
+    tasks = []
+    for batch in genBatches(rows, 'snapshotting', parallel_chunk_rows):
+        tasks.append((before, after, regex_flags(), col.getDisplayValuesBatch(batch)))
+
+    chunks = mapChunks(substChunk, tasks, 'replacing', [len(t[3]) for t in tasks])
+    if chunks is None:
+        return None
+    return [v for vals in chunks for v in vals]
+
+
+def calcInProcesses(col, rows):
+    'Return list of the typed values of `col` for `rows` computed on worker processes, or None if `col` cannot be computed there.'
+    if isinstance(col, ColumnExpr):
+        vals = evalExprInProcesses(col.sheet, col.expr, rows)
+    elif getattr(col.getter, 'regexSubst', None):  # set by regexTransform
+        origcol, before, after = col.getter.regexSubst
+        vals = substInProcesses(origcol, rows, before, after)
+    else:
+        return None
+
+    if vals is None:
+        return None
+
+    return [TypedExceptionWrapper(col.getValue, r, exception=v) if isinstance(v, Exception) else wrapply(col.type, v)
+                for r, v in zip(rows, vals)]
+
+
+@asyncthread
+def setValuesInProcesses(col, rows, expr):
+    vals = evalExprInProcesses(col.sheet, expr, rows)
+    if vals is None:
+        return setValuesInThread.__wrapped__(col, rows, expr)  # already in a thread
+
+    for r, v in zip(rows, vals):
+        if isinstance(v, Exception):
+            raise v
+        col.setValueSafe(r, v)
+    col.recalc()
+    status('set %d values = %s' % (len(rows), expr))
+
+
+setValuesInThread = Column.setValuesFromExpr
+
+def setValuesFromExpr(col, rows, expr):
+    'Set values of `col` for `rows` from `expr`; in a separate thread on worker processes, if enabled and possible.'
+    if canEvalInProcesses() and exprColumns(col.sheet, compileExpr(expr)) is not None:
+        return setValuesInProcesses(col, list(rows), expr)
+    return setValuesInThread(col, rows, expr)
+
+Column.setValuesFromExpr = setValuesFromExpr
+
+
+def chunkBoundaries(mm, start, nworkers, quote=b''):
+    'Return list of byte offsets which split `mm` from `start` into ranges for `nworkers` processes, each ending at a newline outside any field quoted with `quote`.'
+    chunksize = max(parallel_chunk_bytes, (len(mm)-start)//(nworkers*4))
+    bounds = [start]
+    n = len(mm)
+    while bounds[-1] + chunksize < n:
+        lo = bounds[-1]
+        pos = lo + chunksize
+        nquotes = mm[lo:pos].count(quote) if quote else 0
+        while True:
+            nl = mm.find(b'\n', pos)
+            if nl < 0:
+                return bounds + [n]
+            if quote:
+                nquotes += mm[pos:nl].count(quote)
+            if nquotes % 2 == 0:  # not within a quoted field
+                bounds.append(nl+1)
+                break
+            pos = nl+1
+
+    if bounds[-1] < n:
+        bounds.append(n)
+    return bounds
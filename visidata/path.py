@@ -54,7 +54,7 @@ class Path:
 
     def __iter__(self):
         skip = options.skip
-        with Progress(total=self.filesize) as prog:
+        with Progress(total=self.filesize, unit='bytes') as prog:
             for i, line in enumerate(self.open_text()):
                 prog.addProgress(len(line))
                 if i < skip:
@@ -26,15 +26,18 @@ def addRegexColumns(regexMaker, vs, colIndex, origcol, exampleRow, regexstr):
         vs.addColumn(c, index=colIndex+i+1)
 
 
-def regexTransform(origcol, instr):
+def parseRegexSubst(instr):
+    'Return (before, after) from "before/after".'
     i = indexWithEscape(instr, '/')
     if i is None:
-        before = instr
-        after = ''
-    else:
-        before = instr[:i]
-        after = instr[i+1:]
-    return lambda col,row,origcol=origcol,before=before, after=after: re.sub(before, after, origcol.getDisplayValue(row), flags=regex_flags())
+        return instr, ''
+    return instr[:i], instr[i+1:]
+
+def regexTransform(origcol, instr):
+    before, after = parseRegexSubst(instr)
+    func = lambda col,row,origcol=origcol,before=before, after=after: re.sub(before, after, origcol.getDisplayValue(row), flags=regex_flags())
+    func.regexSubst = (origcol, before, after)  # so it can be frozen on worker processes
+    return func
 
 def indexWithEscape(s, char, escape_char='\\'):
     i=0
@@ -50,6 +53,19 @@ def indexWithEscape(s, char, escape_char='\\'):
 
 @asyncthread
 def setValuesFromRegex(cols, rows, rex):
+    if canEvalInProcesses():
+        before, after = parseRegexSubst(rex)
+        rows = list(rows)
+        colvals = [substInProcesses(col, rows, before, after) for col in cols]
+        if None not in colvals:
+            for col, vals in zip(cols, colvals):
+                for r, v in zip(rows, vals):
+                    if isinstance(v, Exception):
+                        raise v
+                    col.setValueSafe(r, v)
+                col.recalc()
+            return
+
     transforms = [regexTransform(col, rex) for col in cols]
     for r in Progress(rows, 'replacing'):
         for col, transform in zip(cols, transforms):
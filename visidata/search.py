@@ -1,7 +1,8 @@
-from visidata import Sheet, rotate_range
+from visidata import Sheet, rotate_range, compileExpr
 
 
 def evalmatcher(sheet, expr):
+    expr = compileExpr(expr)
     def matcher(r):
         return sheet.evalexpr(expr, r)
     return matcher
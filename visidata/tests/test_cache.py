@@ -0,0 +1,85 @@
+import gc
+import threading
+import unittest
+from copy import copy
+
+import visidata
+
+
+class Row:
+    def __init__(self, i):
+        self.i = i
+
+
+class ColumnCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.vs = visidata.Sheet('cached', columns=[visidata.Column('a', getter=lambda c,r: [r.i]*10, cache=True)])
+        self.vs.rows = [Row(i) for i in range(100)]
+        self.vs.recalc()
+        self.col = self.vs.columns[0]
+
+    def tearDown(self):
+        visidata.options.set('cache_mem_mb', 256)
+
+    def test_hits(self):
+        for r in self.vs.rows:
+            self.col.getValue(r)
+        for r in self.vs.rows:
+            self.assertEqual(self.col.getValue(r), [r.i]*10)
+        self.assertEqual(self.col._cachedValues.hits, 100)
+        self.assertEqual(self.col._cachedValues.misses, 100)
+
+    def test_rows_not_kept(self):
+        'rows are not kept alive by the cache, and a dead row drops out of the accounting with its cache'
+        self.col.getValue(self.vs.rows[0])
+        self.vs.rows = []
+        gc.collect()
+        self.assertIsNone(next(iter(self.col._cachedValues.values.values()))[0]())
+
+        nbytes = visidata.cacheManager.nbytes
+        self.vs.columns.clear()
+        del self.col
+        gc.collect()
+        self.assertLess(visidata.cacheManager.nbytes, nbytes)
+
+    def test_budget(self):
+        'values are counted with their contents, and evicted to stay within the budget'
+        visidata.options.set('cache_mem_mb', 1)
+        self.col.getter = lambda c,r: [r.i]*10000
+        for r in self.vs.rows:
+            self.col.getValue(r)
+        self.assertLessEqual(visidata.cacheManager.nbytes, 2**20)
+        self.assertGreater(self.col._cachedValues.evictions, 0)
+
+    def test_quit(self):
+        for r in self.vs.rows:
+            self.col.getValue(r)
+        visidata.vd().quit(self.vs)
+        self.assertEqual(len(self.col._cachedValues), 0)
+
+
+class RenderCacheTestCase(unittest.TestCase):
+    def test_thread_finished(self):
+        'cells formatted while a thread was computing their values are formatted again once it finishes'
+        finish = threading.Event()
+        @visidata.asynccache(lambda row: id(row))
+        def slowValue(row):
+            finish.wait()
+            return 'done'
+
+        vs = visidata.Sheet('render', columns=[visidata.Column('a', getter=lambda c,r: slowValue(r))])
+        vs.rows = [Row(0)]
+        vs.recalc()
+        col, row = vs.columns[0], vs.rows[0]
+        isNull = visidata.isNullFunc()
+
+        vs.checkRenderCache()
+        self.assertNotEqual(vs.getRenderedCell(col, row, 10, isNull).display, 'done')
+        finish.set()
+        visidata.sync()
+        vs.checkRenderCache()
+        self.assertEqual(vs.getRenderedCell(col, row, 10, isNull).display, 'done')
+
+    def test_copy(self):
+        vs = visidata.Sheet('render')
+        self.assertIsNot(copy(vs)._renderCache, vs._renderCache)
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+import visidata
+import visidata.loaders.csv
+
+
+class ParallelCsvTestCase(unittest.TestCase):
+    'Loading in chunks on several processes must give the same rows as loading serially.'
+    def setUp(self):
+        self.chunkmin = visidata.parallel.parallel_chunk_bytes
+        visidata.parallel.parallel_chunk_bytes = 64
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        visidata.parallel.parallel_chunk_bytes = self.chunkmin
+        visidata.options.set('worker_processes', 0)
+        self.tmpdir.cleanup()
+
+    def load(self, text, nworkers):
+        fn = os.path.join(self.tmpdir.name, 'test.csv')
+        with open(fn, 'w', newline='') as fp:
+            fp.write(text)
+        visidata.options.set('worker_processes', nworkers)
+        vs = visidata.loaders.csv.CsvSheet('test', source=visidata.Path(fn))
+        visidata.loaders.csv.load_csv(vs)
+        return [vs.columns[0].name], vs.rows
+
+    def assertSameRows(self, text):
+        serial = self.load(text, 0)
+        self.assertEqual(self.load(text, 2), serial)
+        return serial[1]
+
+    def test_plain(self):
+        rows = self.assertSameRows('a,b\n' + ''.join('%d,x%d\n' % (i, i) for i in range(200)))
+        self.assertEqual(len(rows), 200)
+
+    def test_embedded_newlines(self):
+        rows = self.assertSameRows('a,b\n' + ''.join('%d,"line\n""%d""\nend"\r\n' % (i, i) for i in range(200)))
+        self.assertEqual(rows[5], ['5', 'line\n"5"\nend'])
+
+    def test_stray_quotes(self):
+        'an unquoted field with a quote in it (5" for inches) throws off the quote count'
+        text = 'a,b\n' + ''.join('%d,5"\n' % i for i in range(3))
+        text += ''.join('%d,"two\nlines"\n' % i for i in range(200))
+        rows = self.assertSameRows(text)
+        self.assertEqual(rows[3], ['0', 'two\nlines'])
+
+    def test_unterminated_quote(self):
+        self.assertSameRows('a,b\n' + ''.join('%d,x\n' % i for i in range(100)) + '1,"never closed\n' + 'more\n'*100)
@@ -0,0 +1,32 @@
+import math
+import unittest
+
+import visidata
+
+
+class NumericBinningTestCase(unittest.TestCase):
+    def setUp(self):
+        visidata.options.set('numeric_binning', True)
+
+    def tearDown(self):
+        visidata.options.set('numeric_binning', False)
+        visidata.options.set('histogram_bins', 0)
+        visidata.options.set('histogram_even_interval', False)
+
+    def freq(self, vals):
+        vs = visidata.Sheet('vals', columns=[visidata.ColumnItem('x', 0, type=float)])
+        vs.rows = [[v] for v in vals]
+        ft = visidata.SheetFreqTable(vs, vs.columns[0])
+        ft.reload.__wrapped__(ft)
+        return {r[0][0]: len(r[1]) for r in ft.rows}
+
+    def test_infinite(self):
+        'infinite values are binned with errors, and the others into ranges as usual'
+        vals = [float(i) for i in range(10)] + [math.inf, -math.inf, None, 'x']
+        visidata.options.set('histogram_bins', 3)
+        for evenInterval in [False, True]:
+            visidata.options.set('histogram_even_interval', evenInterval)
+            bins = self.freq(vals)
+            self.assertEqual(bins['errors'], 3)
+            self.assertEqual(bins[None], 1)
+            self.assertEqual(sum(bins.values()), len(vals))
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+import visidata
+
+
+class Hdf5TestCase(unittest.TestCase):
+    def setUp(self):
+        try:
+            import h5py
+        except ImportError:
+            self.skipTest('h5py not installed')
+        import numpy
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fn = os.path.join(self.tmpdir.name, 'test.h5')
+        with h5py.File(self.fn, 'w') as f:
+            recs = numpy.array([(i, i%3) for i in range(5000)], dtype=[('a', 'i4'), ('b', 'i4')])
+            f.create_dataset('recs', data=recs, chunks=(512,))
+            f.create_dataset('matrix', data=numpy.arange(10000).reshape(5000, 2), chunks=(512, 2))
+        visidata.options.set('h5_max_chunks', 2)
+
+    def tearDown(self):
+        visidata.options.set('h5_max_chunks', 100)
+        self.tmpdir.cleanup()
+
+    def load(self, dsname):
+        vs = visidata.open_hdf5(visidata.Path(self.fn))
+        vs.reload()
+        ds = visidata.SheetH5Obj(dsname, source=vs.source[dsname])
+        ds.reload()
+        return ds
+
+    def test_selection_kept(self):
+        'selected rows stay selected after scrolling past the kept chunks and back'
+        for dsname in ['recs', 'matrix']:
+            vs = self.load(dsname)
+            self.assertIsInstance(vs.rows, visidata.PagedRows)
+            vs.selectRow(vs.rows[3])
+            vs.selectRow(vs.rows[4000])
+            for r in vs.rows:
+                pass
+            self.assertLessEqual(len(vs.rows.pages), 2)
+            self.assertTrue(vs.isSelected(vs.rows[3]))
+            self.assertTrue(vs.isSelected(vs.rows[4000]))
+            self.assertFalse(vs.isSelected(vs.rows[4]))
+            self.assertEqual([vs.columns[0].getValue(r) for r in vs.selectedRows], [6, 8000] if dsname == 'matrix' else [3, 4000])
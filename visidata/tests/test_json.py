@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+
+import visidata
+
+
+class JsonTestCase(unittest.TestCase):
+    def setUp(self):
+        self.chunkbytes = visidata.parallel.parallel_chunk_bytes
+        visidata.parallel.parallel_chunk_bytes = 64
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        visidata.parallel.parallel_chunk_bytes = self.chunkbytes
+        visidata.options.set('worker_processes', 0)
+        visidata.options.set('jsonl_sample', 1000)
+        self.tmpdir.cleanup()
+
+    def load(self, text, jsonlines=False, nworkers=0):
+        fn = os.path.join(self.tmpdir.name, 'test.json')
+        with open(fn, 'w') as fp:
+            fp.write(text)
+        visidata.options.set('worker_processes', nworkers)
+        vs = visidata.JSONSheet('test', source=visidata.Path(fn), jsonlines=jsonlines)
+        vs.reload.__wrapped__(vs)
+        return vs
+
+    def test_jsonl_parallel(self):
+        'decoding jsonl in chunks on several processes gives the same rows and columns as decoding serially'
+        visidata.options.set('jsonl_sample', 3)
+        text = ''.join('{"a": %d}\n' % i for i in range(100)) + 'not json\n' + ''.join('{"a": %d, "b": "x"}\n' % i for i in range(100))
+        serial = self.load(text, jsonlines=True)
+        parallel = self.load(text, jsonlines=True, nworkers=2)
+        self.assertEqual([c.name for c in parallel.columns], ['a', 'b'])
+        self.assertEqual([c.name for c in parallel.columns], [c.name for c in serial.columns])
+        for vs in (serial, parallel):
+            self.assertEqual(len(vs.rows), 201)
+            self.assertIsInstance(vs.rows[100], visidata.TypedExceptionWrapper)
+        self.assertEqual(parallel.rows[:100], serial.rows[:100])
+        self.assertEqual(parallel.rows[101:], serial.rows[101:])
+
+    def test_json_array(self):
+        vs = self.load('[\n  {"a": 1},\n  {"a": 2, "b": [1,\n 2]}\n]\n')
+        self.assertFalse(vs.jsonlines)
+        self.assertEqual(vs.rows, [{'a': 1}, {'a': 2, 'b': [1, 2]}])
+        self.assertEqual([c.name for c in vs.columns], ['a', 'b'])
+
+    def test_jsonl_of_arrays(self):
+        'arrays on their own lines are jsonl, and no rows from decoding the first line as json are left behind'
+        vs = self.load('[1, 2]\n[3, 4]\n')
+        self.assertTrue(vs.jsonlines)
+        self.assertEqual(vs.rows, [[1, 2], [3, 4]])
+
+    def test_jsonl_of_objects(self):
+        vs = self.load('{"a": 1}\n{"a": 2}\n')
+        self.assertTrue(vs.jsonlines)
+        self.assertEqual(vs.rows, [{'a': 1}, {'a': 2}])
+
+    def test_json_error(self):
+        'a json array which breaks after its first line keeps the rows before the error, instead of reloading as jsonl'
+        vs = self.load('[\n  {"a": 1},\n  {"a": 2},\n  {"a": \n')
+        self.assertFalse(vs.jsonlines)
+        self.assertEqual(vs.rows, [{'a': 1}, {'a': 2}])
+
+
+    def test_single_line_streamed(self):
+        'rows of a minified json array are added as they are decoded, before the end of the file is read'
+        text = '[' + ','.join('{"a": %d}' % i for i in range(100000)) + ']'
+        fn = os.path.join(self.tmpdir.name, 'test.json')
+        with open(fn, 'w') as fp:
+            fp.write(text)
+        streams = []
+        class RecordedStream(visidata.loaders.json.JsonStream):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                streams.append(self)
+        atFirstRow = []
+        class StreamedSheet(visidata.JSONSheet):
+            def addRow(self, row, index=None):
+                if not atFirstRow:
+                    atFirstRow.append(streams[0].eof)
+                return super().addRow(row, index=index)
+        JsonStream, visidata.loaders.json.JsonStream = visidata.loaders.json.JsonStream, RecordedStream
+        try:
+            vs = StreamedSheet('test', source=visidata.Path(fn), jsonlines=False)
+            vs.reload.__wrapped__(vs)
+        finally:
+            visidata.loaders.json.JsonStream = JsonStream
+        self.assertFalse(vs.jsonlines)
+        self.assertEqual(len(vs.rows), 100000)
+        self.assertEqual(atFirstRow, [False])
+
+    def test_object_progress(self):
+        vs = self.load('{"a": 1, "b": "%s"}' % ('x'*200000))
+        self.assertEqual(vs.rows[0]['a'], 1)
+
+    def test_unhashable_aggregates(self):
+        'aggregators skip unhashable values, as they do errors'
+        fn = os.path.join(os.path.dirname(__file__), '..', '..', 'tests', 'lists.jsonl')
+        vs = visidata.JSONSheet('lists', source=visidata.Path(fn), jsonlines=True)
+        vs.reload.__wrapped__(vs)
+        a = vs.column('a')
+        self.assertEqual(visidata.aggregators['count'](a, vs.rows), 0)
+        self.assertEqual(visidata.aggregators['sum'](vs.column('b'), vs.rows), 21)
@@ -0,0 +1,80 @@
+import unittest
+from copy import copy, deepcopy
+
+import visidata
+
+
+class PandasTestCase(unittest.TestCase):
+    def setUp(self):
+        try:
+            import pandas
+        except ImportError:
+            self.skipTest('pandas not installed')
+        self.df = pandas.DataFrame({
+            'k': [i%4 for i in range(100)] + [9, 8],
+            's': ['x%d' % (i%3) for i in range(100)] + ['y', 'y'],
+            'n': list(range(100)) + [5, 6],
+            'f': [i/3 for i in range(100)] + [0.5, 0.25],
+        })
+        self.vs = visidata.PandasSheet('df', source=self.df)
+        self.vs.reload()
+
+    def freq(self, *colnames, vectorized=True):
+        vs = self.vs
+        ft = (visidata.PandasFreqTable if vectorized else visidata.SheetFreqTable)(vs, *[vs.column(n) for n in colnames])
+        ft.reload()
+        visidata.sync()
+        return ft
+
+    def summary(self, ft):
+        return [[c.getValue(r) for c in ft.columns if c.name not in ('percent', 'histogram')] for r in ft.rows]
+
+    def test_rows(self):
+        'rows are objects of their own, which read their fields by column name'
+        r = self.vs.rows[5]
+        self.assertEqual(r['s'], 'x2')
+        self.assertIsNot(deepcopy(r), r)
+        self.assertEqual(deepcopy(r)['n'], 5)
+        self.assertEqual(copy(r).pos, 5)
+        self.vs.column('n').setValue(r, 55)
+        self.assertEqual(self.vs.column('n').getValue(r), 55)
+
+    def test_freq_aggregates(self):
+        'bins and aggregates computed by groupby are those of the aggregators'
+        visidata.addAggregators([self.vs.column('n'), self.vs.column('f')], ['sum', 'mean', 'max', 'count', 'median'])
+        for colnames in [('k',), ('s',), ('k', 's')]:
+            ft = self.freq(*colnames)
+            self.assertTrue(ft.rows[0][1].aggvals)
+            self.assertNotIn('median_n', ft.rows[0][1].aggvals)
+            self.assertEqual(self.summary(ft), self.summary(self.freq(*colnames, vectorized=False)))
+
+    def test_freq_nan(self):
+        'NaN is counted by the aggregators, so such columns are aggregated by them'
+        self.df.loc[3, 'f'] = float('nan')
+        self.vs.reload()
+        visidata.addAggregators([self.vs.column('f')], ['max'])
+        ft = self.freq('k')
+        self.assertNotIn('max_f', ft.rows[0][1].aggvals)
+        self.assertEqual(repr(self.summary(ft)), repr(self.summary(self.freq('k', vectorized=False))))
+
+    def test_sort_mixed(self):
+        'object columns with values which cannot be compared are sorted as by Sheet.orderBy, which reports the TypeError'
+        import pandas
+        vs = visidata.PandasSheet('mixed', source=pandas.DataFrame({'o': ['b', None, 'a', 3]}))
+        vs.reload()
+        vs.orderBy.__wrapped__(vs, vs.column('o'))
+        self.assertEqual(len(vs.rows), 4)
+        vs.orderBy.__wrapped__(self.vs, self.vs.column('n'), reverse=True)
+        self.assertEqual(self.vs.rows[0].pos, 99)
+
+    def test_set_and_nulls(self):
+        'set values are seen by the array, and values equal to null_value are left out of aggregates'
+        col = self.vs.column('n')
+        for r in self.vs.rows[:10]:
+            col.setValue(r, 1000)
+        self.assertEqual(list(col.getValues(self.vs.rows[:3])), [1000]*3)
+        visidata.options.set('null_value', 1000)
+        try:
+            self.assertEqual(list(col.getValues(self.vs.rows[:12])), [10, 11])
+        finally:
+            visidata.options._opts.set('null_value', None)  # options.set would convert None to 0
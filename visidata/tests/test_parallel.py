@@ -0,0 +1,46 @@
+import threading
+import unittest
+
+import visidata
+
+
+class ParallelTestCase(unittest.TestCase):
+    def setUp(self):
+        visidata.options.set('worker_processes', 2)
+        self.vs = visidata.Sheet('parallel', columns=[visidata.ColumnItem('a', 0), visidata.ColumnItem('b', 1)])
+        self.vs.rows = [[i, threading.Lock()] for i in range(100)]
+        self.vs.recalc()
+
+    def tearDown(self):
+        visidata.options.set('worker_processes', 0)
+
+    def test_calc(self):
+        c = self.vs.addColumn(visidata.ColumnExpr('c', 'a*2'))
+        self.assertEqual(visidata.calcInProcesses(c, self.vs.rows), [i*2 for i in range(100)])
+
+    def test_unpicklable(self):
+        'values and results which cannot be sent to the worker processes are left to be computed here'
+        c = self.vs.addColumn(visidata.ColumnExpr('c', 'b'))
+        self.assertIsNone(visidata.calcInProcesses(c, self.vs.rows))
+        c = self.vs.addColumn(visidata.ColumnExpr('c', 'lambda: a'))
+        self.assertIsNone(visidata.calcInProcesses(c, self.vs.rows))
+
+    def test_setValues(self):
+        visidata.setValuesInProcesses.__wrapped__(self.vs.columns[0], self.vs.rows, 'a+1')
+        self.assertEqual([r[0] for r in self.vs.rows], list(range(1, 101)))
+        visidata.setValuesInProcesses.__wrapped__(self.vs.columns[0], self.vs.rows, 'b')
+        self.assertIs(self.vs.rows[0][0], self.vs.rows[0][1])
+
+    def test_chunkBoundaries(self):
+        data = b''.join(b'%d,"a\nb"\n' % i for i in range(1000))
+        chunkbytes, visidata.parallel.parallel_chunk_bytes = visidata.parallel.parallel_chunk_bytes, 64
+        try:
+            bounds = visidata.chunkBoundaries(data, 0, 4, b'"')
+        finally:
+            visidata.parallel.parallel_chunk_bytes = chunkbytes
+        self.assertEqual(bounds[0], 0)
+        self.assertEqual(bounds[-1], len(data))
+        self.assertGreater(len(bounds), 2)
+        for b in bounds[1:-1]:
+            self.assertEqual(data[b-1:b], b'\n')
+            self.assertEqual(data[:b].count(b'"') % 2, 0)
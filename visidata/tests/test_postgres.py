@@ -0,0 +1,192 @@
+import os
+import glob
+import shutil
+import socket
+import tempfile
+import unittest
+import subprocess
+from urllib.parse import urlparse
+
+import visidata
+
+# a scratch database, for example postgres://postgres@localhost/vdtest; if unset, a server is started for these tests, if postgres is installed
+pgurl = os.environ.get('VD_TEST_POSTGRES')
+pgserver = None  # (pg_ctl, scratch directory) of the server started here
+skipReason = 'set VD_TEST_POSTGRES to the url of a scratch postgres database, or install postgres'
+
+
+def findPgProgram(name):
+    'Return the path of postgres server program `name`, which is often not on the PATH.'
+    path = shutil.which(name)
+    if path:
+        return path
+    pg_config = shutil.which('pg_config')
+    if pg_config:
+        bindir = subprocess.run([pg_config, '--bindir'], stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+        if os.path.exists(os.path.join(bindir, name)):
+            return os.path.join(bindir, name)
+    for path in sorted(glob.glob('/usr/lib/postgresql/*/bin/' + name), reverse=True):  # debian
+        return path
+
+
+def freePort():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def setUpModule():
+    'Start a scratch postgres server with a vdtest database, unless given one by VD_TEST_POSTGRES.'
+    global pgurl, pgserver, skipReason
+    if pgurl:
+        return
+    try:
+        import psycopg2
+    except ImportError:
+        skipReason = 'psycopg2 not installed'
+        return
+    initdb, pg_ctl = findPgProgram('initdb'), findPgProgram('pg_ctl')
+    if not initdb or not pg_ctl:
+        return
+
+    tmpdir = tempfile.mkdtemp(prefix='vdtest-postgres-')
+    datadir = os.path.join(tmpdir, 'data')
+    port = freePort()
+    try:
+        subprocess.run([initdb, '-D', datadir, '-U', 'postgres', '-A', 'trust'], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        subprocess.run([pg_ctl, '-D', datadir, '-l', os.path.join(tmpdir, 'log'), '-w',
+                        '-o', '-p %d -k %s -c listen_addresses=localhost' % (port, tmpdir), 'start'],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError as e:  # for instance, initdb refuses to run as root
+        skipReason = 'could not start postgres: ' + e.stderr.decode(errors='replace').strip()
+        shutil.rmtree(tmpdir)
+        return
+    pgserver = (pg_ctl, tmpdir)
+
+    conn = psycopg2.connect(user='postgres', dbname='postgres', host='localhost', port=port)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute('CREATE DATABASE vdtest')
+    conn.close()
+    pgurl = 'postgres://postgres@localhost:%d/vdtest' % port
+
+
+def tearDownModule():
+    if pgserver:
+        pg_ctl, tmpdir = pgserver
+        subprocess.run([pg_ctl, '-D', os.path.join(tmpdir, 'data'), '-m', 'immediate', 'stop'], stdout=subprocess.DEVNULL)
+        shutil.rmtree(tmpdir)
+
+
+class PostgresTestCase(unittest.TestCase):
+    nrows = 25000
+
+    def setUp(self):
+        if not pgurl:
+            self.skipTest(skipReason)
+        import psycopg2
+        self.conn = psycopg2.connect(pgurl)
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute('DROP TABLE IF EXISTS vdtest')
+            cur.execute('CREATE TABLE vdtest (id integer, name text)')
+            cur.execute("INSERT INTO vdtest SELECT i, 'row' || i FROM generate_series(0, %d) i" % (self.nrows-1))
+            cur.execute('ANALYZE vdtest')
+
+    def tearDown(self):
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute('DROP TABLE vdtest')
+        self.conn.close()
+        visidata.options.set('sql_page_rows', 0)
+        visidata.options.set('postgres_estimate_rows', False)
+        visidata.options.set('postgres_fetch_rows', 10000)
+        visidata.options.set('postgres_timeout', 60)
+
+    def openTable(self, tables=None):
+        if not tables:
+            tables = visidata.openurl_postgres(urlparse(pgurl))
+            tables.reload()
+            visidata.sync()
+        vs = visidata.PgTable('vdtest', source='vdtest', sql=tables.sql)
+        vs.reload()
+        visidata.sync()
+        return tables, vs
+
+    def test_rowcounts(self):
+        for estimate in [False, True]:
+            visidata.options.set('postgres_estimate_rows', estimate)
+            tables, vs = self.openTable()
+            self.assertEqual(tables.getRowCount('vdtest'), self.nrows)
+
+    def test_rowcount_errors(self):
+        'a table which cannot be counted does not keep the others from being counted'
+        tables, vs = self.openTable()
+        tables.countRows.__wrapped__(tables, ['nosuchtable', 'vdtest'])
+        self.assertEqual(tables.getRowCount('vdtest'), self.nrows)
+        with self.assertRaises(Exception):
+            tables.getRowCount('nosuchtable')
+
+    def test_batches(self):
+        visidata.options.set('postgres_fetch_rows', 1000)
+        tables, vs = self.openTable()
+        self.assertEqual([c.name for c in vs.columns], ['id', 'name'])
+        self.assertEqual(len(vs.rows), self.nrows)
+        self.assertEqual(sorted(r[0] for r in vs.rows), list(range(self.nrows)))
+
+    def test_paged(self):
+        visidata.options.set('sql_page_rows', 1000)
+        tables, vs = self.openTable()
+        self.assertIsInstance(vs.rows, visidata.PagedRows)
+        self.assertEqual(len(vs.rows), self.nrows)
+        self.assertEqual(len(list(vs.rows)), self.nrows)
+        self.assertEqual(vs.rows[12345], list(vs.rows)[12345])
+        vs.closePageCursor()
+
+    def test_paged_connections(self):
+        'paged tables do not hold pooled connections, and close their own on reload'
+        visidata.options.set('sql_page_rows', 1000)
+        visidata.options.set('postgres_timeout', 5)
+        tables, vs = self.openTable()
+        sheets = [self.openTable(tables)[1] for i in range(visidata.options.postgres_pool_size)]
+        self.assertEqual(tables.sql.execute('SELECT 1'), [(1,)])
+        self.assertEqual(len(sheets[-1].rows[999:1001]), 2)
+        conn = vs.pagecursor.connection
+        vs.reload()
+        visidata.sync()
+        self.assertTrue(conn.closed)
+        self.assertFalse(vs.pagecursor.connection.closed)
+
+    def test_paged_idle(self):
+        'the paging connection is not left idle in a transaction, and is closed when the sheet is quit'
+        import psycopg2.extensions
+        visidata.options.set('sql_page_rows', 1000)
+        tables, vs = self.openTable()
+        conn = vs.pagecursor.connection
+        self.assertEqual(len(vs.rows[4999:5001]), 2)
+        self.assertEqual(conn.info.transaction_status, psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+        visidata.vd().quit(vs)
+        self.assertTrue(conn.closed)
+        self.assertEqual(len(list(vs.rows)), self.nrows)  # declared again if needed again
+
+    def test_paged_estimate(self):
+        'paged tables take the estimated row count, and still fetch all the rows when there are more'
+        visidata.options.set('sql_page_rows', 1000)
+        visidata.options.set('postgres_estimate_rows', True)
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("INSERT INTO vdtest SELECT i, 'row' || i FROM generate_series(%d, %d) i" % (self.nrows, self.nrows+1499))
+        tables, vs = self.openTable()
+        self.assertEqual(len(vs.rows), self.nrows)
+        self.assertEqual(len(list(vs.rows)), self.nrows+1500)
+        self.assertEqual(len(vs.rows), self.nrows+1500)
+        vs.closePageCursor()
+
+    def test_timeout(self):
+        'waiting for a pooled connection fails instead of blocking forever'
+        visidata.options.set('postgres_timeout', 1)
+        tables, vs = self.openTable()
+        conns = [tables.sql.getconn() for i in range(visidata.options.postgres_pool_size)]
+        try:
+            with self.assertRaises(visidata.ExpectedException):
+                tables.sql.getconn()
+        finally:
+            for conn in conns:
+                tables.sql.putconn(conn)
@@ -0,0 +1,160 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import visidata
+
+
+class PagedSqliteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fn = os.path.join(self.tmpdir.name, 'test.sqlite')
+        conn = sqlite3.connect(self.fn)
+        conn.execute('CREATE TABLE t (a INTEGER, b TEXT)')
+        conn.executemany('INSERT INTO t VALUES (?, ?)', [(i%10, 'x%d' % (i%3)) for i in range(100)])
+        conn.commit()
+        conn.close()
+        visidata.options.set('sql_page_rows', 10)
+        visidata.options.set('sql_max_pages', 2)
+
+    def tearDown(self):
+        visidata.options.set('sql_page_rows', 0)
+        visidata.options.set('sql_max_pages', 100)
+        self.tmpdir.cleanup()
+
+    def load(self):
+        vs = visidata.SqliteSheet('t', visidata.SqliteSheet('tables', visidata.Path(self.fn), 'sqlite_master'), 't')
+        vs.reload()
+        visidata.sync()
+        return vs
+
+    def test_identity(self):
+        'selected rows are the same row objects when their page is fetched again'
+        vs = self.load()
+        self.assertIsInstance(vs.rows, visidata.PagedRows)
+        vs.selectRow(vs.rows[5])
+        for r in vs.rows:
+            pass
+        self.assertLessEqual(len(vs.rows.pages), 2)
+        self.assertTrue(vs.isSelected(vs.rows[5]))
+        self.assertEqual(vs.selectedRows, [vs.rows[5]])
+
+    def test_selectWhere(self):
+        'select-sql selects rows by rowid, so equal rows are not selected with them, and fetches only the matching rows'
+        vs = self.load()
+        vs.selectWhere('rowid IN (1, 11)')  # equal rows, as are rowids 21, 31, ...
+        self.assertEqual(len(vs.rows.pages), 0)
+        self.assertEqual(len(vs._selectedRows), 2)
+        self.assertEqual([i for i, r in enumerate(vs.rows) if vs.isSelected(r)], [0, 10])
+        vs.selectWhere('rowid = 1', unselect=True)
+        self.assertEqual([i for i, r in enumerate(vs.rows) if vs.isSelected(r)], [10])
+
+    def test_selectWhere_unpaged(self):
+        visidata.options.set('sql_page_rows', 0)
+        vs = self.load()
+        vs.selectWhere('rowid IN (1, 11)')
+        self.assertEqual([i for i, r in enumerate(vs.rows) if vs.isSelected(r)], [0, 10])
+
+    def test_shrunk(self):
+        'rows deleted after counting end the rows early instead of failing'
+        vs = self.load()
+        conn = sqlite3.connect(self.fn)
+        conn.execute('DELETE FROM t WHERE rowid > 95')
+        conn.commit()
+        conn.close()
+        self.assertEqual(len(vs.rows[90:100]), 5)
+        self.assertEqual(len(vs.rows), 95)
+        self.assertEqual(len(list(vs.rows)), 95)
+        with self.assertRaises(IndexError):
+            vs.rows[99]
+
+    def test_orderBy(self):
+        'ORDER BY is pushed down in a thread, and rows with equal keys stay in table order, as when sorted in memory'
+        for pagerows in [0, 10]:
+            visidata.options.set('sql_page_rows', pagerows)
+            vs = self.load()
+            vs.orderBy(vs.column('b'), reverse=True)
+            visidata.sync()
+            self.assertTrue(vs.sqlOrder)
+            self.assertEqual([r[0] for r in vs.rows][:4], [3, 6, 9, 12])
+
+    def test_one_lock(self):
+        'sheets on the same connection share its lock'
+        vs = self.load()
+        self.assertIs(vs.connLock, vs.source.connLock)
+        self.assertIs(vs.rows.lock, vs.connLock)
+
+
+class SqliteFreqTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fn = os.path.join(self.tmpdir.name, 'test.sqlite')
+        conn = sqlite3.connect(self.fn)
+        conn.execute('CREATE TABLE t (k INTEGER, s TEXT, n INTEGER, f REAL)')
+        rows = [(i%4, 'x%d' % (i%3), None if i%4 == 3 else i, i/3) for i in range(30)]
+        rows += [(9, 'y', None, 0.5), (8, 'y', 1, 0.5)]  # ties, after all the others
+        conn.executemany('INSERT INTO t VALUES (?, ?, ?, ?)', rows)
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def load(self):
+        vs = visidata.SqliteSheet('t', visidata.SqliteSheet('tables', visidata.Path(self.fn), 'sqlite_master'), 't')
+        vs.reload()
+        visidata.sync()
+        visidata.addAggregators([vs.column('n')], ['sum', 'max'])
+        return vs
+
+    def freq(self, vs, *colnames, sql=True):
+        ft = (visidata.SqliteFreqTable if sql else visidata.SheetFreqTable)(vs, *[vs.column(n) for n in colnames])
+        ft.reload()
+        visidata.sync()
+        return ft
+
+    def summary(self, ft):
+        return [[c.getValue(r) for c in ft.columns if c.name not in ('percent', 'histogram')] for r in ft.rows]
+
+    def assertSameAsInMemory(self, vs, *colnames, pushed=True):
+        ft = self.freq(vs, *colnames)
+        self.assertEqual(isinstance(ft.rows[0][1], visidata.SqliteBin), pushed)
+        self.assertEqual(self.summary(ft), self.summary(self.freq(vs, *colnames, sql=False)))
+        return ft
+
+    def test_same_bins(self):
+        'bins, their order (ties by first appearance) and aggregates (sum of only nulls is 0) are the same as counted in memory'
+        vs = self.load()
+        ft = self.assertSameAsInMemory(vs, 'k')
+        self.assertEqual([r[0] for r in ft.rows[-2:]], [[9], [8]])
+        self.assertEqual(ft.rows[-2][1].aggvals['sum_n'], 0)
+        self.assertSameAsInMemory(vs, 's')
+        self.assertSameAsInMemory(vs, 'k', 's')
+
+    def test_not_pushed(self):
+        'floats are binned by their display, and mixed storage classes by their typed value, so are counted in memory'
+        vs = self.load()
+        self.assertSameAsInMemory(vs, 'f', pushed=False)
+        conn = sqlite3.connect(self.fn)
+        conn.execute("INSERT INTO t VALUES (1.5, 'z', 2, 0)")  # binned with 1 in memory
+        conn.commit()
+        conn.close()
+        vs.reload()
+        visidata.sync()
+        self.assertSameAsInMemory(vs, 'k', pushed=False)
+
+    def test_bin_rows(self):
+        'the rows of a bin are found by rowid, and selecting the bin selects exactly them, also when paged'
+        for pagerows in [0, 5]:
+            visidata.options.set('sql_page_rows', pagerows)
+            try:
+                vs = self.load()
+                ft = self.freq(vs, 's')
+            finally:
+                visidata.options.set('sql_page_rows', 0)
+            y = [r for r in ft.rows if r[0] == ['y']][0]
+            ft.selectRow(y)
+            visidata.sync()
+            self.assertEqual(vs.selectedRows, vs.rows[30:])
+            self.assertEqual([r[0] for r in ft.rows[0][1]], [r[0] for r in vs.rows if r[2] == 'x0'])
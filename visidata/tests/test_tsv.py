@@ -0,0 +1,162 @@
+import os
+import tempfile
+import unittest
+from copy import deepcopy
+
+import visidata
+
+
+class LazyTsvTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fn = os.path.join(self.tmpdir.name, 'test.tsv')
+        with open(self.fn, 'w') as fp:
+            fp.write('a\tb\n')
+            for i in range(100):
+                fp.write('%d\tx%d\n' % (i, i%7) if i != 50 else '50\tx1\textra\n')
+                if i == 20:
+                    fp.write('\n')
+        visidata.options.set('lazy_rows', 10)
+
+    def tearDown(self):
+        visidata.options.set('tsv_lazy', False)
+        visidata.options.set('lazy_rows', 10000)
+        self.tmpdir.cleanup()
+
+    def load(self, lazy):
+        visidata.options.set('tsv_lazy', lazy)
+        vs = visidata.TsvSheet('test', source=visidata.Path(self.fn))
+        vs.reload_sync()
+        return vs
+
+    def test_same_as_eager(self):
+        'the extra field adds its column when loading, not when its row is first drawn'
+        vs = self.load(True)
+        self.assertIsInstance(vs.rows, visidata.LazyTsvRows)
+        self.assertEqual(len(vs.columns), 3)
+        eager = self.load(False)
+        self.assertEqual([r[:2] for r in vs.rows], [r[:2] for r in eager.rows])
+        self.assertEqual(vs.rows[50][2], 'extra')
+
+    def test_utf16(self):
+        'files in encodings where newlines are not b"\\n" are loaded eagerly'
+        with open(self.fn, 'w', encoding='utf-16') as fp:
+            fp.write('a\tb\n1\tx\n2\ty\n')
+        visidata.options.set('encoding', 'utf-16')
+        try:
+            vs = self.load(True)
+        finally:
+            visidata.options.set('encoding', 'utf-8')
+        self.assertNotIsInstance(vs.rows, visidata.LazyTsvRows)
+        self.assertEqual([list(r) for r in vs.rows], [['1', 'x'], ['2', 'y']])
+
+    def test_identity(self):
+        'rows keep their identity while referred to, and only the most recently accessed are kept parsed'
+        vs = self.load(True)
+        vs.selectRow(vs.rows[5])
+        for r in vs.rows:
+            pass
+        self.assertLessEqual(len(vs.rows.recent), 10)
+        self.assertTrue(vs.isSelected(vs.rows[5]))
+        self.assertEqual(len(vs.selectedRows), 1)
+
+    def test_edits(self):
+        'edited and added rows are kept, and none of these modifications parse the other rows'
+        vs = self.load(True)
+        vs.rows[7].b = 'edited'
+        vs.rows.insert(0, vs.newRow())
+        vs.rows[1:1] = [deepcopy(vs.rows[1])]
+        vs.rows[1].b = 'pasted'
+        del vs.rows[-1]
+        self.assertLessEqual(len(vs.rows.loaded), 10)
+
+        for r in vs.rows:
+            pass
+        self.assertIsInstance(vs.rows, visidata.LazyTsvRows)
+        self.assertEqual(len(vs.rows), 101)
+        self.assertEqual(vs.rows[0], [None, None, None])
+        self.assertEqual(vs.rows[1], ['0', 'pasted', None])
+        self.assertEqual(vs.rows[2], ['0', 'x0', None])
+        self.assertEqual(vs.rows[9], ['7', 'edited', None])
+        self.assertEqual(vs.rows[-1], ['98', 'x0', None])
+
+    def test_sort_delete(self):
+        vs = self.load(True)
+        vs.rows.sort(key=lambda r: int(r[0]), reverse=True)
+        self.assertEqual(vs.rows[0][0], '99')
+        vs.selectRow(vs.rows[0])
+        vs.deleteBy(vs.isSelected)
+        self.assertIsInstance(vs.rows, visidata.LazyTsvRows)
+        self.assertEqual([r[0] for r in vs.rows[:2]], ['98', '97'])
+        self.assertEqual(len(vs.rows), 99)
+
+
+
+class FieldInternerTestCase(unittest.TestCase):
+    def test_intern(self):
+        intern = visidata.FieldInterner(maxDistinct=3)
+        rows = [intern([''.join(['x', str(i%2)]), str(i)]) for i in range(10)]
+        self.assertIs(rows[0][0], rows[2][0])
+        self.assertEqual([r[1] for r in rows], [str(i) for i in range(10)])
+        self.assertIsNone(intern.values[1])  # too many distinct values
+
+
+class ColumnarTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        visidata.options.set('columnar_rows', False)
+        self.tmpdir.cleanup()
+
+    def load(self, fn, text, columnar):
+        fn = os.path.join(self.tmpdir.name, fn)
+        with open(fn, 'w') as fp:
+            fp.write(text)
+        visidata.options.set('columnar_rows', columnar)
+        if fn.endswith('.csv'):
+            vs = visidata.loaders.csv.CsvSheet('test', source=visidata.Path(fn))
+            visidata.loaders.csv.load_csv(vs)
+        else:
+            vs = visidata.TsvSheet('test', source=visidata.Path(fn))
+            vs.reload_sync()
+        return vs
+
+    def assertSameRows(self, fn, text):
+        vs = self.load(fn, text, True)
+        self.assertIsInstance(vs.rows, visidata.ColumnarRows)
+        self.assertEqual([list(r) for r in vs.rows], [list(r) for r in self.load(fn, text, False).rows])
+        return vs
+
+    def test_tsv(self):
+        vs = self.assertSameRows('test.tsv', 'id\tcity\tnote\n' + ''.join('%d\tcity%d\tn%d\n' % (i, i%5, i*7) for i in range(1000)))
+        self.assertEqual(len(vs.columns), 3)
+
+    def test_csv(self):
+        'csv rows keep their own number of fields'
+        self.assertSameRows('test.csv', 'a,b\n' + ''.join('%d,%s\n' % (i, ',x'*(i%3)) for i in range(100)))
+
+    def test_identity(self):
+        vs = self.load('test.tsv', 'a\n' + ''.join('%d\n' % i for i in range(100)), True)
+        vs.selectRow(vs.rows[10])
+        vs.rows[20][0] = 'edited'
+        list(vs.rows)
+        self.assertTrue(vs.isSelected(vs.rows[10]))
+        self.assertEqual(vs.rows[20][0], 'edited')
+
+    def test_values(self):
+        'values are stored as codes, then as ints or text once there are many distinct ones, and come back the same'
+        vals = ['1', None, '-2', '3'] + [str(i) for i in range(10, 400)]
+        cv = visidata.ColumnValues(maxDistinct=300)
+        for v in vals:
+            cv.append(v)
+        self.assertTrue(cv.ints)
+        self.assertEqual(cv.take(range(len(vals))), vals)
+
+        vals += ['07', 'text', None, '']
+        for v in vals[-4:]:
+            cv.append(v)
+        self.assertIsNotNone(cv.text)
+        self.assertEqual(cv.take(range(len(vals))), vals)
+        self.assertEqual(cv[1], None)
+        self.assertEqual(cv[len(vals)-1], '')
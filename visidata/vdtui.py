@@ -37,6 +37,7 @@ from builtins import *
 import sys
 import os
 import collections
+import collections.abc
 from collections import defaultdict
 from copy import copy, deepcopy
 from contextlib import suppress
@@ -52,6 +53,7 @@ import threading
 import traceback
 import time
 import inspect
+import operator
 import weakref
 
 class EscapeException(BaseException):
@@ -71,6 +73,9 @@ class SettingsMgr(collections.OrderedDict):
     def __init__(self):
         super().__init__()
         self.allobjs = {}
+        self.generation = 0  # incremented on every set()
+        self._mronames = {}  # [cls] -> objnames of its mro
+        self._resolved = {}  # [(key, objname, type)] -> value resolved by _get(); cleared on every set()
 
     def objname(self, obj):
         if isinstance(obj, str):
@@ -96,16 +101,23 @@ class SettingsMgr(collections.OrderedDict):
         if k not in self:
             self[k] = dict()
         self[k][self.objname(obj)] = v
+        self.generation += 1
+        self._resolved.clear()
         return v
 
     def setdefault(self, k, v):
         return self.set(k, v, 'global')
 
+    def _mroNames(self, cls):
+        names = self._mronames.get(cls)
+        if names is None:
+            names = self._mronames[cls] = [self.objname(c) for c in inspect.getmro(cls)]
+        return names
+
     def _mappings(self, obj):
         if obj:
             mappings = [self.objname(obj)]
-            mro = [self.objname(cls) for cls in inspect.getmro(type(obj))]
-            mappings.extend(mro)
+            mappings.extend(self._mroNames(type(obj)))
         else:
             mappings = []
 
@@ -113,12 +125,27 @@ class SettingsMgr(collections.OrderedDict):
         return mappings
 
     def _get(self, key, obj=None):
+        'Return value for key in context of obj (or the top sheet), most specific first.  Cache result until any set().'
         d = self.get(key, None)
-        if d:
-            for m in self._mappings(obj or vd.sheet):
-                v = d.get(m)
-                if v:
-                    return v
+        if not d:
+            return None
+
+        obj = obj or vd.sheet
+        ckey = (key, self.objname(obj), type(obj)) if obj else (key,)
+        try:
+            return self._resolved[ckey]
+        except KeyError:
+            pass
+
+        for m in self._mappings(obj):
+            v = d.get(m)
+            if v:
+                break
+        else:
+            v = None
+
+        self._resolved[ckey] = v
+        return v
 
     def iter(self, obj=None):
         'Iterate through all keys considering context of obj. If obj is None, uses the context of the top sheet.'
@@ -165,7 +192,6 @@ class OptionsObject:
     'minimalist options framework'
     def __init__(self, mgr):
         object.__setattr__(self, '_opts', mgr)
-        object.__setattr__(self, '_cache', {})
 
     def keys(self, obj=None):
         for k, d in self._opts.items():
@@ -173,15 +199,12 @@ class OptionsObject:
                 yield k
 
     def _get(self, k, obj=None):
-        'Return Option object for k in context of obj. Cache result until any set().'
-        opt = self._cache.get((k, obj), None)
-        if opt is None:
-            opt = self._opts._get(k, obj)
-            self._cache[(k, obj or vd.sheet)] = opt
-        return opt
+        'Return Option object for k in context of obj. Cached by the SettingsMgr until any set().'
+        return self._opts._get(k, obj)
 
     def _set(self, k, v, obj=None, helpstr=''):
-        self._cache.clear()  # invalidate entire cache on any set()
+        if vd:  # cells may be formatted differently
+            vd.invalidateRender()
         return self._opts.set(k, Option(k, v, helpstr), obj)
 
     def get(self, k, obj=None):
@@ -265,6 +288,8 @@ replayableOption('bulk_select_clear', False, 'clear selected rows before new bul
 
 option('cmd_after_edit', 'go-down', 'command longname to execute after successful edit')
 option('col_cache_size', 0, 'max number of cache entries in each cached column')
+option('cache_mem_mb', 256, 'memory budget in MB for the values in all cached columns (0 for unlimited)')
+option('render_cache_cells', 10000, 'max number of formatted cells to keep for redrawing each sheet (0 to format every cell on every redraw)')
 option('quitguard', False, 'confirm before quitting last sheet')
 
 replayableOption('null_value', None, 'a value to be counted as null')
@@ -272,6 +297,7 @@ replayableOption('null_value', None, 'a value to be counted as null')
 replayableOption('force_valid_colnames', False, 'clean column names to be valid Python identifiers')
 option('debug', False, 'exit on error and display stacktrace')
 option('curses_timeout', 100, 'curses timeout in ms')
+option('max_threads', 16, 'max number of async threads to run at once; more threads started by other threads or by asynccache wait in a queue (0 for unlimited)')
 theme('force_256_colors', False, 'use 256 colors even if curses reports fewer')
 theme('use_default_colors', False, 'curses use default terminal colors')
 
@@ -321,10 +347,10 @@ theme('scroll_incr', 3, 'amount to scroll with scrollwheel')
 ENTER='^J'
 ESC='^['
 globalCommand('KEY_RESIZE', 'no-op', '')
-globalCommand('q', 'quit-sheet',  'vd.sheets[1:] or options.quitguard and confirm("quit last sheet? "); vd.sheets.pop(0)')
-globalCommand('gq', 'quit-all', 'vd.sheets.clear()')
+globalCommand('q', 'quit-sheet',  'vd.sheets[1:] or options.quitguard and confirm("quit last sheet? "); vd.quit(sheet)')
+globalCommand('gq', 'quit-all', 'vd.quit(*vd.sheets)')
 
-globalCommand('^L', 'redraw', 'vd.scr.clear()')
+globalCommand('^L', 'redraw', 'vd.refresh(); vd.scr.clear()')
 globalCommand('^^', 'prev-sheet', 'vd.sheets[1:] or fail("no previous sheet"); vd.sheets[0], vd.sheets[1] = vd.sheets[1], vd.sheets[0]')
 
 globalCommand('^Z', 'suspend', 'suspend()')
@@ -498,6 +524,7 @@ def asynccache(key=lambda *args, **kwargs: str(args)+str(kwargs)):
         d = {}  # per decoration cache
         def _func(k, *args, **kwargs):
             d[k] = func(*args, **kwargs)
+        _func.background = True  # may be queued behind other threads
 
         @functools.wraps(func)
         def _execAsync(*args, **kwargs):
@@ -510,31 +537,124 @@ def asynccache(key=lambda *args, **kwargs: str(args)+str(kwargs)):
 
 
 class Progress:
-    def __init__(self, iterable=None, gerund="", total=None, sheet=None):
+    '''Count progress toward `total` for the right status and the ThreadsSheet.
+    Counting is batched: cancellation and the clock are only checked once per batch, and the batch size adapts so that checks happen about every `checkInterval` seconds.'''
+    checkInterval = 0.05  # seconds between batch checkpoints
+    maxBatch = 1<<20
+
+    def __init__(self, iterable=None, gerund="", total=None, sheet=None, unit='rows'):
         self.iterable = iterable
         self.total = total if total is not None else len(iterable)
         self.sheet = sheet if sheet else getattr(threading.current_thread(), 'sheet', None)
         self.gerund = gerund
+        self.unit = unit  # what is counted; 'bytes' for file positions
         self.made = 0
+        self.thread = threading.current_thread()
+        self.startTime = time.time()
+        self.endTime = None
+        self.batchSize = 1
+        self.nextCheck = 1  # value of `made` at the next checkpoint
+        self.lastCheck = time.perf_counter()
+
+    def checkCancelled(self):
+        'Raise EscapeException if this thread has been cancelled.'
+        if getattr(self.thread, 'cancelled', False):
+            raise EscapeException('cancelled')
+
+    def checkpoint(self):
+        'Check for cancellation, and size the next batch from the time taken by the last one.'
+        self.checkCancelled()
+        now = time.perf_counter()
+        if now - self.lastCheck < self.checkInterval:
+            self.batchSize = min(self.batchSize*2, self.maxBatch)
+        elif self.batchSize > 1:
+            self.batchSize //= 2
+        self.lastCheck = now
+        self.nextCheck = self.made + self.batchSize
 
     def __enter__(self):
+        self.checkCancelled()
         if self.sheet:
             self.sheet.progresses.append(self)
+        progresses = getattr(self.thread, 'progresses', None)
+        if progresses is not None:
+            progresses.append(self)
         return self
 
     def addProgress(self, n):
         self.made += n
+        if self.made >= self.nextCheck:
+            self.checkpoint()
         return True
 
     def __exit__(self, exc_type, exc_val, tb):
         if self.sheet:
             self.sheet.progresses.remove(self)
+        progresses = getattr(self.thread, 'progresses', None)
+        if progresses is not None:
+            progresses.remove(self)
+            if self in progresses:  # still entered by an enclosing `with`
+                return
+            self.thread.lastProgress = self
+        self.endTime = time.time()
+        self.sheet = None  # kept as the thread's lastProgress for the ThreadsSheet; not the sheet or rows
+        self.iterable = None
 
     def __iter__(self):
-        with self as prog:
+        with self:
+            batch = left = self.batchSize
             for item in self.iterable:
                 yield item
-                self.made += 1
+                left -= 1
+                if not left:
+                    self.addProgress(batch)
+                    batch = left = self.batchSize
+            self.made += batch - left
+
+    @property
+    def elapsed(self):
+        'Seconds since this Progress started (until it finished).'
+        return (self.endTime or time.time()) - self.startTime
+
+    @property
+    def rate(self):
+        'Units made per second.'
+        elapsed = self.elapsed
+        return self.made/elapsed if elapsed > 0 else 0
+
+    @property
+    def eta(self):
+        'Estimated seconds remaining, or None if unknown.'
+        rate = self.rate
+        if self.endTime or not rate or self.made > self.total:
+            return None
+        return (self.total - self.made)/rate
+
+    def rateStatus(self):
+        'Return e.g. "1.2M rows/s 0:42" for the status line.'
+        s = '%s %s/s' % (humanNumber(self.rate), self.unit)
+        eta = self.eta
+        if eta is not None:
+            s += ' ' + humanDuration(eta)
+        return s
+
+
+def humanNumber(n):
+    'Abbreviate number `n` with a k/M/G suffix.'
+    for suffix in ('', 'k', 'M', 'G'):
+        if abs(n) < 1000:
+            break
+        n /= 1000
+    else:
+        suffix = 'T'
+    return ('%.0f%s' if n >= 100 or not suffix else '%.1f%s') % (n, suffix)
+
+
+def humanDuration(s):
+    'Format seconds `s` as [h:]mm:ss.'
+    m, s = divmod(int(s), 60)
+    h, m = divmod(m, 60)
+    return '%d:%02d:%02d' % (h, m, s) if h else '%d:%02d' % (m, s)
 
 @asyncthread
 def _async_deepcopy(vs, newlist, oldlist):
@@ -567,6 +687,12 @@ class VisiData:
         self.hooks = collections.defaultdict(list)  # [hookname] -> list(hooks)
         self.mousereg = []
         self.threads = [] # all long-running threads, including main and finished
+        self.threadQueues = collections.OrderedDict()  # [sheet] -> deque of background threads waiting to start, served round-robin
+        self.threadLock = threading.Lock()  # for threadQueues and nRunningThreads
+        self.threadsChanged = threading.Condition(self.threadLock)  # notified whenever a thread finishes
+        self.nRunningThreads = 0  # started async threads, not yet finished
+        self.renderGeneration = 0  # incremented whenever any formatted cells may have changed
+        self.lastFrame = None  # frameSignature() of the last screen drawn
         self.addThread(threading.current_thread(), endTime=0)
         self.addHook('rstatus', lambda sheet,self=self: (self.keystrokes, 'color_keystrokes'))
         self.addHook('rstatus', self.rightStatus)
@@ -621,12 +747,19 @@ class VisiData:
         t.status = ''
         t.profile = None
         t.exception = None
+        t.cancelled = False  # checked by Progress
+        t.finishing = False  # set once the thread may not be interrupted by cancelThread
+        t.progresses = []  # Progress objects in use by this thread
+        t.lastProgress = None  # most recently finished Progress
+        t.queuedTime = time.time()
+        t.waitTime = 0  # seconds spent in the queue
         self.threads.append(t)
 
     def execAsync(self, func, *args, **kwargs):
-        'Execute `func(*args, **kwargs)` in a separate thread.'
+        'Execute `func(*args, **kwargs)` in a separate thread.  Threads started by other threads or by asynccache wait in a queue while options.max_threads are running.'
 
         thread = threading.Thread(target=self.toplevelTryFunc, daemon=True, args=(func,)+args, kwargs=kwargs)
+        thread.name = func.__name__
         self.addThread(thread)
 
         if self.sheets:
@@ -636,10 +769,74 @@ class VisiData:
             currentSheet = None
 
         thread.sheet = currentSheet
+
+        # commands from the main thread are interactive, and always start right away
+        background = getattr(func, 'background', False) or threading.current_thread() is not threading.main_thread()
+        with self.threadLock:
+            maxThreads = options.max_threads
+            if background and maxThreads and self.nRunningThreads >= maxThreads:
+                self.threadQueues.setdefault(currentSheet, collections.deque()).append(thread)
+                return thread
+            self.nRunningThreads += 1
+
         thread.start()
 
         return thread
 
+    def queueDepth(self, sheet=None):
+        'Number of threads waiting to start, for the given `sheet` or for all sheets.'
+        if sheet is None:
+            return sum(len(q) for q in self.threadQueues.values())
+        return len(self.threadQueues.get(sheet, ()))
+
+    def unqueueThread(self, t):
+        'Remove thread `t` from the queue without running it.  Return True if it was waiting.'
+        with self.threadLock:
+            q = self.threadQueues.get(t.sheet)
+            if not q or t not in q:
+                return False
+            q.remove(t)
+            if not q:
+                del self.threadQueues[t.sheet]
+
+        t.status += 'cancelled before starting'
+        t.waitTime = time.time() - t.queuedTime
+        t.endTime = time.process_time()
+        if t.sheet:
+            t.sheet.currentThreads.remove(t)
+        with self.threadsChanged:
+            self.threadsChanged.notify_all()
+        return True
+
+    def dequeueThreads(self):
+        'Remove and return the queued threads which may start now, taking one from each sheet in turn, while fewer than options.max_threads are running.  Call with threadLock held.'
+        ret = []
+        maxThreads = options.max_threads
+        while self.threadQueues and not (maxThreads and self.nRunningThreads >= maxThreads):
+            sheet, q = next(iter(self.threadQueues.items()))
+            ret.append(q.popleft())
+            del self.threadQueues[sheet]
+            if q:
+                self.threadQueues[sheet] = q  # to the end of the line
+            self.nRunningThreads += 1
+        return ret
+
+    def startQueuedThreads(self, threads):
+        for t in threads:
+            t.waitTime = time.time() - t.queuedTime
+            t.start()
+
+    def threadFinished(self, t):
+        'Mark thread `t` as finished, notify any waiting in sync(), and start the next queued threads.  Cells formatted while it ran are formatted again.'
+        self.invalidateRender()  # the thread may have computed values drawn as pending
+        with self.threadLock:
+            t.endTime = time.process_time()
+            self.threadsChanged.notify_all()
+            self.nRunningThreads -= 1
+            nextThreads = self.dequeueThreads()
+
+        self.startQueuedThreads(nextThreads)
+
     @staticmethod
     def toplevelTryFunc(func, *args, **kwargs):
         'Thread entry-point for `func(*args, **kwargs)` with try/except wrapper'
@@ -654,9 +851,16 @@ class VisiData:
         except Exception as e:
             t.exception = e
             exceptionCaught(e)
-
-        if t.sheet:
-            t.sheet.currentThreads.remove(t)
+        finally:
+            while not t.finishing:
+                try:
+                    with vd.threadLock:
+                        t.finishing = True  # cancelThread raises no more exceptions in this thread
+                except BaseException:  # raised by cancelThread before then
+                    pass
+            if t.sheet:
+                t.sheet.currentThreads.remove(t)
+            vd.threadFinished(t)
         return ret
 
     @property
@@ -667,18 +871,42 @@ class VisiData:
     def checkForFinishedThreads(self):
         'Mark terminated threads with endTime.'
         for t in self.unfinishedThreads:
-            if not t.is_alive():
+            if t.ident is not None and not t.is_alive():  # not queued and not running
                 t.endTime = time.process_time()
                 if getattr(t, 'status', None) is None:
                     t.status = 'ended'
 
     def sync(self, expectedThreads=0):
-        'Wait for all but expectedThreads async threads to finish.'
-        while len(self.unfinishedThreads) > expectedThreads:
-            time.sleep(.3)
-            self.checkForFinishedThreads()
+        'Wait for all but expectedThreads async threads to finish.  An async thread gives up its place among options.max_threads while it waits, so that queued threads can start.'
+        t = threading.current_thread()
+        holdsSlot = getattr(t, 'endTime', 0) is None  # an async thread; the main thread has endTime=0
+        if holdsSlot:
+            with self.threadLock:
+                self.nRunningThreads -= 1
+                nextThreads = self.dequeueThreads()
+            self.startQueuedThreads(nextThreads)
+
+        try:
+            with self.threadsChanged:
+                while len(self.unfinishedThreads) > expectedThreads:
+                    self.threadsChanged.wait(.3)  # timeout in case a thread died without notifying
+                    self.checkForFinishedThreads()
+        finally:
+            if holdsSlot:
+                with self.threadLock:
+                    self.nRunningThreads += 1
+
+    def invalidateRender(self):
+        'Discard formatted cells of all sheets, so they are formatted again on the next draw.'
+        self.renderGeneration += 1
 
     def refresh(self):
+        'Discard all cached layout and formatted cells.'
+        self.clearCaches()
+        self.invalidateRender()
+
+    def clearCaches(self):
+        'Discard cached column layout and colors, which are recomputed on every draw.'
         Sheet.visibleCols.fget.cache_clear()
         Sheet.keyCols.fget.cache_clear()
         colors.colorcache.clear()
@@ -746,7 +974,10 @@ class VisiData:
         'Maintain list of most recent errors and return most recent one.'
         if isinstance(exc, ExpectedException):  # already reported, don't log
             return
-        self.lastErrors.append(stacktrace())
+        if sys.exc_info()[1] is exc:
+            self.lastErrors.append(stacktrace())
+        else:  # exception caught earlier, e.g. wrapped by a batch getter
+            self.lastErrors.append(getattr(exc, 'stacktrace', None) or stacktrace(exc))
         if kwargs.get('status', True):
             status(self.lastErrors[-1][-1], priority=2)  # last line of latest error
         if options.debug:
@@ -824,6 +1055,8 @@ class VisiData:
         if sheet.currentThreads:
             gerund = (' '+sheet.progresses[0].gerund) if sheet.progresses else ''
             status = '%9d  %2d%%%s' % (len(sheet), sheet.progressPct, gerund)
+            if sheet.progresses:
+                status += '  ' + sheet.progresses[0].rateStatus()
         else:
             status = '%9d %s' % (len(sheet), sheet.rowtype)
         return status, 'color_status'
@@ -855,18 +1088,24 @@ class VisiData:
             sheet = self.sheets[0]
             threading.current_thread().sheet = sheet
 
-            try:
-                sheet.draw(scr)
-            except Exception as e:
-                self.exceptionCaught(e)
+            # redraw after every keystroke, but on idle timeouts only if something may have changed
+            framesig = sheet.frameSignature()
+            if framesig is None or framesig != self.lastFrame:
+                try:
+                    sheet.draw(scr)
+                except Exception as e:
+                    self.exceptionCaught(e)
+
+                self.drawLeftStatus(scr, sheet)
+                self.lastFrame = framesig
 
-            self.drawLeftStatus(scr, sheet)
             self.drawRightStatus(scr, sheet)  # visible during this getkeystroke
 
             keystroke = self.getkeystroke(scr, sheet)
 
             if keystroke:  # wait until next keystroke to clear statuses and previous keystrokes
                 numTimeouts = 0
+                self.lastFrame = None
                 if not self.prefixWaiting:
                     self.keystrokes = ''
 
@@ -940,9 +1179,19 @@ class VisiData:
 
     def replace(self, vs):
         'Replace top sheet with the given sheet `vs`.'
-        self.sheets.pop(0)
+        self.quit(self.sheets[0])
         return self.push(vs)
 
+    def quit(self, *sheets):
+        'Remove `sheets` from the stack, close them, and drop the cached values of their columns.'
+        for vs in sheets:
+            if vs in self.sheets:
+                self.sheets.remove(vs)
+            vs.close()
+            for c in getattr(vs, 'columns', []):
+                if c._cachedValues:
+                    c._cachedValues.clear()
+
     def remove(self, vs):
         if vs in self.sheets:
             self.sheets.remove(vs)
@@ -1083,6 +1332,10 @@ class BaseSheet:
         'Compose left side of status bar for this sheet (overridable).'
         return options.disp_status_fmt.format(sheet=self)
 
+    def close(self):
+        'Release anything held open for this sheet, when it is quit (overridable).'
+        pass
+
     def exec_keystrokes(self, keystrokes, vdglobals=None):
         return self.exec_command(self.getCommand(keystrokes), vdglobals, keystrokes=keystrokes)
 
@@ -1128,7 +1381,7 @@ class BaseSheet:
 
         catchapply(self.checkCursor)
 
-        self.vd.refresh()
+        self.vd.clearCaches()
         return escaped
 
     @property
@@ -1162,6 +1415,10 @@ class BaseSheet:
     def draw(self, scr):
         error('no draw')
 
+    def frameSignature(self):
+        'Return a value which differs whenever draw() could draw something different, or None if always redrawing.'
+        return None
+
     def reload(self):
         error('no reload')
 
@@ -1220,6 +1477,7 @@ class Sheet(BaseSheet):
     rowtype = 'rows'
 
     columns = []  # list of Column
+    columnsGeneration = 0  # incremented whenever any column is added or renamed; see colsByName
     colorizers = [ # list of Colorizer
         CellColorizer(2, 'color_default_hdr', lambda s,c,r,v: r is None),
         ColumnColorizer(2, 'color_current_col', lambda s,c,r,v: c is s.cursorCol),
@@ -1252,6 +1510,10 @@ class Sheet(BaseSheet):
         self.setKeys(self.columns[:self.nKeys])  # initial list of key columns
         self._selectedRows = {}  # id(row) -> row
 
+        self._renderCache = {}  # [(id(row), col, width)] -> (row, DisplayWrapper); see getRenderedCell
+        self._renderKey = None
+        self._colsByName = None  # (key, dict); see colsByName
+
         self.__dict__.update(kwargs)  # also done earlier in BaseSheet.__init__
 
     def __len__(self):
@@ -1336,6 +1598,7 @@ class Sheet(BaseSheet):
         ret.columns.extend(copy(c) for c in self.columns if c not in self.keyCols)
         ret.recalc()  # set .sheet on columns
         ret._selectedRows = {}
+        ret._renderCache = {}
         ret.topRowIndex = ret.cursorRowIndex = 0
         ret.progresses = []
         ret.currentThreads = []
@@ -1394,8 +1657,22 @@ class Sheet(BaseSheet):
         return self.name
 
     def evalexpr(self, expr, row=None):
+        if isinstance(expr, str):
+            expr = compileExpr(expr)
         return eval(expr, getGlobals(), LazyMapRow(self, row) if row is not None else None)
 
+    def evalexprs(self, expr, rows):
+        'Generate the value of `expr` evaluated over each of `rows`, with exceptions wrapped in TypedExceptionWrapper.'
+        if isinstance(expr, str):
+            expr = compileExpr(expr)
+        vdglobals = getGlobals()
+        cols = self.colsByName
+        for r in rows:
+            try:
+                yield eval(expr, vdglobals, LazyMapRow(self, r, cols))
+            except Exception as e:
+                yield TypedExceptionWrapper(self.evalexpr, r, exception=e)
+
     def inputExpr(self, prompt, *args, **kwargs):
         return input(prompt, "expr", *args, completer=CompleteExpr(self), **kwargs)
 
@@ -1420,7 +1697,18 @@ class Sheet(BaseSheet):
         return self.rows[self.topRowIndex:self.topRowIndex+self.nVisibleRows]
 
     @property
-    @functools.lru_cache()  # cache for perf reasons on wide sheets.  cleared in .refresh()
+    def colsByName(self):
+        'Dict of column name to the first Column with that name.  Cached for perf reasons on wide sheets, until columns are added, removed or renamed.'
+        key = (Sheet.columnsGeneration, id(self.columns), len(self.columns))
+        if not self._colsByName or self._colsByName[0] != key:
+            d = {}
+            for c in self.columns:
+                d.setdefault(c.name, c)
+            self._colsByName = (key, d)
+        return self._colsByName[1]
+
+    @property
+    @functools.lru_cache()  # cache for perf reasons on wide sheets.  cleared in .clearCaches()
     def visibleCols(self):  # non-hidden cols
         'List of `Column` which are not hidden.'
         return self.keyCols + [c for c in self.columns if not c.hidden and not c.keycol]
@@ -1432,7 +1720,7 @@ class Sheet(BaseSheet):
         error('no visible column at x=%d' % x)
 
     @property
-    @functools.lru_cache()  # cache for perf reasons on wide sheets.  cleared in .refresh()
+    @functools.lru_cache()  # cache for perf reasons on wide sheets.  cleared in .clearCaches()
     def keyCols(self):
         'Cached list of visible key columns (Columns with .key=True)'
         return [c for c in self.columns if c.keycol and not c.hidden]
@@ -1560,6 +1848,16 @@ class Sheet(BaseSheet):
             except Exception:
                 pass
 
+    def gatherByExpr(self, expr):
+        'Generate only rows for which the given `expr` evaluates True.'
+        rows, exprrows = itertools.tee(self.rows[i] for i in rotate_range(len(self.rows), self.cursorRowIndex))
+        for r, v in zip(rows, self.evalexprs(expr, exprrows)):
+            try:
+                if v:
+                    yield r
+            except Exception:
+                pass
+
     @asyncthread
     def orderBy(self, *cols, **kwargs):
         try:
@@ -1630,6 +1928,7 @@ class Sheet(BaseSheet):
                 index = len(self.columns)
             col.sheet = self
             self.columns.insert(index, col)
+            Sheet.columnsGeneration += 1
             return col
 
     def setKeys(self, cols):
@@ -1678,45 +1977,59 @@ class Sheet(BaseSheet):
 
         if x <= 0:
             self.leftVisibleColIndex = self.cursorVisibleColIndex
-        else:
-            while True:
-                if self.leftVisibleColIndex == self.cursorVisibleColIndex:  # not much more we can do
-                    break
-                self.calcColLayout()
-                mincolidx, maxcolidx = min(self.visibleColLayout.keys()), max(self.visibleColLayout.keys())
-                if self.cursorVisibleColIndex < mincolidx:
-                    self.leftVisibleColIndex -= max((self.cursorVisibleColIndex - mincolid)//2, 1)
-                    continue
-                elif self.cursorVisibleColIndex > maxcolidx:
-                    self.leftVisibleColIndex += max((maxcolidx - self.cursorVisibleColIndex)//2, 1)
-                    continue
-
-                cur_x, cur_w = self.visibleColLayout[self.cursorVisibleColIndex]
-                if cur_x+cur_w < self.vd.windowWidth:  # current columns fit entirely on screen
-                    break
-                self.leftVisibleColIndex += 1  # once within the bounds, walk over one column at a time
+        elif not self.isVisibleIdxKey(self.cursorVisibleColIndex):
+            # scroll right only as far as needed for the cursor column to fit entirely on screen
+            self.leftVisibleColIndex = max(self.leftVisibleColIndex, self.calcLeftVisibleColIndex())
+            self.calcColLayout()
+
+    def calcLeftVisibleColIndex(self):
+        'Return the smallest leftVisibleColIndex at which the cursor column fits entirely on screen, in one pass leftwards from the cursor.'
+        rows = self.visibleRows
+        sepColWidth = len(options.disp_column_sep)
+        winWidth = self.vd.windowWidth
+        nKeys = len(self.keyCols)
+
+        leftidx = self.cursorVisibleColIndex
+        x = sum(self.calcColWidth(i, rows)+sepColWidth for i in range(nKeys))  # keycols are always leftmost
+        x += self.calcColWidth(leftidx, rows)
+        while leftidx > nKeys:
+            w = self.calcColWidth(leftidx-1, rows)+sepColWidth
+            if x+w >= winWidth:
+                break
+            x += w
+            leftidx -= 1
+
+        return leftidx
+
+    def calcColWidth(self, vcolidx, rows):
+        'Return width of column at `vcolidx` for layout, first finding its width from `rows` if not yet known.'
+        col = self.visibleCols[vcolidx]
+        if col.width is None and len(rows) > 0:
+            # handle delayed column width-finding
+            minColWidth = len(options.disp_more_left)+len(options.disp_more_right)
+            col.width = col.getMaxWidth(rows)+minColWidth
+            if vcolidx != self.nVisibleCols-1:  # let last column fill up the max width
+                col.width = min(col.width, options.default_width)
+        width = col.width if col.width is not None else options.default_width
+        if col in self.keyCols:
+            width = max(width, 1)  # keycols must all be visible
+        return width
 
     def calcColLayout(self):
         'Set right-most visible column, based on calculation.'
-        minColWidth = len(options.disp_more_left)+len(options.disp_more_right)
         sepColWidth = len(options.disp_column_sep)
         winWidth = self.vd.windowWidth
+        rows = self.visibleRows
+        nKeys = len(self.keyCols)
         self.visibleColLayout = {}
         x = 0
         vcolidx = 0
         for vcolidx in range(0, self.nVisibleCols):
-            col = self.visibleCols[vcolidx]
-            if col.width is None and len(self.visibleRows) > 0:
-                # handle delayed column width-finding
-                col.width = col.getMaxWidth(self.visibleRows)+minColWidth
-                if vcolidx != self.nVisibleCols-1:  # let last column fill up the max width
-                    col.width = min(col.width, options.default_width)
-            width = col.width if col.width is not None else options.default_width
-            if col in self.keyCols:
-                width = max(width, 1)  # keycols must all be visible
-            if col in self.keyCols or vcolidx >= self.leftVisibleColIndex:  # visible columns
-                self.visibleColLayout[vcolidx] = [x, min(width, winWidth-x)]
-                x += width+sepColWidth
+            if vcolidx >= nKeys and vcolidx < self.leftVisibleColIndex:  # offscreen to the left
+                continue
+            width = self.calcColWidth(vcolidx, rows)
+            self.visibleColLayout[vcolidx] = [x, min(width, winWidth-x)]
+            x += width+sepColWidth
             if x > winWidth-1:
                 break
 
@@ -1758,6 +2071,40 @@ class Sheet(BaseSheet):
         if C and x+colwidth+len(C) < self.vd.windowWidth:
             scr.addstr(y, x+colwidth, C, sepattr)
 
+    def checkRenderCache(self):
+        'Discard formatted cells if anything may have changed them since the last draw.'
+        renderKey = vd.renderGeneration
+        if vd.unfinishedThreads or renderKey != self._renderKey or len(self._renderCache) > options.render_cache_cells:
+            self._renderCache.clear()
+            self._renderKey = renderKey
+
+    def getRenderedCell(self, col, row, width, isNull):
+        'Return DisplayWrapper for drawing `row` in `col`, formatted once until invalidated.'
+        k = (id(row), col, width)
+        r = self._renderCache.get(k)
+        if r and r[0] is row:
+            return r[1]
+
+        cellval = col.getCell(row, width)
+        try:
+            if isNull(cellval.value):
+                cellval.note = options.disp_note_none
+                cellval.notecolor = 'color_note_type'
+        except TypeError:
+            pass
+
+        self._renderCache[k] = (row, cellval)
+        return cellval
+
+    def frameSignature(self):
+        if self.currentThreads:
+            return None
+        rows = self.rows[self.topRowIndex:self.topRowIndex+self.nVisibleRows]
+        return (id(self), self.nRows, len(self.columns), len(self._selectedRows),
+                self.topRowIndex, self.cursorRowIndex, self.leftVisibleColIndex, self.cursorVisibleColIndex,
+                tuple(map(id, rows)), vd.renderGeneration, options._opts.generation,
+                len(vd.unfinishedThreads), tuple(vd.statuses.items()), vd.scr and vd.scr.getmaxyx())
+
     def isVisibleIdxKey(self, vcolidx):
         'Return boolean: is given column index a key column?'
         return self.visibleCols[vcolidx] in self.keyCols
@@ -1767,7 +2114,7 @@ class Sheet(BaseSheet):
         numHeaderRows = 1
         scr.erase()  # clear screen before every re-draw
 
-        vd().refresh()
+        vd().clearCaches()
 
         if not self.columns:
             return
@@ -1779,6 +2126,7 @@ class Sheet(BaseSheet):
         colattrs = {}  # [colidx] -> attr
         isNull = isNullFunc()
 
+        self.checkRenderCache()
         self.rowLayout = {}
         self.calcColLayout()
         vcolidx = 0
@@ -1800,13 +2148,7 @@ class Sheet(BaseSheet):
                     self.rowLayout[dispRowIdx] = y
 
                     row = rows[rowidx]
-                    cellval = col.getCell(row, colwidth-1)
-                    try:
-                        if isNull(cellval.value):
-                            cellval.note = options.disp_note_none
-                            cellval.notecolor = 'color_note_type'
-                    except TypeError:
-                        pass
+                    cellval = self.getRenderedCell(col, row, colwidth-1, isNull)
 
                     attr = self.colorize(col, row, cellval)
 
@@ -1977,9 +2319,20 @@ class TypedExceptionWrapper(TypedWrapper):
     def __init__(self, func, *args, exception=None):
         TypedWrapper.__init__(self, func, *args)
         self.exception = exception
-        self.stacktrace = stacktrace()
+        self._stacktrace = None
         self.forwarded = False
 
+    @property
+    def stacktrace(self):
+        'Lines of the traceback of `exception`, formatted only when first needed.'
+        if self._stacktrace is None:
+            e = self.exception
+            if hasattr(e, 'stacktrace'):  # already formatted where it was caught
+                self._stacktrace = e.stacktrace
+            else:
+                self._stacktrace = ''.join(traceback.format_exception(type(e), e, e.__traceback__)).strip().splitlines()
+        return self._stacktrace
+
     def __str__(self):
         return str(self.exception)
 
@@ -2024,6 +2377,143 @@ def wrapply(func, *args, **kwargs):
         return TypedExceptionWrapper(func, *args, exception=e)
 
 
+def genBatches(rows, gerund='', n=10000):
+    'Generate successive lists of up to `n` of `rows`, with Progress.'
+    if not isinstance(rows, collections.abc.Sequence):
+        rows = list(rows)
+    with Progress(total=len(rows), gerund=gerund) as prog:
+        for i in range(0, len(rows), n):
+            batch = rows[i:i+n]
+            yield batch
+            prog.addProgress(len(batch))
+
+
+def isPlainTypes(types):
+    'True if values of all `types` pass through wrapply unchanged (not None, wrappers, or exceptions).'
+    return not any(t is type(None) or issubclass(t, (TypedWrapper, Exception)) for t in types)
+
+
+class CacheManager:
+    'Account for the values in all column caches, evicting the least recently used across all of them to stay within options.cache_mem_mb.'
+    entryOverhead = 150  # approximate bytes of bookkeeping per cached value
+
+    def __init__(self):
+        self.lru = collections.OrderedDict()  # [(id(cache), id(row))] -> (weakref to cache, nbytes); least recently used first
+        self.nbytes = 0
+        self.caches = weakref.WeakSet()  # all ColumnCaches, for statistics
+        self.lock = threading.Lock()
+
+    def touch(self, cache):
+        'Move the entries `cache` has recently hit to the end of the lru.'
+        with self.lock:
+            self.flushTouched(cache)
+
+    def flushTouched(self, *caches):
+        'Move recently hit entries of `caches` (default all) to the end of the lru.  Must be called with the lock held.'
+        move = self.lru.move_to_end
+        for c in caches or list(self.caches):
+            touched, c.touched = c.touched, []
+            cacheid = id(c)
+            for k in touched:
+                try:
+                    move((cacheid, k))
+                except KeyError:  # evicted or discarded since
+                    pass
+
+    def add(self, cache, rowid, value):
+        n = valueSize(value) + self.entryOverhead
+        limit = options.cache_mem_mb * 2**20
+        with self.lock:
+            old = self.lru.pop((id(cache), rowid), None)  # left by a dead row whose id was reused
+            if old:
+                self.nbytes -= old[1]
+            self.lru[(id(cache), rowid)] = (weakref.ref(cache), n)
+            self.nbytes += n
+            if limit and self.nbytes > limit:
+                self.flushTouched()
+                while self.nbytes > limit and len(self.lru) > 1:
+                    (cacheid, k), (ref, m) = self.lru.popitem(last=False)
+                    self.nbytes -= m
+                    c = ref()
+                    if c is not None:
+                        c.values.pop(k, None)
+                        c.evictions += 1
+
+    def discard(self, cacheid, rowids):
+        with self.lock:
+            for k in rowids:
+                e = self.lru.pop((cacheid, k), None)
+                if e:
+                    self.nbytes -= e[1]
+
+cacheManager = CacheManager()
+
+
+def valueSize(v):
+    'Approximate bytes held by cached value `v`, including the immediate contents of containers.'
+    n = sys.getsizeof(v, 64)
+    if isinstance(v, (list, tuple, set, frozenset)):
+        n += sum(sys.getsizeof(x, 64) for x in v)
+    elif isinstance(v, dict):
+        n += sum(sys.getsizeof(k, 64) + sys.getsizeof(x, 64) for k, x in v.items())
+    return n
+
+
+def rowRef(row):
+    'Return a weak reference to `row`, or `row` itself if it cannot be weakly referenced (lists, tuples, dicts).'
+    try:
+        return weakref.ref(row)
+    except TypeError:
+        return row
+
+
+class ColumnCache:
+    'Values of one cached column, keyed by id(row).  Each value is kept with a reference to its row, checked on lookup so a reused id never returns a stale value.'
+    touchBatch = 4096  # cache hits to collect before reordering the lru
+
+    def __init__(self, col):
+        self.col = weakref.ref(col)
+        self.values = {}  # [id(row)] -> (rowRef(row), value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.touched = []  # ids of rows hit since last reported to the cacheManager
+        cacheManager.caches.add(self)
+        weakref.finalize(self, cacheManager.discard, id(self), self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, row, calcValue):
+        k = id(row)
+        e = self.values.get(k)
+        if e is not None:
+            r = e[0]
+            if r is row or (type(r) is weakref.ref and r() is row):
+                self.hits += 1
+                self.touched.append(k)
+                if len(self.touched) > self.touchBatch:
+                    cacheManager.touch(self)
+                return e[1]
+
+        self.misses += 1
+        ret = calcValue(row)
+        self.values[k] = (rowRef(row), ret)
+        cacheManager.add(self, k, ret)
+
+        cachesize = options.col_cache_size
+        if cachesize > 0 and len(self.values) > cachesize:
+            oldest = next(iter(self.values))
+            del self.values[oldest]
+            cacheManager.discard(id(self), [oldest])
+            self.evictions += 1
+        return ret
+
+    def clear(self):
+        cacheManager.discard(id(self), list(self.values.keys()))
+        self.values.clear()
+
+
 class Column:
     def __init__(self, name='', *, type=anytype, cache=False, **kwargs):
         self.sheet = None     # owning Sheet, set in Sheet.addColumn
@@ -2036,7 +2526,7 @@ class Column:
         self.keycol = False   # is a key column
         self.expr = None      # Column-type-dependent parameter
 
-        self._cachedValues = collections.OrderedDict() if cache else None
+        self._cachedValues = ColumnCache(self) if cache else None
         for k, v in kwargs.items():
             setattr(self, k, v)  # instead of __dict__.update(kwargs) to invoke property.setters
 
@@ -2046,7 +2536,7 @@ class Column:
         ret.__dict__.update(self.__dict__)
         ret.keycol = False   # column copies lose their key status
         if self._cachedValues is not None:
-            ret._cachedValues = collections.OrderedDict()  # an unrelated cache for copied columns
+            ret._cachedValues = ColumnCache(ret)  # an unrelated cache for copied columns
         return ret
 
     def __deepcopy__(self, memo):
@@ -2056,6 +2546,7 @@ class Column:
         'reset column cache, attach to sheet, and reify name'
         if self._cachedValues:
             self._cachedValues.clear()
+        vd.invalidateRender()
         if sheet:
             self.sheet = sheet
         self.name = self._name
@@ -2071,6 +2562,7 @@ class Column:
         if options.force_valid_colnames:
             name = clean_to_id(name)
         self._name = name
+        Sheet.columnsGeneration += 1
 
     @property
     def fmtstr(self):
@@ -2110,19 +2602,85 @@ class Column:
     def getValueRows(self, rows):
         'Generate (val, row) for the given `rows` at this Column, excluding errors and nulls.'
         f = isNullFunc()
+        nullValue = options.null_value
 
-        for r in Progress(rows, 'calculating'):
-            try:
-                v = self.getTypedValue(r)
-                if not f(v):
+        for batch in genBatches(rows, 'calculating'):
+            typedvals = self.getTypedValuesBatch(batch)
+            types = set(map(type, typedvals))
+            if nullValue is None and isPlainTypes(types) and all(t.__hash__ for t in types):  # unhashable values fail the null check
+                yield from zip(typedvals, batch)
+            else:
+                for v, r in zip(typedvals, batch):
+                    try:
+                        if f(v):
+                            continue
+                    except TypeError:  # unhashable values are skipped, as errors are
+                        continue
                     yield v, r
-            except Exception:
-                pass
 
     def getValues(self, rows):
         for v, r in self.getValueRows(rows):
             yield v
 
+    def getValuesBatch(self, rows):
+        'Return list of getValue(row) for each of `rows`, with exceptions wrapped in TypedExceptionWrapper.'
+        if self._cachedValues is None and type(self).getValue is Column.getValue and type(self).calcValue is Column.calcValue:
+            if self.getter is getItemValue:
+                try:
+                    return list(map(operator.itemgetter(self.expr), rows))
+                except Exception:
+                    return [getitemdef(r, self.expr) for r in rows]
+            elif self.getter is getAttrValue and isinstance(self.expr, str):
+                try:
+                    return list(map(operator.attrgetter(self.expr), rows))
+                except Exception:
+                    pass  # get errors individually
+
+        ret = []
+        getValue = self.getValue
+        for r in rows:
+            try:
+                ret.append(getValue(r))
+            except Exception as e:
+                e.stacktrace = stacktrace()
+                ret.append(TypedExceptionWrapper(getValue, r, exception=e))
+        return ret
+
+    def typeValuesBatch(self, vals):
+        'Return list of wrapply(self.type, v) for each of `vals`, converting all at once when none need wrapping.'
+        if isPlainTypes(set(map(type, vals))):
+            if self.type is anytype:
+                return vals
+            try:
+                return list(map(self.type, vals))
+            except Exception:
+                pass  # wrap errors individually
+        return [wrapply(self.type, v) for v in vals]
+
+    def getWrappedValuesBatch(self, rows):
+        'Return list of wrapply(getValue, row) for each of `rows`; like getValuesBatch, but passing through wrapped rows.'
+        if isPlainTypes(set(map(type, rows))):
+            return self.getValuesBatch(rows)
+        return [wrapply(self.getValue, r) for r in rows]
+
+    def getTypedValuesBatch(self, rows):
+        'Return list of getTypedValue(row) for each of `rows`.'
+        return self.typeValuesBatch(self.getWrappedValuesBatch(rows))
+
+    def getDisplayValuesBatch(self, rows):
+        'Return list of getDisplayValue(row) for each of `rows`.'
+        cellvals = self.getWrappedValuesBatch(rows)
+        typedvals = self.typeValuesBatch(cellvals)
+        types = set(map(type, typedvals))
+        if isPlainTypes(types) and not any(issubclass(t, (list, tuple, dict, bytes, threading.Thread)) for t in types):
+            formatter = getType(self.type).formatter
+            fmtstr = self.fmtstr
+            try:
+                return [formatter(fmtstr, v) or '' for v in typedvals]
+            except Exception:
+                pass  # format errors individually
+        return [self.makeCell(cv, tv).display for cv, tv in zip(cellvals, typedvals)]
+
     def calcValue(self, row):
         return (self.getter)(self, row)
 
@@ -2144,24 +2702,15 @@ class Column:
         if self._cachedValues is None:
             return self.calcValue(row)
 
-        k = id(row)
-        if k in self._cachedValues:
-            return self._cachedValues[k]
-
-        ret = self.calcValue(row)
-        self._cachedValues[k] = ret
-
-        cachesize = options.col_cache_size
-        if cachesize > 0 and len(self._cachedValues) > cachesize:
-            self._cachedValues.popitem(last=False)
-
-        return ret
+        return self._cachedValues.get(row, self.calcValue)
 
     def getCell(self, row, width=None):
         'Return DisplayWrapper for displayable cell value.'
         cellval = wrapply(self.getValue, row)
-        typedval = wrapply(self.type, cellval)
+        return self.makeCell(cellval, wrapply(self.type, cellval), width)
 
+    def makeCell(self, cellval, typedval, width=None):
+        'Return DisplayWrapper for `cellval` as typed to `typedval`.'
         if isinstance(typedval, TypedWrapper):
             if isinstance(cellval, TypedExceptionWrapper):  # calc failed
                 exc = cellval.exception
@@ -2249,9 +2798,10 @@ class Column:
 
     @asyncthread
     def setValuesFromExpr(self, rows, expr):
-        compiledExpr = compile(expr, '<expr>', 'eval')
-        for row in Progress(rows, 'setting'):
-            self.setValueSafe(row, self.sheet.evalexpr(compiledExpr, row))
+        for row, v in zip(Progress(rows, 'setting'), self.sheet.evalexprs(expr, rows)):
+            if isinstance(v, TypedExceptionWrapper):
+                raise v.exception
+            self.setValueSafe(row, v)
         self.recalc()
         status('set %d values = %s' % (len(rows), expr))
 
@@ -2259,7 +2809,7 @@ class Column:
         'Return the maximum length of any cell in column or its header.'
         w = 0
         if len(rows) > 0:
-            w = max(max(len(self.getDisplayValue(r)) for r in rows), len(self.name))+2
+            w = max(max(map(len, self.getDisplayValuesBatch(list(rows)))), len(self.name))+2
         return max(w, len(self.name))
 
     def toggleWidth(self, width):
@@ -2298,11 +2848,14 @@ def setattrdeep(obj, attr, val):
     setattr(obj, attrs[-1], val)
 
 
+def getAttrValue(col, row):
+    return getattrdeep(row, col.expr)
+
 def ColumnAttr(name='', attr=None, **kwargs):
     'Column using getattr/setattr of given attr.'
     return Column(name,
                   expr=attr if attr is not None else name,
-                  getter=lambda col,row: getattrdeep(row, col.expr),
+                  getter=getAttrValue,
                   setter=lambda col,row,val: setattrdeep(row, col.expr, val),
                   **kwargs)
 
@@ -2312,11 +2865,14 @@ def getitemdef(o, k, default=None):
     except Exception:
         return default
 
+def getItemValue(col, row):
+    return getitemdef(row, col.expr)
+
 def ColumnItem(name='', key=None, **kwargs):
     'Column using getitem/setitem of given key.'
     return Column(name,
             expr=key if key is not None else name,
-            getter=lambda col,row: getitemdef(row, col.expr),
+            getter=getItemValue,
             setter=lambda col,row,val: setitem(row, col.expr, val),
             **kwargs)
 
@@ -2379,24 +2935,29 @@ class ColumnEnum(Column):
 
 class LazyMapRow:
     'Calculate column values as needed.'
-    def __init__(self, sheet, row):
+    def __init__(self, sheet, row, cols=None):
         self.row = row
         self.sheet = sheet
-        self._keys = [c.name for c in self.sheet.columns]
+        self._cols = sheet.colsByName if cols is None else cols  # [colname] -> Column
 
     def keys(self):
-        return self._keys
+        return [c.name for c in self.sheet.columns]
 
     def __getitem__(self, colid):
-        try:
-            i = self._keys.index(colid)
-            return self.sheet.columns[i].getTypedValue(self.row)
-        except ValueError:
-            if colid in ['row', '__row__']:
-                return self.row
-            elif colid in ['sheet', '__sheet__']:
-                return self.sheet
-            raise KeyError(colid)
+        col = self._cols.get(colid)
+        if col is not None:
+            return col.getTypedValue(self.row)
+        if colid in ['row', '__row__']:
+            return self.row
+        elif colid in ['sheet', '__sheet__']:
+            return self.sheet
+        raise KeyError(colid)
+
+
+@functools.lru_cache(maxsize=256)
+def compileExpr(expr):
+    'Return code object for evaluating `expr`; compiled once per expression.'
+    return compile(expr, '<expr>', 'eval')
 
 
 class ColumnExpr(Column):
@@ -2414,7 +2975,7 @@ class ColumnExpr(Column):
     @expr.setter
     def expr(self, expr):
         self._expr = expr
-        self.compiledExpr = compile(expr, '<expr>', 'eval') if expr else None
+        self.compiledExpr = compileExpr(expr) if expr else None
 
 ###
 